@@ -384,7 +384,7 @@ class BtmApp(App):
         config.setdefaults('optimization', {'solver': 'glpk'})
         config.setdefaults('connectivity', {'use_proxy': 0, 'http_proxy': '', 'https_proxy': '', 'use_ssl_verify': 1})
         # config.setdefaults('valuation', {'valuation_dms_save': 1, 'valuation_dms_size': 20000})
-        config.setdefaults('btm', {'btm_dms_save': 1, 'btm_dms_size': 20000})
+        config.setdefaults('btm', {'btm_dms_save': 1, 'btm_dms_size': 20000, 'btm_result_cache_size': 100000, 'btm_max_workers': 1, 'btm_spill_path': ''})
         config.setdefaults('datamanager-pjm', {'pjm_subscription_key': ''})
         config.setdefaults('datamanager-isone', {'iso-ne_api_username': ''})
         config.setdefaults('datamanager-openei', {'openei_key': ''})
@@ -0,0 +1,282 @@
+"""
+Runs batches of behind-the-meter energy storage requests without the graphical user interface.
+
+Usage: python -m btm.batch MANIFEST [-o OUTPUT_DIR] [-s SOLVER] [-j WORKERS] [--data-path DATA_PATH] [--result-cache CACHE_DIR] [--dms-stats STATS_FILE]
+
+The manifest is a .csv file with a header row or a .json file with a list of objects, with one request per row or object. Each request has the fields 'rate_structure', the path to a rate structure .json file saved by QuESt, and 'load_profile', the path to a load profile .csv file, and optionally 'pv_profile', the path to a PV profile .json file, and 'month' (1-12); a request without a month is run for every month. Paths that do not exist are looked up in the corresponding directory of the data bank. Any other fields are model parameters passed to BtmOptimizer.set_model_parameters(), e.g., 'Power_rating' and 'Energy_capacity'. Empty .csv fields are ignored.
+
+Progress is printed as each request is solved. OUTPUT_DIR/summary.csv has one row per request and month with its status, bills, and solve time; OUTPUT_DIR/results.npz has the results DataFrames of every solved request as compressed columns, with the 'request' column holding the position of the request in the summary; OUTPUT_DIR/trace.json has the time spent in each phase of every solve, the model size, and the solver information. The time spent in each phase over the batch is printed at the end. If STATS_FILE is given, the hits, misses, evictions, and loading times of the data management system over the batch are written to it as JSON.
+"""
+from __future__ import absolute_import, print_function
+
+import argparse
+import calendar
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from btm.es_gui.tools.optimizer import solve_detached
+from btm.es_gui.tools.result_cache import ResultCache
+from btm.es_gui.tools.instrumentation import phase_summary, write_trace
+from btm.es_gui.tools.btm.btm_dms import BtmDMS
+from btm.es_gui.apps.btm.op_handler import BtmOptimizerHandler, _build_month_op
+
+REQUEST_FIELDS = ('rate_structure', 'load_profile', 'pv_profile', 'month')
+BILL_FIELDS = ('total_bill_with_es', 'total_bill_without_es')
+SUMMARY_FIELDS = ('request',) + REQUEST_FIELDS + ('params', 'status') + BILL_FIELDS + ('solve_time', 'message')
+
+# The year of the calendar used to map the rate structure schedules to hours, as in BtmOptimizerHandler.
+YEAR = 2019
+
+# The directory of each kind of file in the data bank.
+DATA_DIRS = {'rate_structure': 'rate_structures', 'load_profile': 'load', 'pv_profile': 'pv'}
+
+
+def read_manifest(fname, data_path='data'):
+    """
+    Reads the requests in a batch manifest, with one request per month.
+
+    :param fname: The path to a .csv or .json manifest.
+    :param data_path: The path to the data bank for resolving file names.
+    :return: A list of dictionaries of the request fields and a dictionary of model parameters under 'params'.
+    """
+    if fname.lower().endswith('.json'):
+        with open(fname, 'r') as f:
+            rows = json.load(f)
+    else:
+        with open(fname, 'r', newline='') as f:
+            rows = [{key: value.strip() for key, value in row.items() if value not in (None, '')}
+                    for row in csv.DictReader(f)]
+
+    requests = []
+
+    for ix, row in enumerate(rows):
+        missing = [field for field in ('rate_structure', 'load_profile') if field not in row]
+
+        if missing:
+            raise(ValueError('Request {0} of {1} is missing {2}.'.format(ix, fname, ', '.join(missing))))
+
+        request = {field: _resolve_path(str(row[field]), data_path, DATA_DIRS[field]) if field in row else ''
+                   for field in DATA_DIRS}
+        request['params'] = {key: _parse_value(value) for key, value in row.items() if key not in REQUEST_FIELDS}
+
+        months = [int(float(row['month']))] if 'month' in row else range(1, 13)
+
+        for month in months:
+            requests.append(dict(request, month=month))
+
+    return requests
+
+
+def _resolve_path(path, data_path, data_dir):
+    """Returns path if it exists and the path to the file of the same name in the data bank directory otherwise."""
+    if os.path.exists(path):
+        return path
+
+    return os.path.join(data_path, data_dir, path)
+
+
+def _parse_value(value):
+    """Returns the model parameter value as a float if it is a numeric string."""
+    if not isinstance(value, str):
+        return value
+
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def _solve(op, solver):
+    """Solves op with solve_detached() and returns it with the time taken."""
+    t0 = time.perf_counter()
+    op = solve_detached(op, solver)
+
+    return op, time.perf_counter() - t0
+
+
+def run_batch(requests, output_dir, solver='glpk', max_workers=None, data_path='data', result_cache=None, dms_stats=None, stream=sys.stdout):
+    """
+    Solves the requests in a pool of worker processes and writes the results to output_dir.
+
+    :param requests: A list of requests as returned by read_manifest().
+    :param output_dir: The path to the directory to write summary.csv and results.npz to.
+    :param solver: The name of the solver for Pyomo to use.
+    :param max_workers: The number of worker processes; None uses one process per CPU and 1 solves in this process.
+    :param data_path: The path to the data bank.
+    :param result_cache: The path to a ResultCache directory to reuse the results of identical requests, or None.
+    :param dms_stats: The path to write the statistics of the DMS to as JSON, or None.
+    :param stream: The file to print progress to.
+    :return: A list of summary dictionaries, one per request, in the order of requests.
+    """
+    dms = BtmDMS(home_path=data_path, save_name='btm_dms.p', save_data=False)
+    handler = BtmOptimizerHandler(solver, max_workers=max_workers)
+    handler.dms = dms
+
+    cache = ResultCache(result_cache) if result_cache else None
+    rate_structures = {}
+
+    # The inputs shared by the months of each rate structure, load profile, and PV profile, as returned by BtmOptimizerHandler._get_inputs().
+    inputs = {}
+
+    summaries = [dict({field: request[field] for field in REQUEST_FIELDS}, request=ix, params=json.dumps(request['params']),
+                      status='failed', total_bill_with_es='', total_bill_without_es='', solve_time='', message='')
+                 for ix, request in enumerate(requests)]
+    results = {}
+    run_stats = {}
+    n_done = 0
+
+    def _report(ix, op=None, solve_time=None, error=None):
+        nonlocal n_done
+        n_done += 1
+        summary = summaries[ix]
+
+        if error is None:
+            summary.update({field: getattr(op, field) for field in BILL_FIELDS}, status='solved', solve_time=round(solve_time, 3))
+            results[ix] = op.results
+            run_stats[ix] = op.run_stats
+            message = 'bill: ${0:,.2f} -> ${1:,.2f} ({2:.2f} s)'.format(op.total_bill_without_es, op.total_bill_with_es, solve_time)
+        else:
+            logging.error('Batch: Request {0}: {1}'.format(ix, error))
+            summary.update(message=str(error))
+            message = 'FAILED: {0}'.format(error)
+
+        print('[{0}/{1}] {2} {3} {4} {5} {6}'.format(
+            n_done, len(requests), os.path.basename(summary['rate_structure']), os.path.basename(summary['load_profile']),
+            calendar.month_abbr[summary['month']], summary['params'], message), file=stream)
+        stream.flush()
+
+    def _build_op(request):
+        fname = request['rate_structure']
+        key = (fname, request['load_profile'], request['pv_profile'])
+
+        if key not in inputs:
+            if fname not in rate_structures:
+                with open(fname, 'r') as f:
+                    rate_structures[fname] = json.load(f)
+
+            load_profile = {'name': os.path.basename(request['load_profile']), 'path': request['load_profile']}
+            pv_profile = {'name': os.path.basename(request['pv_profile']), 'path': request['pv_profile']} if request['pv_profile'] else {}
+
+            inputs[key] = handler._get_inputs(rate_structures[fname], YEAR, load_profile, pv_profile)
+
+        op = _build_month_op(inputs[key], request['month'], request['params'])
+        op.result_cache = cache
+
+        return op
+
+    if max_workers == 1:
+        for ix, request in enumerate(requests):
+            try:
+                op, solve_time = _solve(_build_op(request), solver)
+            except Exception as e:
+                _report(ix, error=e)
+            else:
+                _report(ix, op, solve_time)
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {}
+
+            # Profiles are loaded in this process, where the DMS keeps them for other requests, while earlier requests are solved.
+            for ix, request in enumerate(requests):
+                try:
+                    op = _build_op(request)
+                except Exception as e:
+                    _report(ix, error=e)
+                else:
+                    futures[executor.submit(_solve, op, solver)] = ix
+
+            for future in as_completed(futures):
+                try:
+                    op, solve_time = future.result()
+                except Exception as e:
+                    _report(futures[future], error=e)
+                else:
+                    _report(futures[future], op, solve_time)
+
+    write_results(output_dir, summaries, results, run_stats)
+
+    if dms_stats:
+        dms.write_stats(dms_stats)
+
+    if run_stats:
+        print(phase_summary(run_stats.values()).to_string(float_format='{0:.3f}'.format), file=stream)
+
+    return summaries
+
+
+def write_results(output_dir, summaries, results, run_stats=None):
+    """
+    Writes the summary of each request to output_dir/summary.csv, the results of the solved requests to output_dir/results.npz, and their RunStats to output_dir/trace.json.
+
+    :param output_dir: The path to the output directory.
+    :param summaries: A list of summary dictionaries with the keys in SUMMARY_FIELDS.
+    :param results: A dictionary of request position to results DataFrame.
+    :param run_stats: A dictionary of request position to RunStats, or None.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    with open(os.path.join(output_dir, 'summary.csv'), 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+        writer.writerows(summaries)
+
+    write_columns(os.path.join(output_dir, 'results.npz'), results)
+
+    if run_stats is not None:
+        positions = sorted(run_stats)
+        write_trace(os.path.join(output_dir, 'trace.json'), [run_stats[ix] for ix in positions], labels=positions)
+
+
+def write_columns(fname, results):
+    """Writes the results DataFrames, keyed by request position, to fname as one compressed array per column, with the position of each row's request in the 'request' column."""
+    frames = sorted(results.items())
+    column_names = []
+
+    for _, df in frames:
+        column_names.extend(column for column in df.columns if column not in column_names)
+
+    columns = {'request': np.concatenate([np.full(len(df), ix) for ix, df in frames] or [np.zeros(0, dtype=int)])}
+
+    for column in column_names:
+        columns[str(column)] = np.concatenate([df[column].values if column in df.columns else np.full(len(df), np.nan)
+                                               for _, df in frames])
+
+    np.savez_compressed(fname, **columns)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a batch of behind-the-meter energy storage requests.')
+    parser.add_argument('manifest', help='path to the .csv or .json request manifest')
+    parser.add_argument('-o', '--output', default='batch_results', help='directory to write the results to (default: batch_results)')
+    parser.add_argument('-s', '--solver', default='glpk', help='solver for Pyomo to use (default: glpk)')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='number of worker processes (default: one per CPU)')
+    parser.add_argument('--data-path', default='data', help='path to the data bank (default: data)')
+    parser.add_argument('--result-cache', default=None, help='directory of a cache of solved results to reuse')
+    parser.add_argument('--dms-stats', default=None, help='file to write the data management system statistics to as JSON')
+    parser.add_argument('-v', '--verbose', action='store_true', help='log informational messages')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format='[%(levelname)s] %(asctime)s: %(message)s', level=logging.INFO if args.verbose else logging.WARNING)
+
+    requests = read_manifest(args.manifest, args.data_path)
+
+    t0 = time.perf_counter()
+    summaries = run_batch(requests, args.output, solver=args.solver, max_workers=args.workers,
+                          data_path=args.data_path, result_cache=args.result_cache, dms_stats=args.dms_stats)
+
+    n_failed = sum(1 for summary in summaries if summary['status'] != 'solved')
+    print('Solved {0} of {1} requests in {2:.1f} s; results written to {3}.'.format(
+        len(summaries) - n_failed, len(summaries), time.perf_counter() - t0, args.output))
+
+    return 1 if n_failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -9,6 +9,7 @@ from kivy.app import App
 # from es_gui.tools.valuation.valuation_dms import ValuationDMS
 from btm.es_gui.resources.widgets.common import WarningPopup, NavigationButton
 from btm.es_gui.tools.btm.btm_dms import BtmDMS
+from btm.es_gui.tools.result_cache import ResultCache, set_result_cache
 from btm.es_gui.proving_grounds.help_carousel import HelpCarouselModalView
 from .op_handler import BtmOptimizerHandler
 from btm.paths import get_path
@@ -28,9 +29,22 @@ class BehindTheMeterHomeScreen(Screen):
             save_name='btm_dms.p',
             home_path='data',
             )
-        self.handler = BtmOptimizerHandler(App.get_running_app().config.get('optimization', 'solver'))
+        # A setting of 0 worker processes uses one per CPU.
+        max_workers = App.get_running_app().config.getint('btm', 'btm_max_workers')
+
+        self.handler = BtmOptimizerHandler(App.get_running_app().config.get('optimization', 'solver'),
+                                           max_workers=max_workers if max_workers > 0 else None)
         self.handler.dms = self.dms
 
+        # Write the results of solved models to disk instead of keeping them in memory if a directory is set.
+        BtmOptimizerHandler.spill_path = App.get_running_app().config.get('btm', 'btm_spill_path') or None
+
+        # Initialize the cache of solved model results.
+        result_cache_size = App.get_running_app().config.getint('btm', 'btm_result_cache_size')*1000
+
+        if result_cache_size > 0:
+            set_result_cache(ResultCache(os.path.join('data', 'result_cache'), max_size=result_cache_size))
+
     def on_enter(self):
         ab = self.manager.nav_bar
         ab.reset_nav_bar()
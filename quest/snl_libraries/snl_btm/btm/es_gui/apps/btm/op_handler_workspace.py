@@ -3,13 +3,18 @@ from __future__ import absolute_import
 import logging
 from datetime import datetime
 import calendar
+from concurrent.futures import Future, ProcessPoolExecutor
 import numpy as np
 from pyutilib.common._exceptions import ApplicationError
 
 # from kivy.clock import mainthread
 
+from btm.es_gui.tools.optimizer import solve_detached
+from btm.es_gui.tools.result_cache import get_result_cache, set_result_cache
+from btm.es_gui.tools.solved_op import SolvedOpRecord
 from btm.es_gui.tools.btm.btm_optimizer import BtmOptimizer, BadParameterException, IncompatibleDataException
-import btm.es_gui.tools.btm.readutdata as readutdata
+from btm.es_gui.tools.btm.tariff import month_schedules
+from btm.es_gui.tools.btm.readutdata import profile_month
 
 
 class BtmOptimizerHandler:
@@ -17,9 +22,13 @@ class BtmOptimizerHandler:
     
     solved_ops = []
 
-    def __init__(self, solver_name, dms):
+    # The path to the directory to write the results of solved Optimizers to instead of keeping them in memory, or None.
+    spill_path = None
+
+    def __init__(self, solver_name, dms, max_workers=1):
         self._solver_name = solver_name
         self._dms = dms
+        self._max_workers = max_workers
 
     @property
     def solver_name(self):
@@ -39,6 +48,15 @@ class BtmOptimizerHandler:
     def dms(self, value):
         self._dms = value
 
+    @property
+    def max_workers(self):
+        """The number of worker processes to solve the months and parameter sets of a request in; 1 solves them in this process and None uses one process per CPU."""
+        return self._max_workers
+
+    @max_workers.setter
+    def max_workers(self, value):
+        self._max_workers = value
+
     def process_requests(self, op_handler_requests, *args):
         """Generates and solves BtmOptimizer models based on the given requests."""
         dms = self.dms
@@ -54,15 +72,9 @@ class BtmOptimizerHandler:
 
         year = 2019
 
-        weekday_energy_schedule = rate_structure['energy rate structure']['weekday schedule']
-        weekend_energy_schedule = rate_structure['energy rate structure']['weekend schedule']
-        weekday_demand_schedule = rate_structure['demand rate structure']['weekday schedule']
-        weekend_demand_schedule = rate_structure['demand rate structure']['weekend schedule']
-
-        nem_type = 2 if rate_structure['net metering']['type'] else 1
-        nem_rate = None if rate_structure['net metering']['type'] else rate_structure['net metering']['energy sell price']
+        inputs = self._get_inputs(rate_structure, year, load_profile_path, pv_profile_path)
 
-        rate_df = readutdata.input_df(year, weekday_energy_schedule, weekend_energy_schedule, weekday_demand_schedule, weekend_demand_schedule)
+        jobs = []
 
         for ix, month in enumerate(calendar.month_abbr[1:], start=1):
             param_set_iterator = iter(param_set)
@@ -74,73 +86,111 @@ class BtmOptimizerHandler:
                 except StopIteration:
                     break
 
-                op = BtmOptimizer()
-
-                # Get data.
-                # TODO: Move to a DMS. Should the omission of PV profile data be handled by the BtmOptimizer?
-                load_profile = dms.get_load_profile_data(load_profile_path['path'], ix)
-
-                try:
-                    pv_profile = dms.get_pv_profile_data(pv_profile_path['path'], ix)
-                except KeyError:
-                    pv_profile = np.zeros(len(load_profile))
-
-                # Build op inputs.
-                rate_df_month = rate_df.loc[rate_df['month'] == ix]
+                if not params:
+                    continue_param_loop = False
 
-                # Populate op.
-                op.tou_energy_schedule = rate_df_month['tou_energy_schedule'].values
-                op.tou_demand_schedule = rate_df_month['tou_demand_schedule'].values
+                jobs.append((ix, params))
 
-                op.tou_energy_rate = [x[1] for x in rate_structure['energy rate structure']['energy rates'].items()]
-                op.tou_demand_rate = [x[1] for x in rate_structure['demand rate structure']['time of use rates'].items()]
-                op.flat_demand_rate = rate_structure['demand rate structure']['flat rates'][month]
+        futures = self._solve_jobs(inputs, jobs)
 
-                op.nem_type = nem_type
-                op.nem_rate = nem_rate
+        for (ix, params), future in zip(jobs, futures):
+            month = calendar.month_abbr[ix]
 
-                op.load_profile = load_profile
-                op.pv_profile = pv_profile
-                op.rate_structure_metadata = rate_structure
-                op.load_profile_metadata = load_profile_path
-                op.pv_profile_metadata = pv_profile_path
+            try:
+                solved_op = future.result()
+            except ApplicationError as e:
+                logging.error('Op Handler: {error}'.format(error=e))
 
-                if params:
-                    op.set_model_parameters(**params)
-                else:
-                    continue_param_loop = False
-                
-                try:
-                    solved_op = self._solve_model(op)
-                except ApplicationError as e:
-                    logging.error('Op Handler: {error}'.format(error=e))
-
-                    if 'No executable found' in e.args[0]:
-                        # Could not locate solver executable
-                        handler_status.add('* The executable for the selected solver could not be found; please check your installation.')
-                    else:
-                        handler_status.add('* ({0} {1}) {2}. The problem may be infeasible.'.format(month, year, e.args[0]))
-                except IncompatibleDataException as e:
-                    # Data exception raised by BtmOptimizer
-                    logging.error(e)
-                    handler_status.add('* ({0} {1}) The time series data has mismatched sizes.'.format(month, year))
-                except AssertionError as e:
-                    # An optimal solution could not be found as reported by the solver
-                    logging.error('Op Handler: {error}'.format(error=e))
-                    handler_status.add('* ({0} {1}) An optimal solution could not be found; the problem may be infeasible.'.format(month, year))
+                if 'No executable found' in e.args[0]:
+                    # Could not locate solver executable
+                    handler_status.add('* The executable for the selected solver could not be found; please check your installation.')
                 else:
-                    solved_op = self._save_to_solved_ops(solved_op, month, params)
-                    solved_requests.append(solved_op)
+                    handler_status.add('* ({0} {1}) {2}. The problem may be infeasible.'.format(month, year, e.args[0]))
+            except IncompatibleDataException as e:
+                # Data exception raised by BtmOptimizer
+                logging.error(e)
+                handler_status.add('* ({0} {1}) The time series data has mismatched sizes.'.format(month, year))
+            except AssertionError as e:
+                # An optimal solution could not be found as reported by the solver
+                logging.error('Op Handler: {error}'.format(error=e))
+                handler_status.add('* ({0} {1}) An optimal solution could not be found; the problem may be infeasible.'.format(month, year))
+            else:
+                solved_op = self._save_to_solved_ops(solved_op, month, params)
+                solved_requests.append(solved_op)
 
         logging.info('Op Handler: Finished processing requested jobs.')
         return solved_requests, handler_status
 
+    def _get_inputs(self, rate_structure, year, load_profile_path, pv_profile_path):
+        """Retrieves the compiled tariff and the annual load and PV profiles and returns a dictionary of the keyword arguments of _populate_month() shared by every month."""
+        # TODO: Should the omission of PV profile data be handled by the BtmOptimizer?
+        load_profile = self.dms.get_annual_load_profile(load_profile_path['path'])
+
+        try:
+            pv_profile = self.dms.get_annual_pv_profile(pv_profile_path['path'])
+        except KeyError:
+            pv_profile = None
+
+        return {'rate_structure': rate_structure, 'tariff': self.dms.get_tariff(rate_structure, year),
+                'load_profile': load_profile, 'pv_profile': pv_profile,
+                'load_profile_path': load_profile_path, 'pv_profile_path': pv_profile_path}
+
+    @staticmethod
+    def _populate_month(op, month, rate_structure, tariff, load_profile, pv_profile, load_profile_path, pv_profile_path):
+        """Sets the data for the month (1-12) in op from the compiled tariff and the annual load and PV profiles; pv_profile is None if there is no PV."""
+        load_profile = profile_month(load_profile, month)
+
+        if pv_profile is None:
+            pv_profile = np.zeros(len(load_profile))
+        else:
+            pv_profile = profile_month(pv_profile, month)
+
+        # Populate op.
+        op.tou_energy_schedule, op.tou_demand_schedule = month_schedules(tariff, month)
+
+        op.tou_energy_rate = [x[1] for x in rate_structure['energy rate structure']['energy rates'].items()]
+        op.tou_demand_rate = [x[1] for x in rate_structure['demand rate structure']['time of use rates'].items()]
+        op.flat_demand_rate = rate_structure['demand rate structure']['flat rates'][calendar.month_abbr[month]]
+
+        op.nem_type = 2 if rate_structure['net metering']['type'] else 1
+        op.nem_rate = None if rate_structure['net metering']['type'] else rate_structure['net metering']['energy sell price']
+
+        op.load_profile = load_profile
+        op.pv_profile = pv_profile
+        op.rate_structure_metadata = rate_structure
+        op.load_profile_metadata = load_profile_path
+        op.pv_profile_metadata = pv_profile_path
+
     def _solve_model(self, op):
         op.solver = self.solver_name
         op.run()
 
         return op
 
+    def _solve_jobs(self, inputs, jobs):
+        """Builds and solves the op for each (month, params) in jobs from inputs, as returned by _get_inputs(), and returns a list of Futures holding the solved op or the raised exception, in the same order as jobs."""
+        if self.max_workers != 1 and len(jobs) > 1:
+            # The inputs are sent to each worker process once, and solved ops are returned without their Pyomo models.
+            with ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker,
+                                     initargs=(inputs, get_result_cache())) as executor:
+                futures = [executor.submit(_solve_month, month, params, self.solver_name) for month, params in jobs]
+
+            return futures
+
+        futures = []
+
+        for month, params in jobs:
+            future = Future()
+
+            try:
+                future.set_result(self._solve_model(_build_month_op(inputs, month, params)))
+            except Exception as e:
+                future.set_exception(e)
+
+            futures.append(future)
+
+        return futures
+
     @staticmethod
     def _save_to_solved_ops(op, month, param_set):
         # time_finished = datetime.now().strftime('%A, %B %d, %Y %H:%M:%S')
@@ -169,10 +219,13 @@ class BtmOptimizerHandler:
 
         name = ' | '.join(name_components)
 
+        # Keep a lightweight record instead of the Optimizer and its Pyomo model.
+        record = SolvedOpRecord(op, BtmOptimizerHandler.spill_path)
+
         results_dict = {}
 
         results_dict['name'] = name
-        results_dict['optimizer'] = op
+        results_dict['optimizer'] = record
         results_dict['month'] = month
         if param_set:
             results_dict['params'] = param_set
@@ -181,7 +234,7 @@ class BtmOptimizerHandler:
 
         BtmOptimizerHandler.solved_ops.append(results_dict)
 
-        return (name, op)
+        return (name, record)
     
     def get_solved_ops(self):
         """Returns the list of solved Optimizer objects in reverse chronological order."""
@@ -189,3 +242,31 @@ class BtmOptimizerHandler:
 
         return return_list
     
+
+
+# The inputs shared by every month solved in a worker process, set once per worker by _init_worker().
+_worker_inputs = None
+
+
+def _init_worker(inputs, result_cache):
+    """Initializes a worker process of BtmOptimizerHandler with the inputs shared by every month and the ResultCache of the handler's process."""
+    global _worker_inputs
+    _worker_inputs = inputs
+
+    set_result_cache(result_cache)
+
+
+def _build_month_op(inputs, month, params):
+    """Returns a BtmOptimizer for the month (1-12) and model parameters from inputs, as returned by BtmOptimizerHandler._get_inputs()."""
+    op = BtmOptimizer()
+    BtmOptimizerHandler._populate_month(op, month, **inputs)
+
+    if params:
+        op.set_model_parameters(**params)
+
+    return op
+
+
+def _solve_month(month, params, solver):
+    """Builds and solves the op for the month (1-12) and model parameters from the inputs of this worker process and returns it without its Pyomo model."""
+    return solve_detached(_build_month_op(_worker_inputs, month, params), solver)
@@ -8,6 +8,7 @@ import threading
 import logging
 import copy
 import csv
+from concurrent.futures import ThreadPoolExecutor
 
 import pandas as pd
 from kivy.app import App
@@ -16,11 +17,16 @@ from kivy.event import EventDispatcher
 from kivy.properties import NumericProperty
 
 from btm.es_gui.resources.widgets.common import LoadingModalView,WarningPopup
+from btm.es_gui.apps.data_manager.manifest import DataBankManifest, directory_signature
+from btm.es_gui.apps.data_manager.node_catalog import NodeCatalog, read_node_list
 from btm.paths import get_path
 dirname = get_path()
 
 DATA_HOME = 'data'
 
+# The type of data whose downloaded nodes are the pricing nodes of each market area without a complete static node list.
+NODE_DATA_TYPES = {'PJM': 'LMP', 'NYISO': 'LBMP', 'ISONE': 'LMP', 'CAISO': 'LMP'}
+
 STATE_ABBR_TO_NAME = {
     'AL': 'Alabama',
     'AK': 'Alaska',
@@ -78,6 +84,7 @@ STATE_ABBR_TO_NAME = {
 
 class DataManager(EventDispatcher):
     data_bank = {}
+    node_catalogs = {}
     n_threads_scanning = NumericProperty(0)
 
     def __init__(self, data_bank_root='data', **kwargs):
@@ -98,6 +105,74 @@ class DataManager(EventDispatcher):
     @data_bank_root.setter
     def data_bank_root(self, value):
         self._data_bank_root = value
+        self._manifest = None
+
+    @property
+    def manifest(self):
+        """The DataBankManifest of the data bank, read when first needed."""
+        if self._manifest is None:
+            self._manifest = DataBankManifest(self.data_bank_root)
+
+        return self._manifest
+
+    def invalidate_data_bank_manifest(self, *key):
+        """Marks the part of the data bank under key, e.g., ('valuation', 'PJM'), to be rescanned the next time the data bank is scanned."""
+        self.manifest.invalidate(key)
+        self.manifest.save()
+
+    def _scan_with_manifest(self, key, root, scan_function, include_files=False, extra_files=()):
+        """
+        Sets the part of the data bank under key to the contents recorded in the manifest if the directories under root are unchanged, and scans them with scan_function otherwise.
+
+        :param key: A tuple of the keys of the part of the data bank, e.g., ('valuation', 'PJM').
+        :param root: The path to the directory scanned by scan_function.
+        :param scan_function: The method scanning root into the part of the data bank.
+        :param include_files: If True, changes to the files under root are also detected, for scans that read their contents.
+        :param extra_files: Paths to other files that scan_function depends on.
+        """
+        data_bank = self.data_bank
+
+        for parent in key[:-1]:
+            data_bank = data_bank[parent]
+
+        try:
+            contents = self.manifest.get(key)
+        except KeyError:
+            pass
+        else:
+            if contents is not None:
+                data_bank[key[-1]] = contents
+
+            return
+
+        logging.info('DataManager: Scanning {0}...'.format(root))
+
+        # Sign before scanning so that changes made during the scan cause a rescan the next time.
+        signature = directory_signature(root, include_files=include_files, extra_files=extra_files)
+        scan_function()
+        self.manifest.put(key, signature, data_bank.get(key[-1]))
+
+    def _scan_in_parallel(self, scans):
+        """Runs _scan_with_manifest() for each tuple of arguments in scans in its own thread and returns whether the scan finished without the application quitting."""
+        def _scan(*args):
+            # Quit?
+            if App.get_running_app().root.stop.is_set():
+                return
+
+            self._scan_with_manifest(*args)
+
+        # Read the manifest before the threads share it.
+        manifest = self.manifest
+
+        with ThreadPoolExecutor(max_workers=max(len(scans), 1)) as executor:
+            futures = [executor.submit(_scan, *args) for args in scans]
+
+            for future in futures:
+                future.result()
+
+        manifest.save()
+
+        return not App.get_running_app().root.stop.is_set()
     
     def scan_btm_data_bank(self):
         """Scans the behind-the-meter data bank to determine what data has been downloaded."""
@@ -114,15 +189,22 @@ class DataManager(EventDispatcher):
 
         self.n_threads_scanning = 1
 
+        # Only the parts of the data bank that changed since the last scan are rescanned.
+        scans = [
+            (('rate structures',), os.path.join(self.data_bank_root, 'rate_structures'), self._scan_rate_structure_data_bank, True),
+            (('load profiles',), os.path.join(self.data_bank_root, 'load'), self._scan_btm_load_profile_data_bank),
+            (('PV profiles',), os.path.join(self.data_bank_root, 'pv'), self._scan_btm_pv_profile_data_bank),
+        ]
+
         def _scan_btm_data_bank():
             # Quit?
             if App.get_running_app().root.stop.is_set():
                 # Stop running this thread so the main Python process can exit.
                 return
 
-            self._scan_rate_structure_data_bank()
-            self._scan_btm_load_profile_data_bank()
-            self._scan_btm_pv_profile_data_bank()
+            if not self._scan_in_parallel(scans):
+                # Stop running this thread so the main Python process can exit.
+                return
 
             self.n_threads_scanning -= 1
         
@@ -289,65 +371,28 @@ class DataManager(EventDispatcher):
 
         self.n_threads_scanning = 1
 
-        def _scan_valuation_data_bank():
-            # Quit?
-            if App.get_running_app().root.stop.is_set():
-                # Stop running this thread so the main Python process can exit.
-                return
-
-            if 'ERCOT' in market_names:
-                self._scan_ercot_data_bank()
-            
-            # Quit?
-            if App.get_running_app().root.stop.is_set():
-                # Stop running this thread so the main Python process can exit.
-                return
-                
-            if 'PJM' in market_names:
-                self._scan_pjm_data_bank()
-            
-            # Quit?
-            if App.get_running_app().root.stop.is_set():
-                # Stop running this thread so the main Python process can exit.
-                return
-                
-            if 'MISO' in market_names:
-                self._scan_miso_data_bank()
-            
-            # Quit?
-            if App.get_running_app().root.stop.is_set():
-                # Stop running this thread so the main Python process can exit.
-                return
-
-            if 'NYISO' in market_names:
-                self._scan_nyiso_data_bank()
-            
-            # Quit?
-            if App.get_running_app().root.stop.is_set():
-                # Stop running this thread so the main Python process can exit.
-                return
-
-            if 'ISONE' in market_names:
-                self._scan_isone_data_bank()
-            
-            # Quit?
-            if App.get_running_app().root.stop.is_set():
-                # Stop running this thread so the main Python process can exit.
-                return
+        scan_functions = collections.OrderedDict([
+            ('ERCOT', self._scan_ercot_data_bank),
+            ('PJM', self._scan_pjm_data_bank),
+            ('MISO', self._scan_miso_data_bank),
+            ('NYISO', self._scan_nyiso_data_bank),
+            ('ISONE', self._scan_isone_data_bank),
+            ('SPP', self._scan_spp_data_bank),
+            ('CAISO', self._scan_caiso_data_bank),
+        ])
+
+        # Only the market areas whose data changed since the last scan are rescanned; the scans depend on the static node lists too.
+        scans = [(('valuation', market_area), os.path.join(self.data_bank_root, market_area), scan_function, False,
+                  [os.path.join(dirname, 'es_gui', 'apps', 'data_manager', '_static', 'nodes_{0}.csv'.format(market_area.lower()))])
+                 for market_area, scan_function in scan_functions.items() if market_area in market_names]
 
-            if 'SPP' in market_names:
-                self._scan_spp_data_bank()
-            
+        def _scan_valuation_data_bank():
             # Quit?
             if App.get_running_app().root.stop.is_set():
                 # Stop running this thread so the main Python process can exit.
                 return
 
-            if 'CAISO' in market_names:
-                self._scan_caiso_data_bank()
-            
-            # Quit?
-            if App.get_running_app().root.stop.is_set():
+            if not self._scan_in_parallel(scans):
                 # Stop running this thread so the main Python process can exit.
                 return
 
@@ -874,68 +919,93 @@ class DataManager(EventDispatcher):
         self.data_bank['valuation']['CAISO'] = caiso_data_bank
     
     def get_nodes(self, market_area):
-        """Retrieves all available pricing nodes for the given market_area."""
+        """
+        Retrieves all available pricing nodes for the given market_area.
+
+        The catalog of each market area is built once and shared by every screen until the data bank is rescanned.
+
+        :param market_area: The name of the market area.
+        :return: A NodeCatalog of node ID to node name, sorted by name.
+        """
+        # Market areas without a complete static node list use the nodes with downloaded data.
+        if market_area in NODE_DATA_TYPES:
+            data_bank_nodes = self.data_bank['valuation'][market_area][NODE_DATA_TYPES[market_area]]
+        else:
+            data_bank_nodes = None
+
+        try:
+            cached_nodes, catalog = self.node_catalogs[market_area]
+        except KeyError:
+            pass
+        else:
+            if cached_nodes is data_bank_nodes:
+                return catalog
+
+        catalog = NodeCatalog(self._get_node_names(market_area, data_bank_nodes))
+        self.node_catalogs[market_area] = (data_bank_nodes, catalog)
+
+        return catalog
+
+    def _get_node_names(self, market_area, data_bank_nodes):
+        """Returns a dictionary of node ID to node name of the pricing nodes of market_area, given the nodes with downloaded data for the market areas in NODE_DATA_TYPES."""
         if market_area == 'ERCOT':
             # Reads static node ID list.
             static_ercot_node_list = os.path.join(dirname, 'es_gui', 'apps', 'data_manager', '_static', 'nodes_ercot.csv')
 
-            node_df = pd.read_csv(static_ercot_node_list)
+            node_df = read_node_list(static_ercot_node_list)
             node_dict = {row[0]: row[1] for row in zip(node_df['Node ID'], node_df['Node Name'])}
         elif market_area == 'PJM':
             # Reads static node ID list.
             static_pjm_node_list = os.path.join(dirname, 'es_gui', 'apps', 'data_manager', '_static', 'nodes_pjm.csv')
-            node_df = pd.read_csv(static_pjm_node_list)
+            node_df = read_node_list(static_pjm_node_list)
             node_mapping = {str(row[0]): '{nodename} ({nodeid})'.format(nodename=row[1], nodeid=row[0]) for row in zip(node_df['Node ID'], node_df['Node Name'])}
 
             # Reads keys of PJM LMP data bank.
-            node_id_list = self.data_bank['valuation']['PJM']['LMP'].keys()
+            node_id_list = data_bank_nodes.keys()
             node_dict = {node_id: node_mapping.get(node_id, node_id) for node_id in node_id_list}
         elif market_area == 'MISO':
             # Reads static node ID list.
             static_miso_node_list = os.path.join(dirname, 'es_gui', 'apps', 'data_manager', '_static', 'nodes_miso.csv')
 
-            node_df = pd.read_csv(static_miso_node_list)
+            node_df = read_node_list(static_miso_node_list)
             node_dict = {row[0]: row[1] for row in zip(node_df['Node ID'], node_df['Node Name'])}
         elif market_area == 'NYISO':
             # Reads static node ID list.
             static_nyiso_node_list = os.path.join(dirname, 'es_gui', 'apps', 'data_manager', '_static', 'nodes_nyiso.csv')
-            node_df = pd.read_csv(static_nyiso_node_list)
+            node_df = read_node_list(static_nyiso_node_list)
             node_mapping = {row[0]: row[1] for row in zip(node_df['Node ID'], node_df['Node Name'])}
 
             # Reads keys of NYISO LBMP data bank.
-            node_id_list = self.data_bank['valuation']['NYISO']['LBMP'].keys()
+            node_id_list = data_bank_nodes.keys()
             node_dict = {node_id: node_mapping.get(node_id, node_id) for node_id in node_id_list}
         elif market_area == 'ISONE':
             # Reads static node ID list.
             static_isone_node_list = os.path.join(dirname, 'es_gui', 'apps', 'data_manager', '_static', 'nodes_isone.csv')
-            node_df = pd.read_csv(static_isone_node_list, encoding="cp1252")
+            node_df = read_node_list(static_isone_node_list, encoding="cp1252")
 
             node_dict = {str(row[0]): '{nodename} ({nodeid})'.format(nodename=row[1], nodeid=row[0]) for row in zip(node_df['Node ID'], node_df['Node Name'])}
 
             # Reads keys of PJM LMP data bank.
-            node_id_list = self.data_bank['valuation']['ISONE']['LMP'].keys()
+            node_id_list = data_bank_nodes.keys()
             node_dict = {node_id: node_dict.get(node_id, node_id) for node_id in node_id_list}
         elif market_area == 'SPP':
             # Reads static node ID list.
             static_spp_node_list = os.path.join(dirname, 'es_gui', 'apps', 'data_manager', '_static', 'nodes_spp.csv')
 
-            node_df = pd.read_csv(static_spp_node_list)
+            node_df = read_node_list(static_spp_node_list)
             node_dict = {row[0]: row[1] for row in zip(node_df['Node ID'], node_df['Node Name'])}
         elif market_area == 'CAISO':
             # Reads static node ID list.
             static_caiso_node_list = os.path.join(dirname, 'es_gui', 'apps', 'data_manager', '_static', 'nodes_caiso.csv')
-            node_df = pd.read_csv(static_caiso_node_list)
+            node_df = read_node_list(static_caiso_node_list)
 
-            node_id_list = self.data_bank['valuation']['CAISO']['LMP'].keys()
+            node_id_list = data_bank_nodes.keys()
             node_dict = {node_x: node_x for node_x in node_id_list}
         # Use the PJM pattern of reading data_bank node keys to generate the node_dict (key = value) if no CSV LUT exists.
         else:
             raise(DataManagerException('Invalid market_area given (got {0})'.format(market_area)))
-        
-        # Sort by name alphabetically before returning.
-        return_dict = collections.OrderedDict(sorted(node_dict.items(), key=lambda t: t[1]))
-        
-        return return_dict
+
+        return node_dict
     
     def get_valuation_revstreams(self, market_area, node):
         """Retrieves the available revenue streams for a given node in a given market_area based on downloaded data."""
@@ -5,8 +5,9 @@ import json
 
 import pandas as pd
 
-from btm.es_gui.tools.dms import DataManagementSystem
+from btm.es_gui.tools.dms import DataManagementSystem, loader
 from btm.es_gui.tools.btm.readutdata import *
+from btm.es_gui.tools.btm.tariff import compile_tariff, get_schedules, tariff_key
 
 
 class BtmDMS(DataManagementSystem):
@@ -21,32 +22,53 @@ class BtmDMS(DataManagementSystem):
         self.home_path = home_path
         self.delimiter = ' @ '  # delimiter used to split information in id_key
     
-    def get_load_profile_data(self, path, month):
-        """Retrieves commercial or residential load profile data."""
+    @loader
+    def get_annual_load_profile(self, path):
+        """Retrieves the annual hourly commercial or residential load profile data."""
         logging.info('DMS: Loading load profile data')
 
-        month = str(month)
-        load_profile_key = self.delimiter.join([path, month])
+        try:
+            load_profile = self.get_data(path)
+        except KeyError:
+            load_profile = read_annual_load_profile(path)
+            self.add_data(load_profile, path)
+
+        return load_profile
+
+    @loader
+    def get_load_profile_data(self, path, month):
+        """Retrieves commercial or residential load profile data for the month (1-12). The annual profile is parsed once and each month is a view of it."""
+        return profile_month(self.get_annual_load_profile(path), month)
+
+    @loader
+    def get_annual_pv_profile(self, path):
+        """Retrieves the annual hourly PV profile data."""
+        logging.info('DMS: Loading PV profile data')
 
         try:
-            load_profile = self.get_data(load_profile_key)
+            pv_profile = self.get_data(path)
         except KeyError:
-            load_profile = read_load_profile(path, month)
-            self.add_data(load_profile, load_profile_key)
-        finally:
-            return load_profile
-    
+            pv_profile = read_annual_pv_profile(path)
+            self.add_data(pv_profile, path)
+
+        return pv_profile
+
+    @loader
     def get_pv_profile_data(self, path, month):
-        """Retrieves PV profile data."""
-        logging.info('DMS: Loading PV profile data')
+        """Retrieves PV profile data for the month (1-12). The annual profile is parsed once and each month is a view of it."""
+        return profile_month(self.get_annual_pv_profile(path), month)
+
+    @loader
+    def get_tariff(self, rate_structure, year):
+        """Retrieves the compiled tariff of the rate structure for the year, shared by rate structures with the same schedules."""
+        logging.info('DMS: Loading compiled tariff')
 
-        month = str(month)
-        pv_profile_key = self.delimiter.join([path, month])
+        tariff_id = self.delimiter.join(['tariff', tariff_key(rate_structure, year)])
 
         try:
-            pv_profile = self.get_data(pv_profile_key)
+            tariff = self.get_data(tariff_id)
         except KeyError:
-            pv_profile = read_pv_profile(path, month)
-            self.add_data(pv_profile, pv_profile_key)
-        finally:
-            return pv_profile
\ No newline at end of file
+            tariff = compile_tariff(year, *get_schedules(rate_structure))
+            self.add_data(tariff, tariff_id)
+
+        return tariff
@@ -13,6 +13,12 @@ from btm.es_gui.tools.btm.constraints import ExpressionsBlock
 
 class BtmOptimizer(optimizer.Optimizer):
     """A framework wrapper class for creating Pyomo ConcreteModels for behind the meter valuation."""
+    CACHED_ATTRIBUTES = ('total_bill_with_es', 'total_bill_without_es',
+                         'demand_charge_with_es', 'demand_charge_without_es',
+                         'energy_charge_with_es', 'energy_charge_without_es',
+                         'nem_charge_with_es', 'nem_charge_without_es',
+                         'peak_demand_with_es', 'peak_demand_without_es')
+    FORMULATION_VERSION = 2
 
     def __init__(self, tou_energy_schedule = None, tou_energy_rate=None, 
                  tou_demand_schedule=None, tou_demand_rate=None, flat_demand_rate=None,
@@ -55,6 +61,8 @@ class BtmOptimizer(optimizer.Optimizer):
         self._demand_charge_without_es = 0
         self._nem_charge_with_es = 0
         self._nem_charge_without_es = 0
+        self._peak_demand_with_es = 0
+        self._peak_demand_without_es = 0
         
  #---------------------------------------------------   
     @property
@@ -289,6 +297,24 @@ class BtmOptimizer(optimizer.Optimizer):
     def nem_charge_without_es(self, value):
         self._nem_charge_without_es = value
 
+    @property
+    def peak_demand_with_es(self):
+        """The peak net demand for the month with energy storage [kW]."""
+        return self._peak_demand_with_es
+
+    @peak_demand_with_es.setter
+    def peak_demand_with_es(self, value):
+        self._peak_demand_with_es = value
+
+    @property
+    def peak_demand_without_es(self):
+        """The peak net demand for the month without energy storage [kW]."""
+        return self._peak_demand_without_es
+
+    @peak_demand_without_es.setter
+    def peak_demand_without_es(self, value):
+        self._peak_demand_without_es = value
+
     def _set_model_param(self):
         """Sets the model params for the Pyomo ConcreteModel."""
         m = self.model
@@ -421,29 +447,29 @@ class BtmOptimizer(optimizer.Optimizer):
             # self.tou_demand_rate is of type 'NoneType'
             m.period = []
         
-        m.tou_er = [self.tou_energy_rate[self.tou_energy_schedule[t]] for t in range(m.nhr)]
+        energy_schedule = np.asarray(self.tou_energy_schedule, dtype=int)
+        m.tou_er = np.asarray(self.tou_energy_rate, dtype=float)[energy_schedule]
         
         m.tou_dr = self.tou_demand_rate
         
-        mask_ds = []
-        for i in range(m.dml):
-            listi=[int(self.tou_demand_schedule[t]==i) for t in range(m.nhr)]
-            mask_ds.append(listi)
-       
-        m.mask_ds = mask_ds
+        # Sparse period membership: the hours in each TOU demand period, and the (period, hour) pairs for the TOU demand constraints.
+        demand_schedule = np.asarray(self.tou_demand_schedule, dtype=int)[:m.nhr]
+        m.period_hours = [np.flatnonzero(demand_schedule == p) for p in range(m.dml)]
+        m.tou_demand_index = Set(dimen=2, ordered=True,
+                                 initialize=[(p, t) for p in range(m.dml) for t in m.period_hours[p].tolist()])
         
         m.flt_dr = self.flat_demand_rate
         
         if self.nem_type==0:
-            m.nem_sr=[0 for t in range(m.nhr)]
+            m.nem_sr = np.zeros(m.nhr)
         elif self.nem_type==1:
-            m.nem_sr=[self.nem_rate for t in range(m.nhr)]
+            m.nem_sr = np.full(m.nhr, self.nem_rate, dtype=float)
         else:
             m.nem_sr=m.tou_er
         
         m.pld = self.load_profile
         m.ppv = self.pv_profile
-        m.pnet= [m.pld[t]-m.ppv[t] for t in range(m.nhr)]
+        m.pnet = np.asarray(m.pld, dtype=float)[:m.nhr] - np.asarray(m.ppv, dtype=float)[:m.nhr]
         
 #        m.cost_cha = self.cost_charge
 #        m.cost_dis = self.cost_discharge
@@ -470,21 +496,25 @@ class BtmOptimizer(optimizer.Optimizer):
         """Processes optimization results for further evaluation."""
         m = self.model
 
-        pcha = [m.pcha[n].value for n in m.time]
-        pdis = [m.pdis[n].value for n in m.time]
-        ptot = [m.pnet[n] + m.pcha[n].value - m.pdis[n].value for n in m.time]
-        soc  = [m.s[n].value for n in m.time]
+        pcha = np.array([v.value for v in m.pcha.values()], dtype=float)
+        pdis = np.array([v.value for v in m.pdis.values()], dtype=float)
+        ptot = m.pnet + pcha - pdis
+        soc  = np.array([v.value for v in m.s.values()], dtype=float)
         pfpk_without_es = max(m.pnet)
-        ptpk_without_es = [max(m.pnet[n]*m.mask_ds[p][n] for n in m.time) for p in m.period]
+        ptpk_without_es = []
+        for hours in m.period_hours:
+            # Hours outside of the period count as zero demand.
+            demand = m.pnet[hours] if len(hours) == m.nhr else np.append(m.pnet[hours], 0)
+            ptpk_without_es.append(max(demand))
         
         demand_charge_with_es=m.pfpk.value*m.flt_dr+sum(m.ptpk[p].value*m.tou_dr[p] for p in m.period)
         demand_charge_without_es=pfpk_without_es*m.flt_dr+sum(ptpk_without_es[p]*m.tou_dr[p] for p in m.period)
         
-        energy_charge_with_es=sum(max(0,ptot[n])*m.tou_er[n] for n in m.time)
-        energy_charge_without_es=sum(max(0,m.pnet[n])*m.tou_er[n] for n in m.time)
+        energy_charge_with_es=float(np.dot(np.maximum(0, ptot), m.tou_er))
+        energy_charge_without_es=float(np.dot(np.maximum(0, m.pnet), m.tou_er))
         
-        nem_charge_with_es=sum(min(0,ptot[n])*m.nem_sr[n] for n in m.time) #negative since it is credit
-        nem_charge_without_es=sum(min(0,m.pnet[n])*m.nem_sr[n] for n in m.time) #negative since it is credit
+        nem_charge_with_es=float(np.dot(np.minimum(0, ptot), m.nem_sr)) #negative since it is credit
+        nem_charge_without_es=float(np.dot(np.minimum(0, m.pnet), m.nem_sr)) #negative since it is credit
         
         tot_bill_with_es=demand_charge_with_es + energy_charge_with_es + nem_charge_with_es
         tot_bill_without_es=demand_charge_without_es + energy_charge_without_es + nem_charge_without_es
@@ -507,7 +537,17 @@ class BtmOptimizer(optimizer.Optimizer):
 
         self.nem_charge_with_es = nem_charge_with_es
         self.nem_charge_without_es = nem_charge_without_es
+
+        self.peak_demand_with_es = m.pfpk.value
+        self.peak_demand_without_es = float(pfpk_without_es)
         
+    def _cache_inputs(self):
+        """Returns a dictionary of the inputs that determine the results besides the model parameters."""
+        return {'tou_energy_schedule': self.tou_energy_schedule, 'tou_energy_rate': self.tou_energy_rate,
+                'tou_demand_schedule': self.tou_demand_schedule, 'tou_demand_rate': self.tou_demand_rate,
+                'flat_demand_rate': self.flat_demand_rate, 'nem_type': self.nem_type, 'nem_rate': self.nem_rate,
+                'load_profile': self.load_profile, 'pv_profile': self.pv_profile}
+
     def get_results(self):
         """Returns the decision variables and derived quantities in a DataFrame"""
         return self.results
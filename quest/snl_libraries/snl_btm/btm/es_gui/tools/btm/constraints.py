@@ -75,11 +75,11 @@ def ineq_peak_demand(m):
     m.peak_demand = Constraint(mp.time, rule=_ineq_peak_demand)
 
 def ineq_tou_demand(m):
-    """Requires all net power at time t period p less the peak demand of period p"""
+    """Requires all net power at time t in period p less the peak demand of period p; only the hours in each period are constrained"""
     mp = m.parent_block()
     def _ineq_tou_demand(_m, p, t):
-        return mp.mask_ds[p][t]*(mp.pnet[t]+mp.pcha[t]-mp.pdis[t])<=mp.ptpk[p]
-    m.tou_demand = Constraint(mp.period, mp.time, rule=_ineq_tou_demand)
+        return mp.pnet[t]+mp.pcha[t]-mp.pdis[t]<=mp.ptpk[p]
+    m.tou_demand = Constraint(mp.tou_demand_index, rule=_ineq_tou_demand)
     
 def ineq_nem_xnet(m):
     """Requires all net power at time t less the peak demand"""
@@ -11,7 +11,8 @@ import pandas as pd
 from pandas import json_normalize
 import numpy as np
 import json
-import holidays
+import calendar
+from btm.es_gui.tools.btm.tariff import compile_tariff
 from datetime import datetime
 import datetime as dt
 
@@ -184,52 +185,48 @@ def find_utschld(**kwargs):
 #    schld_data=json_normalize(schld['items'])
     return schld['items'] # this is a list of schedules in which each element contains the full details of a schedule.
 
-def read_load_profile(path, month):
-    """Reads the annual load profile file located at path and returns the array of the load profile for the given month."""
-    load_df = pd.read_csv(path)
+# The first hour of the annual load and PV profiles.
+PROFILE_START = datetime(2019, 1, 1, 0)
 
-    if isinstance(month, str):
-        month = int(month)
+# The offset of the first hour of each month, and of the end of the year, in an annual hourly profile starting at PROFILE_START.
+MONTH_OFFSETS = np.cumsum([0] + [calendar.monthrange(PROFILE_START.year, month)[1]*24 for month in range(1, 13)])
+
+def read_annual_load_profile(path):
+    """Reads the annual load profile file located at path and returns the array of the hourly load profile."""
+    load_df = pd.read_csv(path)
 
     # Assumptions: column 0 is datetime, column 1 is data
-    datetime_column_name = load_df.columns[0]
     data_column_name = load_df.columns[-1]
 
-    # Overwrite DateTime column (esp. for data obtained from OpenEI)
-    datetime_start = datetime(2019, 1, 1, 0)
-    hour_range = pd.date_range(start=datetime_start, periods=len(load_df), freq="H")
-    load_df[datetime_column_name] = hour_range
-
-    # Filter by given month.
-    datetime_column = pd.to_datetime(load_df[datetime_column_name])
-    load_df_month = load_df.loc[datetime_column.apply(lambda x: x.month == month)]
-    load_profile = load_df_month[data_column_name].values
+    return load_df[data_column_name].values
 
-    return load_profile
-
-def read_pv_profile(path, month):
-    """Reads the annual PV profile file located at path and returns the array of the PV profile for the given month."""
-    if isinstance(month, str):
-        month = int(month)
-    
+def read_annual_pv_profile(path):
+    """Reads the annual PV profile file located at path and returns the array of the hourly PV profile in kW."""
     with open(path) as f:
         profile_obj = json.load(f)
-        
-    pv_output_w = profile_obj['outputs']['ac']
 
     # Convert to kW.
-    df_pv_output = pd.DataFrame(pv_output_w, columns=['kW'])*1e-3
+    return np.asarray(profile_obj['outputs']['ac'], dtype=float)*1e-3
+
+def profile_month(profile, month):
+    """Returns the part of the annual hourly profile, starting at PROFILE_START, in the given month; the part is a view of profile unless the profile runs past the end of the year."""
+    month = int(month)
 
-    # Apply datetime index for filtering.
-    datetime_start = datetime(2019, 1, 1, 0)
-    hour_range = pd.date_range(start=datetime_start, periods=len(pv_output_w), freq='H')
-    df_pv_output['dt'] = hour_range
+    if len(profile) <= MONTH_OFFSETS[-1]:
+        return profile[MONTH_OFFSETS[month - 1]:MONTH_OFFSETS[month]]
 
-    # Filter by given month.
-    df_pv_month = df_pv_output.loc[df_pv_output['dt'].apply(lambda x: x.month == month)]
-    pv_output_kw = df_pv_month['kW'].values
+    # Hours past the end of the year fall in the months of the following year.
+    hour_range = pd.date_range(start=PROFILE_START, periods=len(profile), freq='h')
 
-    return pv_output_kw
+    return profile[hour_range.month == month]
+
+def read_load_profile(path, month):
+    """Reads the annual load profile file located at path and returns the array of the load profile for the given month."""
+    return profile_month(read_annual_load_profile(path), month)
+
+def read_pv_profile(path, month):
+    """Reads the annual PV profile file located at path and returns the array of the PV profile for the given month."""
+    return profile_month(read_annual_pv_profile(path), month)
 
 def get_pv_profile_string(path):
     """Reads the PV profile JSON object and returns a list of string descriptors."""
@@ -277,32 +274,14 @@ def input_df(year,wkday_eschld,wkend_eschld,wkday_dschld,wkend_dschld):
     
     :return opt_df: a Pandas dataframe with the following template:|year|month|day|hour|tou_energy_schedule|tou_demand_schedule|
     """
-    column_list=['year','month','day','hour','tou_energy_schedule','tou_demand_schedule']
-    data_list=[]
-    nday={1:31,2:28,3:31,4:30,5:31,6:30,7:31,8:31,9:30,10:31,11:30,12:31}
-    
-    if int(year)%4==0:
-        nday[2]=29
-        
-    us_holidays=holidays.UnitedStates()
-    for month in range(1,13):
-        for day in range(1,nday[month]+1):
-            date=datetime(year, month, day)
-            dayofweek = date.weekday()
-            for hour in range(1,25):
-                if (date in us_holidays) or (dayofweek>4):
-                    if len(wkend_dschld)>1:  
-                        row=[year,month,day,hour,wkend_eschld[month-1][hour-1],wkend_dschld[month-1][hour-1]]
-                    else:
-                        row=[year,month,day,hour,wkend_eschld[month-1][hour-1],0]
-                else:
-                    if len(wkday_dschld)>1:  
-                        row=[year,month,day,hour,wkday_eschld[month-1][hour-1],wkday_dschld[month-1][hour-1]]
-                    else:
-                        row=[year,month,day,hour,wkday_eschld[month-1][hour-1],0]
-                    
-                data_list.append(row)
-    opt_df=pd.DataFrame(data=data_list,columns=column_list)
+    tariff=compile_tariff(year,wkday_eschld,wkend_eschld,wkday_dschld,wkend_dschld)
+    n_hours=tariff.shape[1]
+
+    days=np.arange(np.datetime64('{0}-01-01'.format(int(year))), np.datetime64('{0}-01-01'.format(int(year)+1)))
+    day_of_month=(days-days.astype('datetime64[M]')).astype(int)+1
+
+    opt_df=pd.DataFrame({'year':np.full(n_hours,year),'month':tariff[0],'day':np.repeat(day_of_month,24),
+                         'hour':np.tile(np.arange(1,25),len(days)),'tou_energy_schedule':tariff[1],'tou_demand_schedule':tariff[2]})
 
     return opt_df
                     
@@ -0,0 +1,70 @@
+from __future__ import absolute_import
+
+import hashlib
+import json
+
+import holidays
+import numpy as np
+
+# The rows of a compiled tariff array, one column per hour of the year.
+TARIFF_ROWS = ('month', 'tou_energy_schedule', 'tou_demand_schedule')
+
+
+def compile_tariff(year, wkday_eschld, wkend_eschld, wkday_dschld, wkend_dschld):
+    """
+    Expands the time-of-use schedules of a rate structure to the hours of a year.
+
+    Weekends and US federal holidays follow the weekend schedules. A demand schedule with fewer than two months is treated as having no time-of-use demand periods.
+
+    :param year: an integer.
+    :param wkday_eschld: a 12x24 array-like, wkday_eschld[i][j] is the tou energy period of hour j+1 in a weekday of month i+1
+    :param wkend_eschld: a 12x24 array-like, wkend_eschld[i][j] is the tou energy period of hour j+1 in a weekend day or a holiday of month i+1
+    :param wkday_dschld: a 12x24 array-like, wkday_dschld[i][j] is the tou demand period of hour j+1 in a weekday of month i+1
+    :param wkend_dschld: a 12x24 array-like, wkend_dschld[i][j] is the tou demand period of hour j+1 in a weekend day or a holiday of month i+1
+
+    :return: a 3 x (number of hours in the year) NumPy ndarray with the month, tou energy period, and tou demand period of each hour, in the order of TARIFF_ROWS.
+    """
+    year = int(year)
+    days = np.arange(np.datetime64('{0}-01-01'.format(year)), np.datetime64('{0}-01-01'.format(year + 1)))
+
+    month = (days.astype('datetime64[M]').astype(int) % 12) + 1
+    # 1970-01-01 was a Thursday; Monday is 0 as in datetime.weekday().
+    day_of_week = (days.astype(int) + 3) % 7
+
+    us_holidays = np.array(sorted(holidays.UnitedStates(years=year)), dtype='datetime64[D]')
+    weekend = (day_of_week > 4) | np.isin(days, us_holidays)
+
+    def _expand(wkday_schld, wkend_schld):
+        wkday_schld = np.asarray(wkday_schld) if len(wkday_schld) > 1 else np.zeros((12, 24), dtype=int)
+        wkend_schld = np.asarray(wkend_schld) if len(wkend_schld) > 1 else np.zeros((12, 24), dtype=int)
+
+        return np.where(weekend[:, np.newaxis], wkend_schld[month - 1], wkday_schld[month - 1]).ravel()
+
+    tariff = np.empty((len(TARIFF_ROWS), len(days)*24), dtype=int)
+    tariff[0] = np.repeat(month, 24)
+    tariff[1] = _expand(wkday_eschld, wkend_eschld)
+    tariff[2] = _expand(wkday_dschld, wkend_dschld)
+
+    return tariff
+
+
+def get_schedules(rate_structure):
+    """Returns the weekday and weekend energy and demand schedules of a rate structure saved by QuESt, in the order of the arguments of compile_tariff()."""
+    return (rate_structure['energy rate structure']['weekday schedule'],
+            rate_structure['energy rate structure']['weekend schedule'],
+            rate_structure['demand rate structure']['weekday schedule'],
+            rate_structure['demand rate structure']['weekend schedule'])
+
+
+def tariff_key(rate_structure, year):
+    """Returns the hex digest identifying the compiled tariff of the rate structure for the year: rate structures with the same schedules share it."""
+    schedules = json.dumps([int(year), get_schedules(rate_structure)], sort_keys=True)
+
+    return hashlib.sha1(schedules.encode('utf-8')).hexdigest()
+
+
+def month_schedules(tariff, month):
+    """Returns views of the hourly tou energy and demand periods of the compiled tariff for the month (1-12)."""
+    start, stop = np.searchsorted(tariff[0], [month, month + 1])
+
+    return tariff[1, start:stop], tariff[2, start:stop]
@@ -0,0 +1,173 @@
+from __future__ import absolute_import
+
+from collections import OrderedDict
+from contextlib import contextmanager
+import json
+import time
+
+import pandas as pd
+from pyomo.environ import Constraint
+from pyomo.core.expr.visitor import identify_variables
+
+# Methods of Pyomo solver interfaces that run as separate executables, e.g., GLPK, and the phase each is timed as.
+SOLVER_PHASES = OrderedDict([('_presolve', 'write'), ('_apply_solver', 'solver'), ('_postsolve', 'load')])
+
+
+class RunStats(object):
+    """
+    Instrumentation of one solve of an Optimizer: the wall clock and CPU time of each phase, the size of the model, and what the solver reports.
+
+    Phases are timed in the order they are first entered; timing a phase again adds to its totals.
+    """
+    def __init__(self):
+        self.phases = OrderedDict()
+        self.model_size = OrderedDict()
+        self.solver = OrderedDict()
+        self.cached = False
+
+    @contextmanager
+    def phase(self, name):
+        """Context manager timing the enclosed block as the named phase."""
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+
+        try:
+            yield
+        finally:
+            wall, cpu = self.phases.get(name, (0.0, 0.0))
+            self.phases[name] = (wall + time.perf_counter() - wall_start, cpu + time.process_time() - cpu_start)
+
+    @contextmanager
+    def solver_phases(self, solver):
+        """Context manager timing the steps of a Pyomo solver interface that runs a separate executable as the phases in SOLVER_PHASES, or the whole block as 'solve' for other interfaces."""
+        if not all(hasattr(solver, method) for method in SOLVER_PHASES):
+            with self.phase('solve'):
+                yield
+
+            return
+
+        for method, name in SOLVER_PHASES.items():
+            setattr(solver, method, self._timed(name, getattr(solver, method)))
+
+        try:
+            yield
+        finally:
+            # Remove the instance attributes shadowing the methods of the class.
+            for method in SOLVER_PHASES:
+                delattr(solver, method)
+
+    def _timed(self, name, method):
+        def _timed_method(*args, **kwargs):
+            with self.phase(name):
+                return method(*args, **kwargs)
+
+        return _timed_method
+
+    @property
+    def wall_time(self):
+        """The total wall clock time of the phases [s]."""
+        return sum(wall for wall, _ in self.phases.values())
+
+    @property
+    def cpu_time(self):
+        """The total CPU time of this process during the phases [s]; the time of solver executables is not included."""
+        return sum(cpu for _, cpu in self.phases.values())
+
+    def set_model_size(self, variables, constraints, nonzeros):
+        """Records the number of variables, constraints, and nonzero constraint coefficients of the model."""
+        self.model_size.update(variables=int(variables), constraints=int(constraints), nonzeros=int(nonzeros))
+
+    def set_solver_info(self, name, termination=None, iterations=None):
+        """Records the name of the solver, its termination condition, and its iteration count, where known."""
+        self.solver.update(name=name, termination=None if termination is None else str(termination),
+                           iterations=None if iterations is None else int(iterations))
+
+    def as_dict(self):
+        """Returns the statistics as a dictionary of JSON serializable values."""
+        return {'cached': self.cached, 'wall_time': self.wall_time, 'cpu_time': self.cpu_time,
+                'phases': OrderedDict((name, {'wall': wall, 'cpu': cpu}) for name, (wall, cpu) in self.phases.items()),
+                'model_size': dict(self.model_size), 'solver': dict(self.solver)}
+
+
+def model_size(model):
+    """Returns the number of variables in active constraints, active constraints, and nonzero constraint coefficients of the Pyomo model."""
+    variables = set()
+    constraints = 0
+    nonzeros = 0
+
+    for constraint in model.component_data_objects(Constraint, active=True):
+        constraint_variables = set(id(var) for var in identify_variables(constraint.body, include_fixed=False))
+
+        variables.update(constraint_variables)
+        constraints += 1
+        nonzeros += len(constraint_variables)
+
+    return len(variables), constraints, nonzeros
+
+
+def solver_iterations(solver, results=None):
+    """Returns the iteration count reported by the Pyomo solver interface or its results, or None if it is not reported."""
+    # HiGHS through the APPSI interface.
+    highs = getattr(solver, '_solver_model', None)
+
+    if highs is not None and hasattr(highs, 'getInfo'):
+        info = highs.getInfo()
+        return info.simplex_iteration_count + max(info.ipm_iteration_count, 0)
+
+    try:
+        return int(results.solver.statistics.black_box.number_of_iterations)
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def stats_table(run_stats, labels=None):
+    """
+    Returns a DataFrame with one row of statistics per solve.
+
+    :param run_stats: A list of RunStats objects.
+    :param labels: A list of the label of each solve for the index, or None to number them.
+    :return: A DataFrame with the total and per phase wall clock and CPU times, the model size, and the solver information.
+    """
+    rows = []
+
+    for stats in run_stats:
+        row = OrderedDict([('cached', stats.cached), ('wall_time', stats.wall_time), ('cpu_time', stats.cpu_time)])
+
+        for name, (wall, cpu) in stats.phases.items():
+            row['{0}_wall'.format(name)] = wall
+            row['{0}_cpu'.format(name)] = cpu
+
+        row.update(stats.model_size)
+        row.update(('solver_{0}'.format(key), value) for key, value in stats.solver.items())
+        rows.append(row)
+
+    return pd.DataFrame(rows, index=labels)
+
+
+def phase_summary(run_stats):
+    """Returns a DataFrame with one row per phase of the total and mean wall clock and CPU times over the solves in run_stats and the share of the total wall clock time spent in each phase."""
+    totals = OrderedDict()
+
+    for stats in run_stats:
+        for name, (wall, cpu) in stats.phases.items():
+            count, total_wall, total_cpu = totals.get(name, (0, 0.0, 0.0))
+            totals[name] = (count + 1, total_wall + wall, total_cpu + cpu)
+
+    summary = pd.DataFrame([(name, count, wall, wall/count, cpu, cpu/count) for name, (count, wall, cpu) in totals.items()],
+                           columns=['phase', 'count', 'wall_total', 'wall_mean', 'cpu_total', 'cpu_mean']).set_index('phase')
+    summary['wall_share'] = summary['wall_total']/max(summary['wall_total'].sum(), 1e-12)
+
+    return summary
+
+
+def write_trace(fname, run_stats, labels=None):
+    """Writes the statistics of each solve in run_stats, with its label if labels is given, to fname as a JSON list."""
+    trace = []
+
+    for ix, stats in enumerate(run_stats):
+        entry = stats.as_dict()
+        entry['label'] = labels[ix] if labels is not None else ix
+        trace.append(entry)
+
+    with open(fname, 'w') as f:
+        json.dump(trace, f, indent=2)
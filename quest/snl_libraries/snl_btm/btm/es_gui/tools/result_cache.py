@@ -0,0 +1,156 @@
+from __future__ import absolute_import
+
+import hashlib
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from btm.es_gui.tools.dms import FileLock
+
+
+class ResultCache(object):
+    """
+    A store on disk of the results of solved Optimizers, keyed by a hash of everything that determines them: the Optimizer class and formulation version, the solver, the input data, and the model parameters. Each entry holds the results DataFrame and the headline numbers of one solve as a compressed .npz file. Files are written atomically; writing and evicting are serialized between processes by a lock file.
+
+    :param path: The path to the directory holding the cache.
+    :param max_size: The maximum size, in bytes, of the cache; the least recently used entries are deleted when it is exceeded.
+    """
+    LOCK_NAME = '.lock'
+
+    def __init__(self, path, max_size=100000000):
+        self.path = path
+        self.max_size = max_size
+
+        os.makedirs(self.path, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts):
+        """Returns the hex digest identifying the given parts, which may be scalars, strings, array-likes, dictionaries, or sequences of them."""
+        h = hashlib.sha256()
+
+        for part in parts:
+            _update_hash(h, part)
+
+        return h.hexdigest()
+
+    def _fname(self, key):
+        return os.path.join(self.path, key + '.npz')
+
+    def get(self, key):
+        """Returns a tuple of the results DataFrame and a dictionary of headline numbers stored for key, or None if there is no entry."""
+        fname = self._fname(key)
+
+        try:
+            with np.load(fname, allow_pickle=False) as data:
+                columns = list(data['columns'])
+                results = pd.DataFrame({column: data['column_{0}'.format(ix)] for ix, column in enumerate(columns)},
+                                       columns=columns)
+                attributes = {name: data['attribute_{0}'.format(ix)].item() for ix, name in enumerate(data['attributes'])}
+
+            # Mark as recently used for eviction.
+            os.utime(fname)
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+
+        return results, attributes
+
+    def put(self, key, results, attributes):
+        """Stores the results DataFrame and the dictionary of headline numbers for key, replacing any entry already stored. Results that are not numeric are not stored."""
+        arrays = {'columns': np.array([str(column) for column in results.columns]),
+                  'attributes': np.array(list(attributes), dtype=str)}
+
+        for ix, column in enumerate(results.columns):
+            arrays['column_{0}'.format(ix)] = results[column].values
+
+        for ix, value in enumerate(attributes.values()):
+            arrays['attribute_{0}'.format(ix)] = np.asarray(value)
+
+        if any(array.dtype == object for array in arrays.values()):
+            logging.info('ResultCache: The results are not numeric and will not be cached.')
+            return
+
+        fname = self._fname(key)
+        tmp_fname = '{0}.{1}.tmp'.format(fname, os.getpid())
+
+        with FileLock(os.path.join(self.path, self.LOCK_NAME)):
+            with open(tmp_fname, 'wb') as f:
+                np.savez_compressed(f, **arrays)
+
+            os.replace(tmp_fname, fname)
+
+            self._manage_size()
+
+    def clear(self):
+        """Deletes every entry in the cache."""
+        with FileLock(os.path.join(self.path, self.LOCK_NAME)):
+            for dir_entry in os.scandir(self.path):
+                if dir_entry.name.endswith('.npz'):
+                    try:
+                        os.remove(dir_entry.path)
+                    except OSError:
+                        continue
+
+    def _manage_size(self):
+        """Deletes the least recently used entries until the cache is within its maximum size. Must be called with the lock held."""
+        entries = []
+
+        for dir_entry in os.scandir(self.path):
+            if dir_entry.name.endswith('.npz'):
+                try:
+                    stat = dir_entry.stat()
+                except OSError:
+                    continue
+
+                entries.append((stat.st_mtime, stat.st_size, dir_entry.path))
+
+        cache_sz = sum(size for _, size, _ in entries)
+
+        for _, size, fname in sorted(entries):
+            if cache_sz <= self.max_size:
+                break
+
+            try:
+                os.remove(fname)
+            except OSError:
+                continue
+
+            cache_sz -= size
+
+
+def _update_hash(h, value):
+    """Updates the hash object h with a representation of value that distinguishes its type, shape, and contents."""
+    if isinstance(value, dict):
+        h.update(b'dict')
+
+        for item_key in sorted(value, key=str):
+            _update_hash(h, str(item_key))
+            _update_hash(h, value[item_key])
+    elif value is None or isinstance(value, (str, bool, int, float, np.generic)):
+        h.update(repr(value).encode('utf-8'))
+    else:
+        array = np.asarray(value)
+
+        if array.dtype == object:
+            h.update(repr(array.tolist()).encode('utf-8'))
+        else:
+            h.update('{0}{1}'.format(array.dtype.str, array.shape).encode('utf-8'))
+            h.update(np.ascontiguousarray(array).tobytes())
+
+    # Delimit values so that consecutive values cannot run together.
+    h.update(b';')
+
+
+_result_cache = None
+
+
+def get_result_cache():
+    """Returns the ResultCache used by Optimizers that have not been given their own, or None if results are not cached."""
+    return _result_cache
+
+
+def set_result_cache(cache):
+    """Sets the ResultCache used by Optimizers that have not been given their own; None disables caching."""
+    global _result_cache
+    _result_cache = cache
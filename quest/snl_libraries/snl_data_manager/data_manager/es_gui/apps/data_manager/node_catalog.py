@@ -0,0 +1,101 @@
+from __future__ import absolute_import
+
+import collections
+import collections.abc
+import threading
+
+import pandas as pd
+
+# The longest substrings of node names in the index; longer filters are verified against the names matching their rarest substring.
+INDEX_NGRAM = 3
+
+_node_lists = {}
+_node_lists_lock = threading.Lock()
+
+
+def read_node_list(fname, **kwargs):
+    """
+    Returns the DataFrame of a static node list, reading it only the first time it is requested in the process.
+
+    :param fname: The path to the .csv node list.
+    :param kwargs: Keyword arguments for pandas.read_csv(), e.g., encoding.
+    :return: A pandas DataFrame that must not be modified, as it is shared by every caller.
+    """
+    key = (fname, tuple(sorted(kwargs.items())))
+
+    with _node_lists_lock:
+        if key not in _node_lists:
+            _node_lists[key] = pd.read_csv(fname, **kwargs)
+
+        return _node_lists[key]
+
+
+class NodeCatalog(collections.abc.Mapping):
+    """
+    A read-only mapping of pricing node ID to node name, ordered by name, with an index of the substrings of the names for filtering the nodes as a filter is typed.
+
+    The index is built on a background thread when the catalog is created; filtering before it is ready waits for it.
+
+    :param nodes: A mapping of node ID to node name.
+    """
+    def __init__(self, nodes):
+        self._nodes = collections.OrderedDict(sorted(nodes.items(), key=lambda t: t[1]))
+        self._names = [str(name).lower() for name in self._nodes.values()]
+        self._index = None
+        self._index_lock = threading.Lock()
+
+        # Entries for node selector RecycleViews.
+        self.rv_data = [{'name': name, 'nodeid': node_id} for node_id, name in self._nodes.items()]
+
+        threading.Thread(target=self._get_index, daemon=True).start()
+
+    def __getitem__(self, node_id):
+        return self._nodes[node_id]
+
+    def __iter__(self):
+        return iter(self._nodes)
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def _get_index(self):
+        """Returns a dictionary of each substring of up to INDEX_NGRAM characters of the lowercase node names to the positions of the nodes containing it, building it the first time."""
+        with self._index_lock:
+            if self._index is None:
+                index = collections.defaultdict(list)
+
+                for position, name in enumerate(self._names):
+                    substrings = set()
+
+                    for n in range(1, INDEX_NGRAM + 1):
+                        substrings.update(name[ix:ix + n] for ix in range(len(name) - n + 1))
+
+                    for substring in substrings:
+                        index[substring].append(position)
+
+                self._index = dict(index)
+
+            return self._index
+
+    def search(self, text):
+        """Returns the positions of the nodes whose names contain text, ignoring case, in order."""
+        text = text.lower()
+
+        if not text:
+            return range(len(self._names))
+
+        index = self._get_index()
+
+        if len(text) <= INDEX_NGRAM:
+            return index.get(text, [])
+
+        candidates = min((index.get(text[ix:ix + INDEX_NGRAM], []) for ix in range(len(text) - INDEX_NGRAM + 1)), key=len)
+
+        return [position for position in candidates if text in self._names[position]]
+
+    def filter(self, text):
+        """Returns the entries of rv_data whose names contain text, ignoring case, in order."""
+        if not text:
+            return self.rv_data
+
+        return [self.rv_data[position] for position in self.search(text)]
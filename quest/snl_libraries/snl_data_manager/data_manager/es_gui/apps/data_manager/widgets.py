@@ -93,6 +93,9 @@ class DataManagerPanelERCOT(BoxLayout):
             self.thread_failed = False
             self.request_cancel.clear()
 
+            # Rescan the market area the next time the data bank is scanned, whether or not every download finished.
+            App.get_running_app().data_manager.invalidate_data_bank_manifest('valuation', 'ERCOT')
+
     @mainthread
     def update_output_log(self, text, *args):
         """Updates the text input object representing the output log.
@@ -348,6 +351,9 @@ class DataManagerPanelISONE(BoxLayout):
             self.thread_failed = False
             self.request_cancel.clear()
 
+            # Rescan the market area the next time the data bank is scanned, whether or not every download finished.
+            App.get_running_app().data_manager.invalidate_data_bank_manifest('valuation', 'ISONE')
+
     @mainthread
     def update_output_log(self, text, *args):
         self.output_log.text = '\n'.join([self.output_log.text, text])
@@ -801,6 +807,9 @@ class DataManagerPanelMISO(BoxLayout):
             self.thread_failed = False
             self.request_cancel.clear()
 
+            # Rescan the market area the next time the data bank is scanned, whether or not every download finished.
+            App.get_running_app().data_manager.invalidate_data_bank_manifest('valuation', 'MISO')
+
     @mainthread
     def update_output_log(self, text, *args):
         """Updates the text input object representing the output log.
@@ -1081,6 +1090,9 @@ class DataManagerPanelNYISO(BoxLayout):
             self.thread_failed = False
             self.request_cancel.clear()
 
+            # Rescan the market area the next time the data bank is scanned, whether or not every download finished.
+            App.get_running_app().data_manager.invalidate_data_bank_manifest('valuation', 'NYISO')
+
     @mainthread
     def update_output_log(self, text, *args):
         """Updates the text input object representing the output log.
@@ -1465,6 +1477,9 @@ class DataManagerPanelSPP(BoxLayout):
             self.thread_failed = False
             self.request_cancel.clear()
 
+            # Rescan the market area the next time the data bank is scanned, whether or not every download finished.
+            App.get_running_app().data_manager.invalidate_data_bank_manifest('valuation', 'SPP')
+
     @mainthread
     def update_output_log(self, text, *args):
         """Updates the text input object representing the output log.
@@ -1848,6 +1863,9 @@ class DataManagerPanelCAISO(BoxLayout):
             self.thread_failed = False
             self.request_cancel.clear()
 
+            # Rescan the market area the next time the data bank is scanned, whether or not every download finished.
+            App.get_running_app().data_manager.invalidate_data_bank_manifest('valuation', 'CAISO')
+
     @mainthread
     def update_output_log(self, text, *args):
         """Updates the text input object representing the output log.
@@ -2390,6 +2408,9 @@ class DataManagerPanelPJM(BoxLayout):
             self.thread_failed = False
             self.request_cancel.clear()
 
+            # Rescan the market area the next time the data bank is scanned, whether or not every download finished.
+            App.get_running_app().data_manager.invalidate_data_bank_manifest('valuation', 'PJM')
+
     @mainthread
     def update_output_log(self, text, *args):
         """Updates the text input object representing the output log.
@@ -0,0 +1,134 @@
+from __future__ import absolute_import
+
+import os
+import pickle
+import logging
+import threading
+
+# The manifest is hidden so that it is not mistaken for a market area when scanning the data bank.
+MANIFEST_NAME = '.data_bank_manifest.p'
+
+# Increment when the structure of the scanned contents changes to discard manifests written by older versions.
+MANIFEST_VERSION = 1
+
+
+def directory_signature(root, include_files=False, extra_files=()):
+    """
+    Returns the modification times of root and of every directory below it.
+
+    The modification time of a directory changes whenever an entry is added to, removed from, or renamed in it, so an unchanged signature means that a scan of the file names under root would find the same files.
+
+    :param root: The path to the directory to sign.
+    :param include_files: If True, also records the modification time of every file, for scans that read the contents of the files.
+    :param extra_files: Paths to other files that the scan depends on, e.g., static lists of pricing nodes.
+    :return: A dictionary of path to modification time in nanoseconds, or None if the path does not exist.
+    """
+    signature = {}
+    dirs = [root]
+
+    while dirs:
+        path = dirs.pop()
+
+        try:
+            signature[path] = os.stat(path).st_mtime_ns
+            entries = list(os.scandir(path))
+        except FileNotFoundError:
+            signature[path] = None
+            continue
+
+        for entry in entries:
+            if entry.is_dir():
+                dirs.append(entry.path)
+            elif include_files:
+                signature[entry.path] = entry.stat().st_mtime_ns
+
+    for path in extra_files:
+        signature[path] = _mtime(path)
+
+    return signature
+
+
+def signature_matches(signature):
+    """Returns True if none of the paths in a signature returned by directory_signature() have been modified, created, or removed since."""
+    return all(_mtime(path) == mtime for path, mtime in signature.items())
+
+
+def _mtime(path):
+    """Returns the modification time of path in nanoseconds, or None if it does not exist."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class DataBankManifest(object):
+    """
+    A persistent record of the scanned contents of each part of a data bank with the signature of the directories they were scanned from.
+
+    Recorded contents are reused for as long as the signature of their directories is unchanged, so only the parts of the data bank that changed since the last scan are rescanned.
+
+    :param data_bank_root: The path to the root of the data bank, where the manifest is saved.
+    """
+    def __init__(self, data_bank_root):
+        self.root = data_bank_root
+        self.path = os.path.join(data_bank_root, MANIFEST_NAME)
+
+        self._lock = threading.Lock()
+        self._changed = False
+        self._entries = self._read()
+
+    def _read(self):
+        """Returns the entries of the saved manifest, or an empty dictionary if there is no usable manifest."""
+        try:
+            with open(self.path, 'rb') as f:
+                version, entries = pickle.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logging.warning('DataBankManifest: Could not read {0}, the data bank will be rescanned. ({1})'.format(self.path, repr(e)))
+            return {}
+
+        if version != MANIFEST_VERSION:
+            return {}
+
+        return entries
+
+    def get(self, key):
+        """Returns the contents recorded for key if its directories are unchanged since they were scanned; raises KeyError otherwise."""
+        with self._lock:
+            signature, contents = self._entries[key]
+
+        if not signature_matches(signature):
+            raise(KeyError(key))
+
+        return contents
+
+    def put(self, key, signature, contents):
+        """Records the contents scanned for key with the signature of its directories taken before scanning them."""
+        with self._lock:
+            self._entries[key] = (signature, contents)
+            self._changed = True
+
+    def invalidate(self, key):
+        """Discards the contents recorded for key so it is rescanned the next time, e.g., after downloading data to it."""
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._changed = True
+
+    def save(self):
+        """Saves the manifest to the data bank if it changed, replacing the previous one atomically."""
+        with self._lock:
+            if not self._changed:
+                return
+
+            tmp_path = self.path + '.tmp'
+
+            try:
+                with open(tmp_path, 'wb') as f:
+                    pickle.dump((MANIFEST_VERSION, self._entries), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logging.warning('DataBankManifest: Could not save {0}. ({1})'.format(self.path, repr(e)))
+            else:
+                self._changed = False
@@ -191,11 +191,20 @@ class MyRecycleView(RecycleView):
         super(MyRecycleView, self).__init__(**kwargs)
 
         self.unfiltered_data = self.data
+        self.data_index = None
+
+    def set_indexed_data(self, data_index):
+        """Sets the data to the rv_data of data_index, an object such as a NodeCatalog whose filter() method is used to filter it."""
+        self.data = data_index.rv_data
+        self.unfiltered_data = data_index.rv_data
+        self.data_index = data_index
 
     def filter_rv_data(self, filter_text):
         self.deselect_all_nodes()
-                
-        if filter_text:
+
+        if self.data_index is not None and self.unfiltered_data is self.data_index.rv_data:
+            self.data = self.data_index.filter(filter_text)
+        elif filter_text:
             self.data = [rv_entry for rv_entry in self.unfiltered_data if filter_text.lower() in rv_entry['name'].lower()]
         else:
             self.data = self.unfiltered_data
@@ -95,6 +95,9 @@ class DataManagerPanelERCOT(BoxLayout):
             self.thread_failed = False
             self.request_cancel.clear()
 
+            # Rescan the market area the next time the data bank is scanned, whether or not every download finished.
+            App.get_running_app().data_manager.invalidate_data_bank_manifest('valuation', 'ERCOT')
+
     @mainthread
     def update_output_log(self, text, *args):
         """Updates the text input object representing the output log.
@@ -350,6 +353,9 @@ class DataManagerPanelISONE(BoxLayout):
             self.thread_failed = False
             self.request_cancel.clear()
 
+            # Rescan the market area the next time the data bank is scanned, whether or not every download finished.
+            App.get_running_app().data_manager.invalidate_data_bank_manifest('valuation', 'ISONE')
+
     @mainthread
     def update_output_log(self, text, *args):
         self.output_log.text = '\n'.join([self.output_log.text, text])
@@ -803,6 +809,9 @@ class DataManagerPanelMISO(BoxLayout):
             self.thread_failed = False
             self.request_cancel.clear()
 
+            # Rescan the market area the next time the data bank is scanned, whether or not every download finished.
+            App.get_running_app().data_manager.invalidate_data_bank_manifest('valuation', 'MISO')
+
     @mainthread
     def update_output_log(self, text, *args):
         """Updates the text input object representing the output log.
@@ -1083,6 +1092,9 @@ class DataManagerPanelNYISO(BoxLayout):
             self.thread_failed = False
             self.request_cancel.clear()
 
+            # Rescan the market area the next time the data bank is scanned, whether or not every download finished.
+            App.get_running_app().data_manager.invalidate_data_bank_manifest('valuation', 'NYISO')
+
     @mainthread
     def update_output_log(self, text, *args):
         """Updates the text input object representing the output log.
@@ -1467,6 +1479,9 @@ class DataManagerPanelSPP(BoxLayout):
             self.thread_failed = False
             self.request_cancel.clear()
 
+            # Rescan the market area the next time the data bank is scanned, whether or not every download finished.
+            App.get_running_app().data_manager.invalidate_data_bank_manifest('valuation', 'SPP')
+
     @mainthread
     def update_output_log(self, text, *args):
         """Updates the text input object representing the output log.
@@ -1850,6 +1865,9 @@ class DataManagerPanelCAISO(BoxLayout):
             self.thread_failed = False
             self.request_cancel.clear()
 
+            # Rescan the market area the next time the data bank is scanned, whether or not every download finished.
+            App.get_running_app().data_manager.invalidate_data_bank_manifest('valuation', 'CAISO')
+
     @mainthread
     def update_output_log(self, text, *args):
         """Updates the text input object representing the output log.
@@ -2392,6 +2410,9 @@ class DataManagerPanelPJM(BoxLayout):
             self.thread_failed = False
             self.request_cancel.clear()
 
+            # Rescan the market area the next time the data bank is scanned, whether or not every download finished.
+            App.get_running_app().data_manager.invalidate_data_bank_manifest('valuation', 'PJM')
+
     @mainthread
     def update_output_log(self, text, *args):
         """Updates the text input object representing the output log.
@@ -1,94 +1,555 @@
 from __future__ import print_function, absolute_import
 
 from collections import OrderedDict
+import atexit
+import functools
+import hashlib
+import json
 import pickle
 import logging
 import os
+import threading
+import time
 
 import numpy as np
 
 
+def loader(method):
+    """Decorates a method of a DMS subclass that retrieves data, so that its calls, hits, misses, loading time, and evicted entries are counted under its name in DataManagementSystem.get_stats(). A call made by another loader is counted for both."""
+    @functools.wraps(method)
+    def _loader(self, *args, **kwargs):
+        return self._call_loader(method.__name__, method, *args, **kwargs)
+
+    return _loader
+
+
+class FileLock(object):
+    """An exclusive lock on the file at path shared between processes, held for the duration of a with block."""
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, 'a+')
+
+        if os.name == 'nt':
+            import msvcrt
+
+            self._file.seek(0)
+
+            while True:
+                try:
+                    # LK_LOCK gives up after 10 attempts one second apart.
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                except OSError:
+                    continue
+                else:
+                    break
+        else:
+            import fcntl
+
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+
+        return self
+
+    def __exit__(self, *exc_info):
+        if os.name == 'nt':
+            import msvcrt
+
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+        self._file.close()
+        self._file = None
+
+
+class SharedArrayStore(object):
+    """
+    A store of ndarrays on disk shared by every process on the machine, keyed by the id_key strings of the DMS. Each array is saved as an .npy file named for the hash of its key and is memory-mapped when retrieved, so processes reading the same key share the pages of one file instead of each loading a copy. Files are written atomically; writing and evicting are serialized between processes by a lock file.
+
+    :param path: The path to the directory holding the store.
+    :param max_memory: The maximum size, in bytes, of the arrays in the store; the least recently used arrays are deleted when it is exceeded.
+    """
+    LOCK_NAME = '.lock'
+
+    def __init__(self, path, max_memory=2000000000):
+        self.path = path
+        self.max_memory = max_memory
+
+        # The size of the store as of the last scan plus the arrays written by this instance since; None until the first scan. Arrays written by other processes are counted at the next scan.
+        self._store_size = None
+
+        os.makedirs(self.path, exist_ok=True)
+
+    def _fname(self, key):
+        return os.path.join(self.path, hashlib.sha1(str(key).encode('utf-8')).hexdigest() + '.npy')
+
+    def get(self, key):
+        """Returns the memory-mapped array stored for key. Raises KeyError if there is none."""
+        fname = self._fname(key)
+
+        try:
+            value = np.load(fname, mmap_mode='c')
+            # Mark as recently used for eviction.
+            os.utime(fname)
+        except (IOError, OSError, ValueError):
+            raise(KeyError('KeyError when retrieving: {0}'.format(key)))
+
+        return value
+
+    def put(self, key, value):
+        """Stores the array value for key, replacing any array already stored."""
+        fname = self._fname(key)
+        tmp_fname = '{0}.{1}.tmp'.format(fname, os.getpid())
+
+        with FileLock(os.path.join(self.path, self.LOCK_NAME)):
+            try:
+                replaced_size = os.stat(fname).st_size
+            except OSError:
+                replaced_size = 0
+
+            with open(tmp_fname, 'wb') as f:
+                np.save(f, value, allow_pickle=False)
+                size = f.tell()
+
+            os.replace(tmp_fname, fname)
+
+            if self._store_size is not None:
+                self._store_size += size - replaced_size
+
+            # The store is only scanned when it may have outgrown its maximum size.
+            if self._store_size is None or self._store_size > self.max_memory:
+                self._manage_memory()
+
+    def _manage_memory(self):
+        """Scans the store and deletes the least recently used arrays until it is within its maximum size. Must be called with the lock held."""
+        entries = []
+
+        for dir_entry in os.scandir(self.path):
+            if dir_entry.name.endswith('.npy'):
+                try:
+                    stat = dir_entry.stat()
+                except OSError:
+                    continue
+
+                entries.append((stat.st_mtime, stat.st_size, dir_entry.path))
+
+        store_sz = sum(size for _, size, _ in entries)
+
+        for _, size, fname in sorted(entries):
+            if store_sz <= self.max_memory:
+                break
+
+            try:
+                # Arrays that are still memory-mapped by another process stay readable by it on POSIX; on Windows, they cannot be removed until released.
+                os.remove(fname)
+            except OSError:
+                continue
+
+            store_sz -= size
+
+        self._store_size = store_sz
+
+
+class EntryStore(object):
+    """
+    A store on disk of the entries of a DMS, one file per top-level key: an .npy file for an ndarray or an .npz file for a dictionary of ndarrays, named for the hash of the key. A small index records the file and size of each entry in the order of the DMS's queue. Opening the store reads only the index; entries are read when first retrieved and written only when they have changed, and an entry that cannot be read is discarded on its own.
+
+    :param path: The path to the directory holding the store.
+    :param max_size: The maximum size, in bytes, of the entries in the store; the entries at the front of the queue are deleted when it is exceeded.
+    """
+    INDEX_NAME = 'index.json'
+    LOCK_NAME = '.lock'
+
+    def __init__(self, path, max_size=2000000000):
+        self.path = path
+        self.max_size = max_size
+        self.index_changed = False
+
+        self._lock = threading.Lock()
+        self._index = self._read_index()
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def _read_index(self):
+        """Reads the index of key to [file name, size] entries."""
+        try:
+            with open(os.path.join(self.path, self.INDEX_NAME), 'r') as f:
+                return OrderedDict((key, entry) for key, *entry in json.load(f))
+        except FileNotFoundError:
+            return OrderedDict()
+        except (IOError, OSError, ValueError, TypeError) as e:
+            logging.error('DMS: Could not read the index of {0}; starting with an empty store. ({1})'.format(self.path, e))
+            return OrderedDict()
+
+    def _write_index(self):
+        with self._lock:
+            index = [[key] + entry for key, entry in self._index.items()]
+            self.index_changed = False
+
+        fname = os.path.join(self.path, self.INDEX_NAME)
+        tmp_fname = '{0}.{1}.tmp'.format(fname, os.getpid())
+
+        with open(tmp_fname, 'w') as f:
+            json.dump(index, f)
+
+        os.replace(tmp_fname, fname)
+
+    def load(self, key):
+        """Returns the entry stored for key, with ndarrays memory-mapped. Raises KeyError if there is none or it cannot be read, discarding it in the latter case."""
+        try:
+            fname, _ = self._index[key]
+        except KeyError:
+            raise(KeyError('KeyError when retrieving: {0}'.format(key)))
+
+        path = os.path.join(self.path, fname)
+
+        try:
+            if fname.endswith('.npz'):
+                with np.load(path, allow_pickle=False) as npz:
+                    return OrderedDict((name, npz[name]) for name in npz.files)
+
+            return np.load(path, mmap_mode='c', allow_pickle=False)
+        except (IOError, OSError, ValueError) as e:
+            logging.warning('DMS: Could not read the saved data for {0}; discarding it. ({1})'.format(key, e))
+            self.discard(key)
+
+            raise(KeyError('KeyError when retrieving: {0}'.format(key)))
+
+    def save(self, entries):
+        """Writes the entries, a dictionary of key to ndarray or dictionary of ndarrays, and the index, then deletes entries from the front of the queue until the store is within its maximum size."""
+        os.makedirs(self.path, exist_ok=True)
+
+        with FileLock(os.path.join(self.path, self.LOCK_NAME)):
+            for key, value in entries.items():
+                fname = hashlib.sha1(str(key).encode('utf-8')).hexdigest() + ('.npy' if isinstance(value, np.ndarray) else '.npz')
+                path = os.path.join(self.path, fname)
+                tmp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+
+                try:
+                    with open(tmp_path, 'wb') as f:
+                        if isinstance(value, np.ndarray):
+                            np.save(f, value, allow_pickle=False)
+                        else:
+                            np.savez(f, **{str(name): np.asarray(array) for name, array in value.items()})
+
+                    os.replace(tmp_path, path)
+                except (IOError, OSError, ValueError) as e:
+                    logging.warning('DMS: Could not save the data for {0}. ({1})'.format(key, e))
+                    _remove_file(tmp_path)
+                    continue
+
+                with self._lock:
+                    self._index[key] = [fname, DataManagementSystem._sizeof(value)]
+
+            self._manage_size()
+            self._write_index()
+
+    def _manage_size(self):
+        """Deletes entries from the front of the queue until the store is within its maximum size."""
+        with self._lock:
+            store_sz = sum(size for _, size in self._index.values())
+
+            while store_sz > self.max_size and self._index:
+                _, (fname, size) = self._index.popitem(last=False)
+                _remove_file(os.path.join(self.path, fname))
+                store_sz -= size
+                self.index_changed = True
+
+    def requeue(self, key):
+        """Moves the entry for key to the back of the queue."""
+        with self._lock:
+            if key in self._index:
+                self._index.move_to_end(key)
+                self.index_changed = True
+
+    def discard(self, key):
+        """Deletes the entry for key, if there is one."""
+        with self._lock:
+            entry = self._index.pop(key, None)
+
+            if entry is not None:
+                self.index_changed = True
+
+        if entry is not None:
+            _remove_file(os.path.join(self.path, entry[0]))
+
+    def flush_index(self):
+        """Writes the index if the queue has changed since it was last written."""
+        if self.index_changed:
+            os.makedirs(self.path, exist_ok=True)
+
+            with FileLock(os.path.join(self.path, self.LOCK_NAME)):
+                self._write_index()
+
+
+def _remove_file(fname):
+    try:
+        os.remove(fname)
+    except OSError:
+        pass
+
+
 class DataManagementSystem():
     """
-    A class used to store processed DataFrames as NumPy ndarrays and manage memory consumed. Data is stored in nested dictionaries up to a depth of 2: {key_0: {key_0_0: data}}. When the calculated memory exceeds max_memory, the dictionary at depth 1 at the front of the queue is popped out of the dictionary until the memory consumption is less than the maximum. The queue is determined by time of accessing. Accessing or adding to the structure at any depth will push the depth 1 dictionary to the back of the queue.
+    A class used to store processed DataFrames as NumPy ndarrays and manage memory consumed. Data is stored in nested dictionaries up to a depth of 2: {key_0: {key_0_0: data}}. When the memory used exceeds max_memory, entries at depth 1 are evicted until the memory consumption is less than the maximum. The queue is determined by time of accessing. Accessing or adding to the structure at any depth will push the depth 1 dictionary to the back of the queue.
+
+    The memory used by each entry is tracked as it is added, so requeueing and evicting entries take constant time. Saving is deferred: after data is added, the data is saved once save_delay seconds have passed, and again at interpreter exit if there are unsaved changes.
+
+    With the 'entries' persistence, the data is saved in an EntryStore next to save_name: only the index is read when the DMS is created, each entry is read the first time it is retrieved, and only entries added since the last save are written. Entries evicted from memory stay on disk, up to save_max_size bytes. A pickle saved at save_name by the 'pickle' persistence is read if the EntryStore is empty, and its entries are moved to the EntryStore at the next save. With the 'pickle' persistence, the whole data is pickled at save_name.
 
-    :param save_name: The path/filename to pickle the DMS's data.
+    :param save_name: The path/filename to pickle the DMS's data; the EntryStore is the directory of the same name with the extension '.entries'.
     :param max_memory: The maximum amount of memory, in bytes, that the contained ndarrays may collectively occupy.
+    :param eviction: 'lru' evicts the least recently used entries first; 'size' evicts the largest entries first, using recency to break ties.
+    :param save_delay: The number of seconds to wait after adding data before pickling the DMS's data; if 0, the data is pickled every time data is added.
+    :param shared_path: The path to a SharedArrayStore directory. If given, ndarrays not loaded in this DMS are retrieved from the store, and ndarrays added to this DMS are written through to it, so that processes using the same store share loaded data.
+    :param shared_max_memory: The maximum size, in bytes, of the SharedArrayStore.
+    :param persistence: 'entries' to save the data in an EntryStore or 'pickle' to pickle it at save_name.
+    :param save_max_size: The maximum size, in bytes, of the EntryStore.
     """
-    def __init__(self, save_name, save_data=False, max_memory=500000):
+    def __init__(self, save_name, save_data=False, max_memory=500000, eviction='lru', save_delay=10.0,
+                 shared_path=None, shared_max_memory=2000000000, persistence='entries', save_max_size=2000000000):
         self.memory_used = 0
         self.max_memory = max_memory
         self.save_data = save_data
         self.save_name = save_name
+        self.eviction = eviction
+        self.save_delay = save_delay
+
+        self._sizes = {}
+        self._changed = set()
+        self._legacy_pickle = False
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._save_timer = None
+
+        self._local = threading.local()
+        self._loader_stats = OrderedDict()
+        self._key_loaders = {}
+        self._evictions = 0
+        self._store_reads = {'entry_store': 0, 'shared_store': 0}
+
+        if shared_path:
+            self.shared_store = SharedArrayStore(shared_path, max_memory=shared_max_memory)
+        else:
+            self.shared_store = None
+
+        if persistence == 'entries':
+            self.entry_store = EntryStore(os.path.splitext(self.save_name)[0] + '.entries', max_size=save_max_size)
+        else:
+            self.entry_store = None
+
+        if self.entry_store is None or (not len(self.entry_store) and os.path.exists(self.save_name)):
+            self.data = self._load_pickle()
+
+            # Entries of a pickle saved before the EntryStore was used.
+            if self.entry_store is not None:
+                self._changed.update(self.data)
+                self._dirty = bool(self._changed)
+                self._legacy_pickle = os.path.exists(self.save_name)
+        else:
+            self.data = OrderedDict()
+
+        self.compute_memory()
 
+        atexit.register(self.flush)
+
+    def _load_pickle(self):
+        """Unpickles the data saved at self.save_name."""
         try:
             with open(self.save_name, 'rb') as pfile:
-                self.data = pickle.load(pfile)
+                data = pickle.load(pfile)
                 logging.info('DMS: Successfully loaded {fname}.'.format(fname=self.save_name))
         except FileNotFoundError:
-            self.data = OrderedDict()
+            data = OrderedDict()
         except pickle.PickleError:
             logging.error('DMS: Could not unpickle data; purging and restarting DMS.')
             self.delete_pickle()
-            self.data = OrderedDict()
-    
+            data = OrderedDict()
+
+        return data
+
     def delete_pickle(self):
         """Deletes the pickle file used for self.data object persistence."""
-        os.remove(self.save_data)
+        os.remove(self.save_name)
 
     def save_state(self):
-        """Pickles self.data at self.save_name."""
-        if self.save_data:
+        """Writes the changed entries to the EntryStore or, with the 'pickle' persistence, pickles self.data at self.save_name."""
+        if self.save_data and self.entry_store is not None:
+            with self._lock:
+                changed = OrderedDict((key, self.data[key]) for key in self._changed if key in self.data)
+                self._changed = set()
+                self._dirty = False
+
+            logging.info('DMS: Saving {0} entries to {1}.'.format(len(changed), self.entry_store.path))
+
+            if changed:
+                self.entry_store.save(changed)
+            else:
+                self.entry_store.flush_index()
+
+            if self._legacy_pickle:
+                # Its entries have been moved to the EntryStore.
+                self._legacy_pickle = False
+                self.delete_pickle()
+        elif self.save_data:
+            with self._lock:
+                data = OrderedDict(self.data)
+                self._dirty = False
+
             logging.info('DMS: Saving {0}.'.format(self.save_name))
-            with open(self.save_name, 'wb') as pfile:
-                pickle.dump(self.data, pfile, protocol=3)
+            tmp_name = '{0}.{1}.tmp'.format(self.save_name, os.getpid())
+
+            # Other processes may be saving to the same file.
+            with FileLock(self.save_name + '.lock'):
+                with open(tmp_name, 'wb') as pfile:
+                    pickle.dump(data, pfile, protocol=3)
+
+                os.replace(tmp_name, self.save_name)
+
+    def flush(self):
+        """Cancels any pending deferred save and pickles self.data if there are unsaved changes."""
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+
+            dirty = self._dirty or (self.entry_store is not None and self.entry_store.index_changed)
+
+        if dirty:
+            self.save_state()
+
+    def _schedule_save(self):
+        """Marks self.data as changed and schedules a deferred save if one is not already pending."""
+        if not self.save_data:
+            return
+
+        if not self.save_delay:
+            self.save_state()
+            return
+
+        with self._lock:
+            self._dirty = True
+
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(self.save_delay, self._deferred_save)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+
+    def _deferred_save(self):
+        with self._lock:
+            self._save_timer = None
+
+        self.save_state()
+
+    @staticmethod
+    def _sizeof(value):
+        """Computes the memory footprint of value, an ndarray or a dictionary of them."""
+        if isinstance(value, np.ndarray):
+            return value.nbytes
+
+        return sum(DataManagementSystem._sizeof(v) for v in value.values())
+
+    def pop(self, key=None):
+        """Evicts the entry for key, or the entry at the front of the queue of the OrderedDict if key is None."""
+        with self._lock:
+            evicted = self._evict(key)
+
+        self._save_evicted(evicted)
+
+    def _evict(self, key=None):
+        """Removes the entry for key, or the one at the front of the queue, from memory with self._lock held. Returns a dictionary of the entry if it has unsaved changes, for _save_evicted() to write once the lock is released."""
+        if key is None:
+            key, value = self.data.popitem(last=False)
+        else:
+            value = self.data.pop(key)
+
+        self.memory_used -= self._sizes.pop(key, 0)
+
+        self._evictions += 1
+        loader_name = self._key_loaders.pop(key, None)
+
+        if loader_name is not None:
+            self._get_loader_stats(loader_name)['evictions'] += 1
+
+        logging.info('DMS: Evicted {0}.'.format(key))
+
+        if key in self._changed:
+            self._changed.discard(key)
+
+            return OrderedDict([(key, value)])
 
-    def pop(self):
-        """Shortcut for popping the queue of the OrderedDict."""
-        k, v = self.data.popitem(last=False)
-        print('Popped: ', (k))
+        return OrderedDict()
+
+    def _save_evicted(self, evicted):
+        """Saves evicted entries with unsaved changes to the EntryStore, where they are read back when retrieved. Called without self._lock held so other threads are not blocked by the write."""
+        if evicted and self.save_data and self.entry_store is not None:
+            self.entry_store.save(evicted)
 
     def requeue(self, key):
         """Moves self.data[key] to the back of the queue for being purged."""
+        with self._lock:
+            if key in self.data:
+                self.data.move_to_end(key)
 
-        if key in self.data:
-            to_requeue = self.data.pop(key)
-            self.data[key] = to_requeue
+        if self.entry_store is not None:
+            self.entry_store.requeue(key)
 
     def manage_memory(self):
-        """Pops entries from the queue until occupied memory is less than the maximum allocated."""
-        dms_sz = self.compute_memory()
+        """Evicts entries until occupied memory is less than the maximum allocated."""
+        with self._lock:
+            evicted = self._evict_to_fit()
 
-        while dms_sz > self.max_memory:
-            print('Memory limit exceeded. Purging old data...')
-            print('Currently using: ', dms_sz, 'bytes')
-            print('Maximum allowed: ', self.max_memory, 'bytes')
-            self.pop()
-            dms_sz = self.compute_memory()
-            print('Now using: ', dms_sz, 'bytes')
+        self._save_evicted(evicted)
 
-        self.save_state()
+    def _evict_to_fit(self):
+        """Evicts entries from memory with self._lock held until occupied memory is less than the maximum allocated. Returns the evicted entries with unsaved changes."""
+        evicted = OrderedDict()
 
-    def compute_memory(self):
-        """Computes the memory footprint of the entire data structure."""
-        def _compute_memory(coll):
-            dms_sz = 0
+        if self.memory_used <= self.max_memory:
+            return evicted
 
-            for value in coll.values():
-                if isinstance(value, np.ndarray):
-                    array_sz = value.nbytes
-                else:
-                    array_sz = _compute_memory(value)
+        logging.info('DMS: Memory limit exceeded, using {0} of {1} bytes. Purging old data...'.format(self.memory_used, self.max_memory))
+
+        while self.memory_used > self.max_memory and self.data:
+            if self.eviction == 'size':
+                # max() returns the first, i.e., least recently used, of the largest entries.
+                evicted.update(self._evict(max(self.data, key=self._sizes.get)))
+            else:
+                evicted.update(self._evict())
 
-                dms_sz += array_sz
-            return dms_sz
+        logging.info('DMS: Now using {0} bytes.'.format(self.memory_used))
 
-        dms_sz = _compute_memory(self.data)
-        self.memory_used = dms_sz
-        return dms_sz
+        return evicted
+
+    def compute_memory(self):
+        """Computes the memory footprint of the entire data structure, resetting the tracked size of each entry."""
+        with self._lock:
+            self._sizes = {key: self._sizeof(value) for key, value in self.data.items()}
+            self.memory_used = sum(self._sizes.values())
+
+        return self.memory_used
 
     def add_data(self, value, *args):
-        """Adds value to self.data[arg[0]][...][arg[N-1]]. Requeues self.data[arg[0]] after updating."""
+        """Adds value to self.data[arg[0]][...][arg[N-1]]. Requeues self.data[arg[0]] after updating. Writes ndarrays through to the shared store if there is one."""
+        if self.shared_store is not None and isinstance(value, np.ndarray):
+            try:
+                self.shared_store.put(args[0], value)
+            except (IOError, OSError) as e:
+                logging.warning('DMS: Could not write to the shared store. ({0})'.format(e))
+
+        self._add_local_data(value, *args)
+
+    def _add_local_data(self, value, *args, changed=True):
+        """Adds value to the data of this DMS only. If changed, value is saved at the next save."""
 
         # def _add_data(keys, val):
         #     val = {keys.pop(): val}
@@ -112,13 +573,51 @@ class DataManagementSystem():
         #         tmp_dict = value
         #     finally:
         #         self.data[args[0]] = tmp_dict
-        self.data[args[0]] = value
+        key = args[0]
+        size = self._sizeof(value)
 
-        self.requeue(args[0])
-        self.manage_memory()
+        with self._lock:
+            self.memory_used += size - self._sizes.get(key, 0)
+            self._sizes[key] = size
+            self.data[key] = value
+
+            if changed:
+                self._changed.add(key)
+
+            calls = getattr(self._local, 'loader_calls', None)
+
+            if calls:
+                self._key_loaders[key] = calls[-1][0]
+
+            self.requeue(key)
+            evicted = self._evict_to_fit()
+
+        # Evicted entries are written after releasing the lock so threads reading the DMS are not blocked by the write.
+        self._save_evicted(evicted)
+
+        if changed:
+            self._schedule_save()
 
     def get_data(self, *args):
-        """Retrieves NumPy ndarray from self.data according to provided sequence of keys."""
+        """Retrieves NumPy ndarray from self.data according to provided sequence of keys. Data not loaded in this DMS is read from the EntryStore, if it was saved there, or else the shared store, if there is one."""
+        if self.entry_store is not None and args[0] not in self.data and args[0] in self.entry_store:
+            try:
+                self._add_local_data(self.entry_store.load(args[0]), args[0], changed=False)
+            except KeyError:
+                pass
+            else:
+                self._store_reads['entry_store'] += 1
+                logging.info('DMS: Data located in saved entries, retrieving...')
+
+        if self.shared_store is not None and args[0] not in self.data:
+            try:
+                self._add_local_data(self.shared_store.get(args[0]), args[0])
+            except KeyError:
+                pass
+            else:
+                self._store_reads['shared_store'] += 1
+                logging.info('DMS: Data located in shared store, retrieving...')
+
         tmp = self.data
 
         for key in args:
@@ -132,8 +631,84 @@ class DataManagementSystem():
                     tmp = tmp[key]
                 except KeyError:
                     logging.info('DMS: Data not yet in DMS, loading...')
+
+                    for call in getattr(self._local, 'loader_calls', ()):
+                        call[1] = True
+
                     raise(KeyError('KeyError when retrieving: {0}'.format(key)))
 
         self.requeue(args[0])
         logging.info('DMS: Data located in DMS, retrieving...')
         return tmp
+
+    def _call_loader(self, name, method, *args, **kwargs):
+        """Calls the loader method, counting the call as a miss if any data it retrieves is not in the DMS and as a hit otherwise."""
+        calls = getattr(self._local, 'loader_calls', None)
+
+        if calls is None:
+            calls = self._local.loader_calls = []
+
+        call = [name, False]
+        calls.append(call)
+        t0 = time.perf_counter()
+
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - t0
+            calls.pop()
+
+            with self._lock:
+                stats = self._get_loader_stats(name)
+                stats['calls'] += 1
+
+                if call[1]:
+                    stats['misses'] += 1
+                    stats['load_time'] += elapsed
+                else:
+                    stats['hits'] += 1
+                    stats['hit_time'] += elapsed
+
+    def _get_loader_stats(self, name):
+        """Returns the dictionary of counters and times of the loader method name. Must be called with the lock held."""
+        try:
+            return self._loader_stats[name]
+        except KeyError:
+            stats = self._loader_stats[name] = {'calls': 0, 'hits': 0, 'misses': 0, 'evictions': 0, 'hit_time': 0.0, 'load_time': 0.0}
+
+            return stats
+
+    def get_stats(self, n_largest=10):
+        """
+        Returns statistics of the use of the DMS since it was created or its statistics were reset.
+
+        :param n_largest: The number of the largest entries to list.
+        :return: A dictionary of JSON serializable values: the memory used and its maximum, the number of entries, evictions, and entries read from the EntryStore and shared store; under 'loaders', a dictionary of the calls, hits, misses, hit rate, evictions, and time spent returning loaded data and loading data of each loader method; and under 'largest_entries', a list of [key, bytes] of the largest entries in memory.
+        """
+        with self._lock:
+            loaders = OrderedDict()
+
+            for name, stats in self._loader_stats.items():
+                loaders[name] = dict(stats, hit_rate=stats['hits']/stats['calls'] if stats['calls'] else None)
+
+            largest = sorted(self._sizes.items(), key=lambda item: item[1], reverse=True)[:n_largest]
+
+            return OrderedDict([('memory_used', self.memory_used), ('max_memory', self.max_memory), ('entries', len(self.data)),
+                                ('evictions', self._evictions), ('entry_store_reads', self._store_reads['entry_store']),
+                                ('shared_store_reads', self._store_reads['shared_store']),
+                                ('loaders', loaders), ('largest_entries', [[str(key), size] for key, size in largest])])
+
+    def reset_stats(self):
+        """Resets the counters and times of get_stats()."""
+        with self._lock:
+            self._loader_stats = OrderedDict()
+            self._evictions = 0
+            self._store_reads = {'entry_store': 0, 'shared_store': 0}
+
+            # Entries added before the reset are not counted as evictions of their loaders.
+            self._key_loaders = {}
+
+    def write_stats(self, fname, n_largest=10):
+        """Writes the statistics returned by get_stats() to fname as JSON."""
+        with open(fname, 'w') as f:
+            json.dump(self.get_stats(n_largest), f, indent=2)
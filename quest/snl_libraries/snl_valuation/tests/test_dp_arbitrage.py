@@ -0,0 +1,88 @@
+"""
+Cross-checks the 'dp' arbitrage solver against linear programming solves of the same model.
+
+Run from snl_valuation with: python -m pytest tests
+"""
+import logging
+import shutil
+
+import numpy as np
+import pytest
+
+from valuation.es_gui.tools.valuation.valuation_optimizer import ValuationOptimizer
+
+logging.disable(logging.CRITICAL)
+
+# The LP solvers to compare with: the 'highs' matrix path always, and GLPK when glpsol is installed.
+LP_SOLVERS = [
+    'highs',
+    pytest.param('glpk', marks=pytest.mark.skipif(shutil.which('glpsol') is None, reason='glpsol is not installed')),
+]
+
+PARAM_SETS = {
+    'defaults': {'Power_rating': 20, 'Energy_capacity': 80},
+    'final_soc': {'Power_rating': 5, 'Energy_capacity': 12, 'State_of_charge_init': 0.2, 'State_of_charge_final': 0.9},
+    'losses': {'Power_rating': 10, 'Energy_capacity': 25, 'Round_trip_efficiency': 0.7, 'Self_discharge_efficiency': 0.98,
+               'State_of_charge_min': 0.1, 'State_of_charge_max': 0.95, 'State_of_charge_init': 0.5, 'State_of_charge_final': 0.1},
+}
+
+TOL = 1e-6
+
+
+def _prices(seed, n_steps=168):
+    """Returns hourly prices with a daily cycle and noise large enough for many of them to be negative."""
+    rng = np.random.default_rng(seed)
+
+    return 15 + 20*np.sin(np.arange(n_steps)*2*np.pi/24) + rng.normal(0, 25, n_steps)
+
+
+def _solve(prices, params, solver):
+    op = ValuationOptimizer(price_electricity=prices, market_type='arbitrage', solver=solver)
+    op.set_model_parameters(**params)
+    results, revenue = op.run()
+
+    return results, revenue
+
+
+def _check_feasible(results, params):
+    """Asserts that the schedule in results satisfies the power, state of charge, and energy balance constraints of the arbitrage model."""
+    power_rating = params['Power_rating']
+    energy_capacity = params['Energy_capacity']
+    rte = params.get('Round_trip_efficiency', 0.85)
+    eta = params.get('Self_discharge_efficiency', 1.0)
+
+    q_r = results['q_r'].values
+    q_d = results['q_d'].values
+    soc = results['state of charge'].values
+
+    assert (q_r >= -TOL).all() and (q_d >= -TOL).all()
+    assert (q_r + q_d <= power_rating + TOL).all()
+
+    # The state of charge column holds the state at the start of each time step; append the state after the last one.
+    soc = np.append(soc, eta*soc[-1] + rte*q_r[-1] - q_d[-1])
+
+    np.testing.assert_allclose(soc[1:], eta*soc[:-1] + rte*q_r - q_d, atol=TOL)
+    assert (soc >= params.get('State_of_charge_min', 0.0)*energy_capacity - TOL).all()
+    assert (soc <= params.get('State_of_charge_max', 1.0)*energy_capacity + TOL).all()
+    assert soc[0] == pytest.approx(params.get('State_of_charge_init', 0.5)*energy_capacity, abs=TOL)
+    assert soc[-1] == pytest.approx(params.get('State_of_charge_final', 0.5)*energy_capacity, abs=TOL)
+
+
+@pytest.mark.parametrize('lp_solver', LP_SOLVERS)
+@pytest.mark.parametrize('param_set', sorted(PARAM_SETS))
+@pytest.mark.parametrize('seed', range(5))
+def test_dp_matches_lp(seed, param_set, lp_solver):
+    prices = _prices(seed)
+    params = PARAM_SETS[param_set]
+
+    assert (prices < 0).any()
+
+    dp_results, dp_revenue = _solve(prices, params, 'dp')
+    lp_results, lp_revenue = _solve(prices, params, lp_solver)
+
+    _check_feasible(dp_results, params)
+    _check_feasible(lp_results, params)
+
+    # Schedules may differ where the optimum is not unique, but the revenue may not; the revenue column is cumulative.
+    assert dp_revenue == pytest.approx(lp_revenue, rel=1e-6, abs=1e-4)
+    assert dp_results['revenue'].values[-1] == pytest.approx(dp_revenue, rel=1e-6, abs=1e-4)
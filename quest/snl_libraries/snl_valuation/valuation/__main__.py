@@ -427,7 +427,7 @@ class ValueApp(App):
         """Set default settings here."""
         config.setdefaults('optimization', {'solver': 'glpk'})
         config.setdefaults('connectivity', {'use_proxy': 0, 'http_proxy': '', 'https_proxy': '', 'use_ssl_verify': 1})
-        config.setdefaults('valuation', {'valuation_dms_save': 1, 'valuation_dms_size': 20000})
+        config.setdefaults('valuation', {'valuation_dms_save': 1, 'valuation_dms_size': 20000, 'valuation_result_cache_size': 100000, 'valuation_max_workers': 1, 'valuation_spill_path': '', 'valuation_prefetch': 2})
         config.setdefaults('btm', {'btm_dms_save': 1, 'btm_dms_size': 20000})
         config.setdefaults('datamanager-pjm', {'pjm_subscription_key': ''})
         config.setdefaults('datamanager-isone', {'iso-ne_api_username': ''})
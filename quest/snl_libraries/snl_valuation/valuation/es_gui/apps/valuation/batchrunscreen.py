@@ -3,13 +3,14 @@ from __future__ import absolute_import
 import json
 import collections
 import logging
+import threading
 import copy
 import calendar
 from functools import partial
 
 import numpy as np
 
-from kivy.clock import Clock
+from kivy.clock import Clock, mainthread
 from kivy.uix.screenmanager import Screen, ScreenManager
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.gridlayout import GridLayout
@@ -73,35 +74,57 @@ class BatchRunScreen(Screen):
             handler = self.manager.get_screen('valuation_home').handler
             handler.solver_name = solver_name
 
-            try:
-                solved_ops, handler_status = handler.process_requests(requests)
-            except BadParameterException as e:
-                popup = WarningPopup()
-                popup.popup_text.text = str(e)
-                popup.open()
+            # The requests are processed in the background so the app can abort them if it is closed.
+            self.run_button.disabled = True
+
+            thread = threading.Thread(target=self._process_requests, args=(handler, requests), daemon=True)
+            thread.start()
+
+    def _process_requests(self, handler, requests):
+        try:
+            solved_ops, handler_status = handler.process_requests(requests)
+        except BadParameterException as e:
+            self._finish_batch(error=e)
+        except Exception as e:
+            logging.exception('BatchRun: The batch run failed.')
+            self._finish_batch(error=e)
+        else:
+            self._finish_batch(solved_ops, handler_status)
+
+    @mainthread
+    def _finish_batch(self, solved_ops=None, handler_status=None, error=None):
+        """Opens the popup reporting the outcome of the batch run and enables starting another one."""
+        self.run_button.disabled = False
+
+        if error is not None:
+            popup = WarningPopup()
+            popup.popup_text.text = str(error)
+            popup.open()
+
+            return
+
+        self.completion_popup = BatchRunCompletePopup()
+        self.completion_popup.view_results_button.bind(on_release=self._go_to_view_results)
+
+        if len(handler_status) > 0:
+            if solved_ops:
+                # At least one model solved successfully.
+                self.completion_popup.title = "Success!*"
+                self.completion_popup.popup_text.text = '\n'.join([
+                    'All finished, but we found these issues:',
+                ]
+                + list(handler_status)
+                )
             else:
-                self.completion_popup = BatchRunCompletePopup()
-                self.completion_popup.view_results_button.bind(on_release=self._go_to_view_results)
-
-                if len(handler_status) > 0:
-                    if solved_ops:
-                        # At least one model solved successfully.
-                        self.completion_popup.title = "Success!*"
-                        self.completion_popup.popup_text.text = '\n'.join([
-                            'All finished, but we found these issues:',
-                        ]
-                        + list(handler_status)
-                        )
-                    else:
-                        # No models solved successfully.
-                        self.completion_popup.title = "Hmm..."
-                        self.completion_popup.popup_text.text = '\n'.join([
-                            'Unfortunately, none of the models were able to be solved. We found these issues:',
-                        ]
-                        + list(handler_status)
-                        )
-
-                self.completion_popup.open()            
+                # No models solved successfully.
+                self.completion_popup.title = "Hmm..."
+                self.completion_popup.popup_text.text = '\n'.join([
+                    'Unfortunately, none of the models were able to be solved. We found these issues:',
+                ]
+                + list(handler_status)
+                )
+
+        self.completion_popup.open()
 
     def _go_to_view_results(self, *args):
         self.manager.nav_bar.go_to_screen('valuation_results_viewer')
@@ -258,13 +281,7 @@ class BatchRunDataScreen(Screen):
         try:
             # Get available pricing nodes.
             data_manager = App.get_running_app().data_manager
-            nodes = data_manager.get_nodes(self.iso)
-
-            node_options = [{'name': node[1],
-                             'nodeid': node[0]} for node in nodes.items()]
-
-            self.node_rv.data = node_options
-            self.node_rv.unfiltered_data = node_options
+            self.node_rv.set_indexed_data(data_manager.get_nodes(self.iso))
         except KeyError:
             # The ISO selected has no valid nodes.
             node_options = [{}]
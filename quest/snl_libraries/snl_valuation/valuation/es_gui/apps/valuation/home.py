@@ -7,6 +7,7 @@ from kivy.uix.screenmanager import Screen
 from kivy.app import App
 
 from valuation.es_gui.tools.valuation.valuation_dms import ValuationDMS
+from valuation.es_gui.tools.result_cache import ResultCache, set_result_cache
 from valuation.es_gui.resources.widgets.common import WarningPopup, NavigationButton
 from valuation.es_gui.proving_grounds.help_carousel import HelpCarouselModalView
 from .op_handler import ValuationOptimizerHandler
@@ -27,9 +28,30 @@ class ValuationHomeScreen(Screen):
                                 save_data=bool(App.get_running_app().config.getint('valuation', 'valuation_dms_save')),
                                 save_name='valuation_dms.p',
                                 home_path='data')
-        self.handler = ValuationOptimizerHandler(App.get_running_app().config.get('optimization', 'solver'))
+
+        # A setting of 0 worker processes uses one per CPU.
+        max_workers = App.get_running_app().config.getint('valuation', 'valuation_max_workers')
+
+        self.handler = ValuationOptimizerHandler(App.get_running_app().config.get('optimization', 'solver'),
+                                                 max_workers=max_workers if max_workers > 0 else None,
+                                                 prefetch=App.get_running_app().config.getint('valuation', 'valuation_prefetch'))
         self.handler.dms = self.dms
 
+        # Write the results of solved models to disk instead of keeping them in memory if a directory is set.
+        ValuationOptimizerHandler.spill_path = App.get_running_app().config.get('valuation', 'valuation_spill_path') or None
+
+        # Stop processing requests in the background when the app is closed.
+        App.get_running_app().bind(on_stop=self._abort_requests)
+
+        # Initialize the cache of solved model results.
+        result_cache_size = App.get_running_app().config.getint('valuation', 'valuation_result_cache_size')*1000
+
+        if result_cache_size > 0:
+            set_result_cache(ResultCache(os.path.join(DATA_HOME, 'result_cache'), max_size=result_cache_size))
+
+    def _abort_requests(self, *args):
+        self.handler.abort()
+
     def on_enter(self):
         ab = self.manager.nav_bar
         ab.reset_nav_bar()
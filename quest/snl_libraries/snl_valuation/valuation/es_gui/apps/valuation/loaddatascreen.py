@@ -133,11 +133,7 @@ class LoadDataScreen(Screen):
             self.iso_img.source=os.path.join(dirname, 'es_gui', 'resources', 'images', 'IRCmap_spp.png')
 
         data_manager = App.get_running_app().data_manager
-        node_data = [{'name': node[1],
-                      'nodeid': node[0]} for node in data_manager.get_nodes(self.iso_select.text).items()]
-
-        self.node_select_menu.node_rv.data = node_data
-        self.node_select_menu.node_rv.unfiltered_data = node_data
+        self.node_select_menu.node_rv.set_indexed_data(data_manager.get_nodes(self.iso_select.text))
         self.node_select_menu.node_rv.deselect_all_nodes()
         self.node = {}
 
@@ -3,20 +3,40 @@ from __future__ import absolute_import
 import logging
 from datetime import datetime
 import calendar
+import itertools
+import threading
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor, wait
 from pyutilib.common._exceptions import ApplicationError
 
-from kivy.clock import mainthread
-
+from valuation.es_gui.tools.optimizer import solve_detached
+from valuation.es_gui.tools.result_cache import get_result_cache, set_result_cache
+from valuation.es_gui.tools.solved_op import SolvedOpRecord
 from valuation.es_gui.tools.valuation.valuation_optimizer import ValuationOptimizer, BadParameterException, IncompatibleDataException
+from valuation.es_gui.tools.valuation import rolling_horizon
+from valuation.es_gui.tools.valuation.prefetch import Prefetcher
+
+
+# The number of seconds between checks for an abort while waiting for worker processes.
+ABORT_POLL_INTERVAL = 0.5
 
 
 class ValuationOptimizerHandler:
     """A handler for creating and solving ValuationOptimizer instances as requested."""
     solved_ops = []
 
-    def __init__(self, solver_name, dms):
+    # The path to the directory to write the results of solved Optimizers to instead of keeping them in memory, or None.
+    spill_path = None
+
+    def __init__(self, solver_name, dms, max_workers=1, prefetch=2):
         self._solver_name = solver_name
         self._dms = dms
+        self._max_workers = max_workers
+        self._prefetch = prefetch
+        self._abort = threading.Event()
+
+        # Serializes loads of market data read a year at a time, so months prefetched concurrently wait for the first load instead of repeating it.
+        self._year_load_lock = threading.Lock()
+        self.rolling_horizon_reports = []
 
     @property
     def solver_name(self):
@@ -27,6 +47,15 @@ class ValuationOptimizerHandler:
     def solver_name(self, value):
         self._solver_name = value
 
+    @property
+    def max_workers(self):
+        """The number of worker processes for solving requests concurrently; 1 solves serially in this process and None uses one process per CPU."""
+        return self._max_workers
+
+    @max_workers.setter
+    def max_workers(self, value):
+        self._max_workers = value
+
     @property
     def dms(self):
         """The name of the solver for Pyomo to call."""
@@ -36,138 +65,324 @@ class ValuationOptimizerHandler:
     def dms(self, value):
         self._dms = value
 
+    @property
+    def prefetch(self):
+        """The number of months of market data to load on background threads ahead of the month being solved; 0 loads each month when it is needed."""
+        return self._prefetch
+
+    @prefetch.setter
+    def prefetch(self, value):
+        self._prefetch = value
+
+    def abort(self):
+        """Aborts the requests being processed, or the next requests to be processed if there are none: no more models are built, market data that is not loading yet is not loaded, and models not yet handed to a solver or worker process are not solved. May be called from another thread."""
+        self._abort.set()
+
     def process_requests(self, requests, *args):
-        """Generates and solves ValuationOptimizer models based on the given requests."""
-        dms = self.dms
+        """Generates and solves ValuationOptimizer models based on the given requests.
 
+        If requests['rolling horizon'] is a dictionary with a 'window' and, optionally, an 'overlap' in hours, each run of consecutive months in requests['months'] is solved as one continuous horizon in rolling horizon mode, carrying the state of charge from each window to the next, and the results are split back into months. If it also has 'report' set to True, each rolling horizon solution is compared with the solution over the entire horizon and the report is added to rolling_horizon_reports.
+        """
         iso = requests['iso']
         market_type = requests['market type']
         node_id = str(requests['node id'])
         node_name = self.dms.get_node_name(node_id, iso)
         param_set = requests.get('param set', [None])
+        rolling_horizon_request = requests.get('rolling horizon')
 
         solved_requests = []
 
         handler_status = set()
 
+        # The months requested in each year, for ISOs whose market data is read faster for several months at once.
+        year_months = {}
+
         for month, year in requests['months']:
-            param_set_iterator = iter(param_set)
-            continue_param_loop = True
-
-            while continue_param_loop:
-                try:
-                    params = next(param_set_iterator)
-                except StopIteration:
-                    break
-
-                op = ValuationOptimizer(market_type=market_type)
-
-                if iso == 'PJM':
-                    #lmp_da, RUP, RDW, MR, RA, RD, RegCCP, RegPCP = dms.get_pjm_data(year, month, node_name)
-                    lmp_da, MR, RA, RD, RegCCP, RegPCP = dms.get_pjm_data(year, month, node_id)
-
-                    op.price_electricity = lmp_da
-                    op.mileage_mult = MR
-                    # op.mileage_slow = RA
-                    # op.mileage_fast = RD
-                    op.price_regulation = RegCCP
-                    op.price_reg_service = RegPCP
-                    #op.fraction_reg_up = RUP
-                    #op.fraction_reg_down = RDW
-                elif iso == 'ERCOT':
-                    lmp_da, rd, ru = dms.get_ercot_data(year, month, node_name)
-
-                    op.price_electricity = lmp_da
-                    op.price_reg_up = ru
-                    op.price_reg_down = rd
-                elif iso == 'MISO':
-                    lmp_da, regMCP = dms.get_miso_data(year, month, node_name)
-
-                    op.price_electricity = lmp_da
-                    # op.price_reg_service = regMCP
-                    op.price_regulation = regMCP
-                elif iso == 'ISONE':
-                    daLMP, RegCCP, RegPCP, miMULT = dms.get_isone_data(year, month, node_id)
-
-                    op.price_electricity = daLMP
-                    op.price_regulation = RegCCP
-                    op.price_reg_service = RegPCP
-                    op.mileage_mult = miMULT
-                ########################################################################################################
-                elif iso == 'NYISO':
-                    lbmp_da, rcap_da = dms.get_nyiso_data(year, month, node_id)
-
-                    op.price_electricity = lbmp_da
-                    op.price_regulation = rcap_da
-                elif iso == 'SPP':
-                    lmp_da, mcpru_da, mcprd_da = dms.get_spp_data(year, month, node_name)
-
-                    op.price_electricity = lmp_da
-                    op.price_reg_up = mcpru_da
-                    op.price_reg_down = mcprd_da
-                elif iso == 'CAISO':
-                    lmp_da, aspru_da, asprd_da, asprmu_da, asprmd_da, rmu_mm, rmd_mm, rmu_pacc, rmd_pacc = dms.get_caiso_data(year, month, node_name)
-
-                    op.price_electricity = lmp_da
-                    op.price_reg_up = aspru_da
-                    op.price_reg_down = asprd_da
-                    op.price_reg_serv_up = asprmu_da
-                    op.price_reg_serv_down = asprmd_da
-                    op.mileage_mult_ru = rmu_mm
-                    op.mileage_mult_rd = rmd_mm
-                    op.perf_score_ru = rmu_pacc # TODO: give the option to the user to override this
-                    op.perf_score_rd = rmd_pacc
+            year_months.setdefault(year, []).append(month)
+
+        # Market data for the months after the one being solved is loaded into the DMS in the background.
+        prefetcher = Prefetcher(self._get_market_data,
+                                [(iso, year, month, node_id, node_name, year_months[year]) for month, year in requests['months']],
+                                depth=self.prefetch)
+
+        try:
+            solved_jobs = self._solve_jobs(self._generate_jobs(requests, prefetcher, market_type, node_id, node_name, param_set))
+        finally:
+            prefetcher.close()
+
+            # An abort requested before processing started also applies to this run; it is cleared once the run stops.
+            aborted = self._abort.is_set()
+            self._abort.clear()
+
+        if aborted:
+            logging.info('Op Handler: Processing aborted.')
+            handler_status.add('* The requests were aborted before all of them were solved.')
+
+        for (months, lengths, params, _), future in solved_jobs:
+            if len(months) == 1:
+                period = '{0} {1}'.format(*months[0])
+            else:
+                period = '{0} {1} - {2} {3}'.format(months[0][0], months[0][1], months[-1][0], months[-1][1])
+
+            try:
+                solved_op = future.result()
+            except CancelledError:
+                # Aborted before it was solved.
+                continue
+            except ApplicationError as e:
+                logging.error('Op Handler: {error}'.format(error=e))
+
+                if 'No executable found' in e.args[0]:
+                    # Could not locate solver executable
+                    handler_status.add('* The executable for the selected solver could not be found; please check your installation.')
                 else:
-                    logging.error('ValOp Handler: Invalid ISO provided.')
-                    raise ValueError('Invalid ISO provided to ValuationOptimizer handler.')
-
-                if params:
-                    op.set_model_parameters(**params)
+                    handler_status.add('* ({0}) {1}. The problem may be infeasible.'.format(period, e.args[0]))
+            except IncompatibleDataException as e:
+                # Data exception raised by ValuationOptimizer
+                logging.error(e)
+                handler_status.add('* ({0}) The time series data has mismatched sizes.'.format(period))
+            except AssertionError as e:
+                # An optimal solution could not be found as reported by the solver
+                logging.error('Op Handler: {error}'.format(error=e))
+                handler_status.add('* ({0}) An optimal solution could not be found; the problem may be infeasible.'.format(period))
+            else:
+                if lengths is None:
+                    month_ops = [solved_op]
                 else:
-                    continue_param_loop = False
+                    if rolling_horizon_request.get('report', False):
+                        self._report_rolling_horizon(solved_op)
 
-                try:
-                    solved_op = self._solve_model(op)
-                except ApplicationError as e:
-                    logging.error('Op Handler: {error}'.format(error=e))
+                    month_ops = rolling_horizon.split_horizon(solved_op, lengths)
 
-                    if 'No executable found' in e.args[0]:
-                        # Could not locate solver executable
-                        handler_status.add('* The executable for the selected solver could not be found; please check your installation.')
-                    else:
-                        handler_status.add('* ({0} {1}) {2}. The problem may be infeasible.'.format(month, year, e.args[0]))
-                except IncompatibleDataException as e:
-                    # Data exception raised by ValuationOptimizer
-                    logging.error(e)
-                    handler_status.add('* ({0} {1}) The time series data has mismatched sizes.'.format(month, year))
-                except AssertionError as e:
-                    # An optimal solution could not be found as reported by the solver
-                    logging.error('Op Handler: {error}'.format(error=e))
-                    handler_status.add('* ({0} {1}) An optimal solution could not be found; the problem may be infeasible.'.format(month, year))
-                else:
-                    solved_op = self._save_to_solved_ops(solved_op, iso, market_type, node_name,
-                                                        year, month, params)
-                    solved_requests.append(solved_op)
+                for (month, year), month_op in zip(months, month_ops):
+                    solved_request = self._save_to_solved_ops(month_op, iso, market_type, node_name,
+                                                              year, month, params)
+                    solved_requests.append(solved_request)
 
         logging.info('Op Handler: Finished processing requested jobs.')
         return solved_requests, handler_status
 
+    def _generate_jobs(self, requests, prefetcher, market_type, node_id, node_name, param_set):
+        """Generates a (months, lengths, params, op) tuple for each model to solve, building each op when it is needed. Stops if the requests are aborted."""
+        iso = requests['iso']
+        rolling_horizon_request = requests.get('rolling horizon')
+
+        if rolling_horizon_request:
+            # Each run of consecutive months is solved as its own horizon, as the state of charge cannot be carried across a gap.
+            for run in rolling_horizon.consecutive_runs(requests['months']):
+                months = [requests['months'][ix] for ix in run]
+                month_ops = []
+
+                for ix in run:
+                    if self._abort.is_set():
+                        return
+
+                    month, year = requests['months'][ix]
+
+                    month_op = ValuationOptimizer(market_type=market_type)
+                    self._set_market_data(month_op, iso, year, month, node_id, node_name, prefetcher.get(ix))
+                    month_ops.append(month_op)
+
+                lengths = [len(month_op.price_electricity) for month_op in month_ops]
+
+                for params in param_set:
+                    if self._abort.is_set():
+                        return
+
+                    op = rolling_horizon.join_horizon(month_ops, months)
+                    op.rolling_horizon = (rolling_horizon_request['window'], rolling_horizon_request.get('overlap', 0))
+
+                    if params:
+                        op.set_model_parameters(**params)
+
+                    yield (months, lengths, params, op)
+        else:
+            for ix, (month, year) in enumerate(requests['months']):
+                param_set_iterator = iter(param_set)
+                continue_param_loop = True
+                market_data = None
+
+                while continue_param_loop:
+                    try:
+                        params = next(param_set_iterator)
+                    except StopIteration:
+                        break
+
+                    if self._abort.is_set():
+                        return
+
+                    if market_data is None:
+                        market_data = prefetcher.get(ix)
+
+                    op = ValuationOptimizer(market_type=market_type)
+                    self._set_market_data(op, iso, year, month, node_id, node_name, market_data)
+
+                    if params:
+                        op.set_model_parameters(**params)
+                    else:
+                        continue_param_loop = False
+
+                    yield ([(month, year)], None, params, op)
+
+    def _get_market_data(self, iso, year, month, node_id, node_name, months=None):
+        """Retrieves the market data for the month from the DMS as returned by the DMS method for the ISO. months is the list of the months of the year requested with month; for NYISO, all of them are loaded the first time any of them is retrieved."""
+        dms = self.dms
+
+        if iso == 'PJM':
+            return dms.get_pjm_data(year, month, node_id)
+        elif iso == 'ERCOT':
+            return dms.get_ercot_data(year, month, node_name)
+        elif iso == 'MISO':
+            return dms.get_miso_data(year, month, node_name)
+        elif iso == 'ISONE':
+            return dms.get_isone_data(year, month, node_id)
+        elif iso == 'NYISO':
+            if months and len(months) > 1:
+                with self._year_load_lock:
+                    return dms.load_nyiso_data(year, months, node_id)[str(month)]
+
+            return dms.get_nyiso_data(year, month, node_id)
+        elif iso == 'SPP':
+            return dms.get_spp_data(year, month, node_name)
+        elif iso == 'CAISO':
+            return dms.get_caiso_data(year, month, node_name)
+        else:
+            logging.error('ValOp Handler: Invalid ISO provided.')
+            raise ValueError('Invalid ISO provided to ValuationOptimizer handler.')
+
+    def _set_market_data(self, op, iso, year, month, node_id, node_name, market_data=None):
+        """Sets the market data for the month in op, retrieving it from the DMS unless market_data, as returned by _get_market_data(), is given."""
+        if market_data is None:
+            market_data = self._get_market_data(iso, year, month, node_id, node_name)
+
+        if iso == 'PJM':
+            #lmp_da, RUP, RDW, MR, RA, RD, RegCCP, RegPCP = dms.get_pjm_data(year, month, node_name)
+            lmp_da, MR, RA, RD, RegCCP, RegPCP = market_data
+
+            op.price_electricity = lmp_da
+            op.mileage_mult = MR
+            # op.mileage_slow = RA
+            # op.mileage_fast = RD
+            op.price_regulation = RegCCP
+            op.price_reg_service = RegPCP
+            #op.fraction_reg_up = RUP
+            #op.fraction_reg_down = RDW
+        elif iso == 'ERCOT':
+            lmp_da, rd, ru = market_data
+
+            op.price_electricity = lmp_da
+            op.price_reg_up = ru
+            op.price_reg_down = rd
+        elif iso == 'MISO':
+            lmp_da, regMCP = market_data
+
+            op.price_electricity = lmp_da
+            # op.price_reg_service = regMCP
+            op.price_regulation = regMCP
+        elif iso == 'ISONE':
+            daLMP, RegCCP, RegPCP, miMULT = market_data
+
+            op.price_electricity = daLMP
+            op.price_regulation = RegCCP
+            op.price_reg_service = RegPCP
+            op.mileage_mult = miMULT
+        ########################################################################################################
+        elif iso == 'NYISO':
+            lbmp_da, rcap_da = market_data
+
+            op.price_electricity = lbmp_da
+            op.price_regulation = rcap_da
+        elif iso == 'SPP':
+            lmp_da, mcpru_da, mcprd_da = market_data
+
+            op.price_electricity = lmp_da
+            op.price_reg_up = mcpru_da
+            op.price_reg_down = mcprd_da
+        elif iso == 'CAISO':
+            lmp_da, aspru_da, asprd_da, asprmu_da, asprmd_da, rmu_mm, rmd_mm, rmu_pacc, rmd_pacc = market_data
+
+            op.price_electricity = lmp_da
+            op.price_reg_up = aspru_da
+            op.price_reg_down = asprd_da
+            op.price_reg_serv_up = asprmu_da
+            op.price_reg_serv_down = asprmd_da
+            op.mileage_mult_ru = rmu_mm
+            op.mileage_mult_rd = rmd_mm
+            op.perf_score_ru = rmu_pacc # TODO: give the option to the user to override this
+            op.perf_score_rd = rmd_pacc
+        else:
+            logging.error('ValOp Handler: Invalid ISO provided.')
+            raise ValueError('Invalid ISO provided to ValuationOptimizer handler.')
+
+    def _report_rolling_horizon(self, op):
+        """Compares the rolling horizon solution of op with the solution over its entire horizon and adds the report to rolling_horizon_reports."""
+        try:
+            report = rolling_horizon.accuracy_report(op)
+        except Exception as e:
+            logging.warning('Op Handler: Could not compare the rolling horizon solution with the full horizon solution. ({0})'.format(e))
+        else:
+            self.rolling_horizon_reports.append(report)
+
     def _solve_model(self, op):
         op.solver = self.solver_name
         op.run()
 
         return op
 
+    def _solve_jobs(self, jobs):
+        """Solves the op at the end of each job tuple in the iterable jobs and returns a list of (job, Future) tuples, the Future holding the solved op or the raised exception, in the same order as jobs. Ops that are not solving yet when the requests are aborted are cancelled."""
+        solved_jobs = []
+
+        # The first two jobs are built to decide whether to start worker processes.
+        jobs = iter(jobs)
+        first_jobs = list(itertools.islice(jobs, 2))
+        jobs = itertools.chain(first_jobs, jobs)
+
+        if self.max_workers != 1 and len(first_jobs) > 1:
+            # Solved ops are returned from the worker processes without their Pyomo models.
+            # Worker processes do not share the default result cache of this process, so it is sent to each of them once.
+            with ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker,
+                                     initargs=(get_result_cache(),)) as executor:
+                # Each op is submitted as it is built, so market data is loaded while earlier ops are solved.
+                for job in jobs:
+                    solved_jobs.append((job, executor.submit(solve_detached, job[-1], self.solver_name)))
+
+                futures = [future for _, future in solved_jobs]
+
+                while wait(futures, timeout=ABORT_POLL_INTERVAL).not_done:
+                    if self._abort.is_set():
+                        for future in futures:
+                            future.cancel()
+
+                        break
+
+            return solved_jobs
+
+        for job in jobs:
+            future = Future()
+
+            try:
+                future.set_result(self._solve_model(job[-1]))
+            except Exception as e:
+                future.set_exception(e)
+
+            solved_jobs.append((job, future))
+
+        return solved_jobs
+
     @staticmethod
     def _save_to_solved_ops(op, iso, market_type, node_name, year, month, param_set):
         # time_finished = datetime.now().strftime('%A, %B %d, %Y %H:%M:%S')
         time_finished = datetime.now().strftime('%b %d, %Y %H:%M:%S')
         name = ' | '.join([time_finished, node_name, year, calendar.month_abbr[int(month)], repr(param_set)])
 
+        # Keep a lightweight record instead of the Optimizer and its Pyomo model.
+        record = SolvedOpRecord(op, ValuationOptimizerHandler.spill_path)
+
         results_dict = {}
 
         results_dict['name'] = name
-        results_dict['optimizer'] = op
+        results_dict['optimizer'] = record
         results_dict['iso'] = iso
         results_dict['market type'] = market_type
         results_dict['year'] = year
@@ -180,7 +395,7 @@ class ValuationOptimizerHandler:
 
         ValuationOptimizerHandler.solved_ops.append(results_dict)
 
-        return (name, op)
+        return (name, record)
     
     def get_solved_ops(self):
         """Returns the list of solved Optimizer objects in reverse chronological order."""
@@ -189,3 +404,8 @@ class ValuationOptimizerHandler:
         return return_list
 
 
+def _init_worker(result_cache):
+    """Initializes a worker process of ValuationOptimizerHandler with the ResultCache of the handler's process."""
+    set_result_cache(result_cache)
+
+
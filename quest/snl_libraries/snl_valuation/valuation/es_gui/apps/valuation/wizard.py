@@ -190,10 +190,7 @@ class ValuationWizardNodeSelect(Screen):
 
         try:
             data_manager = App.get_running_app().data_manager
-            node_options = [{'name': node[1],
-                            'nodeid': node[0]} for node in data_manager.get_nodes(value).items()]
-            self.node_rv.data = node_options
-            self.node_rv.unfiltered_data = node_options
+            self.node_rv.set_indexed_data(data_manager.get_nodes(value))
         except AttributeError:
             pass
 
@@ -3,16 +3,32 @@ import logging
 import os
 import shutil
 import sys
+import weakref
+from contextlib import nullcontext
+from functools import lru_cache
 
 from pyutilib.common._exceptions import ApplicationError
 
 from six import with_metaclass
 from pyomo.environ import *
+from pyomo.core.expr.visitor import identify_mutable_parameters
 from pyomo.opt import TerminationCondition
+from pyomo.solvers.plugins.solvers.persistent_solver import PersistentSolver
+
+from valuation.es_gui.tools.result_cache import ResultCache, get_result_cache
+from valuation.es_gui.tools.instrumentation import RunStats, model_size, solver_iterations
+
+# Sentinel for an Optimizer that uses the default ResultCache.
+_DEFAULT_CACHE = object()
 
 
 class Optimizer(with_metaclass(ABCMeta)):
     """Abstract base class for Pyomo ConcreteModel optimization framework."""
+    # Increment when a change to the formulation changes the results of a model, so that results cached before the change are not used.
+    FORMULATION_VERSION = 1
+
+    # Names of the attributes besides results stored in the ResultCache.
+    CACHED_ATTRIBUTES = ()
 
     def __init__(self, solver="glpk"):
         self._model = ConcreteModel()
@@ -55,15 +71,66 @@ class Optimizer(with_metaclass(ABCMeta)):
         """A method for setting model parameters, variables, and an ExpressionsBlock object for defining objectives and constraints."""
         pass
 
+    @property
+    def session(self):
+        """The SolverSession used to solve the model; defaults to the session for the solver shared within this process."""
+        session = getattr(self, '_session', None)
+
+        if session is None or session.solver_name != self.solver:
+            return get_solver_session(self.solver)
+
+        return session
+
+    @session.setter
+    def session(self, value):
+        self._session = value
+
+    @property
+    def result_cache(self):
+        """The ResultCache consulted by run() before building the model; defaults to the ResultCache set with result_cache.set_result_cache(). None disables caching."""
+        cache = getattr(self, '_result_cache', _DEFAULT_CACHE)
+
+        if cache is _DEFAULT_CACHE:
+            return get_result_cache()
+
+        return cache
+
+    @result_cache.setter
+    def result_cache(self, value):
+        self._result_cache = value
+
+    @property
+    def run_stats(self):
+        """The RunStats of the last call to run(): the time spent in each phase, the size of the model, and the solver information."""
+        if getattr(self, '_run_stats', None) is None:
+            self._run_stats = RunStats()
+
+        return self._run_stats
+
+    @property
+    def model_parameters(self):
+        """Dictionary of the model parameters set with set_model_parameters()."""
+        if not hasattr(self, '_model_parameters'):
+            self._model_parameters = {}
+
+        return self._model_parameters
+
+    def _cache_inputs(self):
+        """Returns a dictionary of the inputs that determine the results besides the model parameters, or None if the results should not be cached."""
+        return None
+
+    def cache_key(self):
+        """Returns the ResultCache key for the current inputs and model parameters, or None if the results should not be cached."""
+        inputs = self._cache_inputs()
+
+        if inputs is None:
+            return None
+
+        return ResultCache.make_key(type(self).__name__, self.FORMULATION_VERSION, self.solver, inputs, self.model_parameters)
+
     def solve_model(self):
         """Solves the model using the specified solver."""
-        if self.solver == "neos":
-            opt = SolverFactory("cbc")
-            solver_manager = SolverManagerFactory("neos")
-            results = solver_manager.solve(self.model, opt=opt)
-        else:
-            solver = self._create_solver()
-            results = solver.solve(self.model, tee=False, keepfiles=False)
+        results = self.session.solve(self.model, tee=False)
 
         assert results.solver.termination_condition == TerminationCondition.optimal
 
@@ -80,24 +147,70 @@ class Optimizer(with_metaclass(ABCMeta)):
         pass
 
     def run(self):
-        """Instantiates, creates, and solves the optimizer model based on supplied information. Use if no steps are needed between constructing the model and solving it."""
-        self.instantiate_model()
-        self.populate_model()
-
-        if self.solver == "neos":
-            opt = SolverFactory("cbc")
-            solver_manager = SolverManagerFactory("neos")
-            results = solver_manager.solve(self.model, opt=opt)
-        else:
-            solver = self._create_solver()
+        """Instantiates, creates, and solves the optimizer model based on supplied information. Use if no steps are needed between constructing the model and solving it.
+
+        If the result cache has the results of a model with the same inputs and parameters, they are loaded instead of building and solving the model.
+        """
+        self._run_stats = RunStats()
+        stats = self.run_stats
+
+        cache = self.result_cache
+        key = self.cache_key() if cache is not None else None
+
+        if key is not None:
+            with stats.phase('cache'):
+                cached = cache.get(key)
+
+            if cached is not None:
+                logging.info('Optimizer: Using cached results ({key}).'.format(key=key[:12]))
+                stats.cached = True
+                self._load_cached_results(*cached)
+
+                return self.get_results()
+
+        self._run()
+
+        if key is not None:
+            with stats.phase('cache'):
+                cache.put(key, self.results, {name: getattr(self, name) for name in self.CACHED_ATTRIBUTES})
+
+        return self.get_results()
+
+    def _run(self):
+        """Instantiates, creates, and solves the optimizer model."""
+        with self.run_stats.phase('instantiate'):
+            self.instantiate_model()
 
+        with self.run_stats.phase('populate'):
+            self.populate_model()
+
+        self._solve()
+
+    def _load_cached_results(self, results, attributes):
+        """Sets the results DataFrame and headline numbers loaded from the result cache."""
+        self._results = results
+
+        for name, value in attributes.items():
+            setattr(self, name, value)
+
+    def _solve(self):
+        """Solves the populated model with the solver session and processes the results."""
+        session = self.session
+
+        if session.solver_name != "neos":
             try:
-                solver.available()
+                session.available()
             except ApplicationError as e:
                 logging.error("Optimizer: {error}".format(error=e))
                 raise
-            else:
-                results = solver.solve(self.model, tee=True, keepfiles=False)
+
+        stats = self.run_stats
+        stats.set_model_size(*model_size(self.model))
+
+        results = session.solve(self.model, tee=True, stats=stats)
+
+        stats.set_solver_info(session.solver_name, results.solver.termination_condition,
+                              solver_iterations(session.solver, results))
 
         try:
             assert results.solver.termination_condition == TerminationCondition.optimal
@@ -115,25 +228,17 @@ class Optimizer(with_metaclass(ABCMeta)):
                 )
             )
         else:
-            self._process_results()
-
-        return self.get_results()
+            with stats.phase('process'):
+                self._process_results()
 
     def _create_solver(self):
         """Create a solver instance, preferring a bundled GLPK executable when present."""
-        if self.solver != "glpk":
-            return SolverFactory(self.solver)
-
-        executable = self._find_glpk_executable()
-        if executable:
-            logging.info("Optimizer: Using GLPK executable at %s", executable)
-            return SolverFactory(self.solver, executable=executable)
-
-        return SolverFactory(self.solver)
+        return create_solver(self.solver)
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def _find_glpk_executable():
-        """Locate glpsol in PATH or in the current environment's bundled GLPK folder."""
+        """Locate glpsol in PATH or in the current environment's bundled GLPK folder. The result is cached for the life of the process."""
         exe_name = "glpsol.exe" if os.name == "nt" else "glpsol"
         from_path = shutil.which(exe_name) or shutil.which("glpsol")
         if from_path:
@@ -158,8 +263,18 @@ class Optimizer(with_metaclass(ABCMeta)):
 
         return None
 
+    def release_model(self):
+        """Replaces the Pyomo model with an empty one holding only the model parameters, releasing the memory used by its components; the results and other attributes are kept."""
+        self._model = ConcreteModel()
+        self.session = None
+
+        for kw_key, kw_value in self.model_parameters.items():
+            setattr(self._model, kw_key, kw_value)
+
     def set_model_parameters(self, **kwargs):
         """Sets model parameters in kwargs to their respective values."""
+        self.model_parameters.update(kwargs)
+
         for kw_key, kw_value in kwargs.items():
             logging.info(
                 "Optimizer: Setting {param} to {value}".format(
@@ -167,3 +282,135 @@ class Optimizer(with_metaclass(ABCMeta)):
                 )
             )
             setattr(self.model, kw_key, kw_value)
+
+
+def create_solver(solver):
+    """Creates a Pyomo solver interface for the named solver, preferring a bundled GLPK executable when present."""
+    if solver != "glpk":
+        return SolverFactory(solver)
+
+    executable = Optimizer._find_glpk_executable()
+    if executable:
+        logging.info("Optimizer: Using GLPK executable at %s", executable)
+        return SolverFactory(solver, executable=executable)
+
+    return SolverFactory(solver)
+
+
+class SolverSession(object):
+    """
+    A solver interface that is created once and reused for consecutive solves.
+
+    Persistent solver interfaces (e.g., 'appsi_highs' or 'gurobi_persistent') keep the last model loaded: re-solving it after changing mutable parameters only updates the components that depend on them and, for the APPSI interfaces, starts from the previous solution. Other solvers reuse the interface and, if they are capable, are warm-started from the current variable values when the same model is solved again. Warm starting is a no-op for the default 'glpk', whose shell interface is not warm start capable.
+
+    Only a weak reference to the last model is kept, so a session does not keep a released model alive; persistent interfaces hold their model for as long as they are in use.
+    """
+
+    def __init__(self, solver="glpk"):
+        self._solver_name = solver
+        self._solver = None
+        self._available = False
+        self._last_model = None
+
+    @property
+    def solver_name(self):
+        """The name of the solver for Pyomo to use."""
+        return self._solver_name
+
+    @property
+    def solver(self):
+        """The Pyomo solver interface, created on first use."""
+        if self._solver is None:
+            if self.solver_name == "neos":
+                self._solver = SolverFactory("cbc")
+            else:
+                self._solver = create_solver(self.solver_name)
+
+        return self._solver
+
+    def available(self):
+        """Returns True if the solver is available; the solver interface raises ApplicationError if it cannot be found."""
+        if not self._available:
+            self._available = bool(self.solver.available())
+
+        return self._available
+
+    def solve(self, model, tee=False, stats=None):
+        """Solves model and returns the solver results. If stats is given, the steps of the solve are timed as phases of the RunStats."""
+        solver = self.solver
+        resolve = self._last_model is not None and self._last_model() is model
+        self._last_model = weakref.ref(model)
+
+        if stats is None:
+            timer = nullcontext()
+        elif self.solver_name == "neos" or isinstance(solver, PersistentSolver):
+            timer = stats.phase('solve')
+        else:
+            timer = stats.solver_phases(solver)
+
+        with timer:
+            if self.solver_name == "neos":
+                solver_manager = SolverManagerFactory("neos")
+                return solver_manager.solve(model, opt=solver)
+            elif isinstance(solver, PersistentSolver):
+                if resolve:
+                    # Legacy persistent interfaces do not track changes to mutable parameters.
+                    _update_mutable_components(solver, model)
+                else:
+                    solver.set_instance(model)
+
+                return solver.solve(tee=tee)
+            elif resolve and hasattr(solver, "warm_start_capable") and solver.warm_start_capable():
+                return solver.solve(model, tee=tee, keepfiles=False, warmstart=True)
+
+            return solver.solve(model, tee=tee, keepfiles=False)
+
+
+def _update_mutable_components(solver, model):
+    """Reloads the active constraints and objective and the variable bounds of model that depend on mutable parameters into the legacy persistent solver interface it is loaded in."""
+    for con in model.component_data_objects(Constraint, active=True, descend_into=True):
+        if any(_has_mutable_parameters(expr) for expr in (con.body, con.lower, con.upper)):
+            solver.remove_constraint(con)
+            solver.add_constraint(con)
+
+    for var in model.component_data_objects(Var, descend_into=True):
+        if _has_mutable_parameters(var.lower) or _has_mutable_parameters(var.upper):
+            solver.update_var(var)
+
+    for obj in model.component_data_objects(Objective, active=True, descend_into=True):
+        if _has_mutable_parameters(obj.expr):
+            solver.set_objective(obj)
+
+
+def _has_mutable_parameters(expr):
+    """Returns True if the expression, which may be None or a constant, contains a mutable parameter."""
+    if expr is None or type(expr) in native_types:
+        return False
+
+    return any(True for _ in identify_mutable_parameters(expr))
+
+
+_solver_sessions = {}
+
+
+def get_solver_session(solver):
+    """Returns the SolverSession for the named solver that is shared within this process."""
+    try:
+        return _solver_sessions[solver]
+    except KeyError:
+        session = SolverSession(solver)
+        _solver_sessions[solver] = session
+
+        return session
+
+
+def solve_detached(op, solver):
+    """Solves op with the given solver and returns it without its Pyomo model.
+
+    Used as the target for worker processes: the model's components hold references to local rule functions and cannot be pickled, so only the results computed by op.run() are sent back.
+    """
+    op.solver = solver
+    op.run()
+    op.release_model()
+
+    return op
@@ -0,0 +1,105 @@
+from __future__ import absolute_import
+
+import logging
+import os
+import uuid
+import weakref
+
+import numpy as np
+import pandas as pd
+
+
+class SolvedOpRecord(object):
+    """
+    A lightweight record of a solved Optimizer kept for viewing and reporting. The Optimizer's Pyomo model is released, leaving its results DataFrame, headline numbers, and input data and metadata, which are accessed through the record as attributes of the Optimizer.
+
+    If spill_path is given, the results DataFrame is written to a compressed .npz file there instead of being kept in memory and is read back each time it is accessed. The file is deleted when the record is.
+
+    :param op: The solved Optimizer.
+    :param spill_path: The path to the directory to write the results to, or None to keep them in memory.
+    """
+    def __init__(self, op, spill_path=None):
+        op.release_model()
+
+        self._op = op
+        self._fname = None
+
+        if spill_path is not None and op.results is not None:
+            os.makedirs(spill_path, exist_ok=True)
+            fname = os.path.join(spill_path, '{0}.npz'.format(uuid.uuid4().hex))
+
+            try:
+                _save_results(fname, op.results)
+            except (IOError, OSError) as e:
+                logging.warning('SolvedOpRecord: Could not write results to disk, keeping them in memory. ({0})'.format(e))
+            else:
+                self._fname = fname
+                op._results = None
+                weakref.finalize(self, _remove_file, fname)
+
+    @property
+    def optimizer(self):
+        """The solved Optimizer without its Pyomo model or, if they are spilled to disk, its results."""
+        return self._op
+
+    @property
+    def is_spilled(self):
+        """True if the results are kept on disk."""
+        return self._fname is not None
+
+    @property
+    def results(self):
+        """The results DataFrame of the solved Optimizer."""
+        if self._fname is None:
+            return self._op.results
+
+        return _load_results(self._fname)
+
+    def get_results(self):
+        """Returns what get_results() of the solved Optimizer returns, with the results read back from disk if they are spilled."""
+        if self._fname is None:
+            return self._op.get_results()
+
+        self._op._results = self.results
+
+        try:
+            return self._op.get_results()
+        finally:
+            self._op._results = None
+
+    def __getattr__(self, name):
+        # Only called for attributes not found on the record itself, e.g., before __init__ when unpickling.
+        if name == '_op':
+            raise AttributeError(name)
+
+        return getattr(self._op, name)
+
+
+def _save_results(fname, results):
+    """Writes the results DataFrame to fname as one compressed array per column."""
+    arrays = {'columns': np.array([str(column) for column in results.columns])}
+
+    for ix, column in enumerate(results.columns):
+        arrays['column_{0}'.format(ix)] = results[column].values
+
+    tmp_fname = '{0}.{1}.tmp'.format(fname, os.getpid())
+
+    with open(tmp_fname, 'wb') as f:
+        np.savez_compressed(f, **arrays)
+
+    os.replace(tmp_fname, fname)
+
+
+def _load_results(fname):
+    """Reads the results DataFrame written by _save_results()."""
+    with np.load(fname, allow_pickle=True) as data:
+        columns = list(data['columns'])
+
+        return pd.DataFrame({column: data['column_{0}'.format(ix)] for ix, column in enumerate(columns)}, columns=columns)
+
+
+def _remove_file(fname):
+    try:
+        os.remove(fname)
+    except OSError:
+        pass
@@ -0,0 +1,79 @@
+"""
+Compares the per-request cost of reading ERCOT day-ahead market data with the original readers, which parse the workbook for every request, and with the one-pass (month, settlement point) index used by ValuationDMS.
+
+Usage: python -m valuation.es_gui.tools.valuation.benchmark_ercot SPP_FILE CCP_FILE [-s SETTLEMENT_POINT ...]
+"""
+from __future__ import absolute_import, print_function
+
+import argparse
+import time
+
+import numpy as np
+
+from valuation.es_gui.tools.valuation.utilities import read_ercot_da_spp, read_ercot_da_ccp, index_ercot_da_spp, index_ercot_da_ccp
+
+
+def benchmark(spp_fname, ccp_fname, settlement_points, months=range(1, 13)):
+    """
+    Reads every (month, settlement point) combination with both methods and verifies that they return the same data.
+
+    :param spp_fname: The path to the DAM SPPs workbook.
+    :param ccp_fname: The path to the DAM CCPs file.
+    :param settlement_points: A list of settlement point names.
+    :param months: The months to read.
+    :return: A dictionary of method name to a tuple of (total seconds, seconds per request).
+    """
+    requests = [(month, settlement_point) for month in months for settlement_point in settlement_points]
+    results = {}
+
+    t0 = time.perf_counter()
+    original = {}
+
+    for month, settlement_point in requests:
+        # The DMS passes months as strings.
+        original[(month, settlement_point)] = (read_ercot_da_spp(spp_fname, str(month), settlement_point),) \
+            + read_ercot_da_ccp(ccp_fname, str(month))
+
+    elapsed = time.perf_counter() - t0
+    results['original'] = (elapsed, elapsed/len(requests))
+
+    t0 = time.perf_counter()
+    indexed = {}
+    spp_index = index_ercot_da_spp(spp_fname)
+    ccp_index = index_ercot_da_ccp(ccp_fname)
+
+    for month, settlement_point in requests:
+        indexed[(month, settlement_point)] = (spp_index.get(month, {}).get(settlement_point, np.array([])),) \
+            + ccp_index.get(month, (np.array([]), np.array([])))
+
+    elapsed = time.perf_counter() - t0
+    results['indexed'] = (elapsed, elapsed/len(requests))
+
+    for key, arrays in original.items():
+        for original_array, indexed_array in zip(arrays, indexed[key]):
+            if not np.array_equal(original_array, indexed_array):
+                raise(ValueError('Indexed data does not match the original reader for {0}.'.format(key)))
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the ERCOT DAM SPP/CCP readers.')
+    parser.add_argument('spp_fname', help='path to the DAM SPPs .xlsx workbook')
+    parser.add_argument('ccp_fname', help='path to the DAM CCPs .csv file')
+    parser.add_argument('-s', '--settlement-point', dest='settlement_points', action='append', default=None,
+                        help='settlement point to read; may be given more than once (default: HB_HOUSTON)')
+    args = parser.parse_args(argv)
+
+    settlement_points = args.settlement_points or ['HB_HOUSTON']
+
+    results = benchmark(args.spp_fname, args.ccp_fname, settlement_points)
+
+    for method, (total, per_request) in results.items():
+        print('{0:>10}: {1:8.3f} s total, {2:8.4f} s per request'.format(method, total, per_request))
+
+    print('{0:>10}: {1:8.1f}x'.format('speedup', results['original'][0]/results['indexed'][0]))
+
+
+if __name__ == '__main__':
+    main()
@@ -612,14 +612,14 @@ def eq_stateofcharge_initial(m):
     m.stateofcharge_initial = Constraint(mp.soc_time, rule=_eq_stateofcharge_initial)
 
 def eq_stateofcharge_final(m):
-    """Requires the final state of charge of the energy storage device to equal its initial value."""
+    """Requires the final state of charge of the energy storage device to equal State_of_charge_final, by default its initial value."""
     mp = m.parent_block()
 
     def _eq_stateofcharge_final(_m, t):
         if not t == mp.soc_time[-1]:
             return Constraint.Skip
         else:
-            return mp.s[t] == mp.State_of_charge_init*mp.Energy_capacity
+            return mp.s[t] == mp.State_of_charge_final*mp.Energy_capacity
         
     m.stateofcharge_final = Constraint(mp.soc_time, rule=_eq_stateofcharge_final)
 
@@ -0,0 +1,189 @@
+from __future__ import division, absolute_import
+
+import logging
+
+import numpy as np
+
+from valuation.es_gui.tools.valuation.lp_matrix import DECISION_VARIABLES
+
+
+class ConcaveFunction(object):
+    """
+    A concave piecewise linear function on the interval [start, start + sum(lengths)], represented by its value at start and the length and slope of each linear segment in order of decreasing slope.
+
+    :param start: The left end of the domain.
+    :param value: The value of the function at start.
+    :param lengths: NumPy ndarray of the length of each segment.
+    :param slopes: NumPy ndarray of the slope of each segment, in decreasing order.
+    """
+    def __init__(self, start, value, lengths, slopes):
+        self.start = start
+        self.value = value
+        self.lengths = lengths
+        self.slopes = slopes
+
+    @property
+    def stop(self):
+        """The right end of the domain."""
+        return self.start + self.lengths.sum()
+
+    def clip(self, lower, upper):
+        """Returns the function restricted to [lower, upper], or None if the domains do not intersect."""
+        lower = max(lower, self.start)
+        upper = min(upper, self.stop)
+
+        if lower > upper:
+            return None
+
+        seg_stop = self.start + np.cumsum(self.lengths)
+        seg_start = seg_stop - self.lengths
+
+        # Clip each segment to [lower, upper]. (np.minimum and np.maximum are much faster than np.clip on small arrays.)
+        lengths = np.minimum(seg_stop, upper) - np.maximum(seg_start, lower)
+
+        # The value at lower accumulates the segments to the left of it.
+        value = self.value + np.dot(np.minimum(np.maximum(lower - seg_start, 0), self.lengths), self.slopes)
+
+        keep = lengths > 0
+
+        return ConcaveFunction(lower, value, lengths[keep], self.slopes[keep])
+
+
+def _reward_function(price, power_rating, round_trip_efficiency):
+    """
+    Returns the revenue of one time step as a ConcaveFunction of the decrease in stored energy, y = -(rte*q_r - q_d), over [-rte*P, P], and whether charging and discharging in the same time step is profitable.
+
+    For nonnegative prices, energy is either charged or discharged. For negative prices, charging and discharging simultaneously at full power dissipates the round trip losses and earns the most revenue for any change in stored energy.
+    """
+    rte = round_trip_efficiency
+    start = -rte*power_rating
+    value = -price*power_rating
+
+    if price >= 0:
+        if rte > 0:
+            lengths = np.array([rte*power_rating, power_rating])
+            slopes = np.array([price/rte, price])
+        else:
+            lengths = np.array([power_rating])
+            slopes = np.array([price])
+
+        return ConcaveFunction(start, value, lengths, slopes), False
+
+    lengths = np.array([(1 + rte)*power_rating])
+    slopes = np.array([2*price/(1 + rte)])
+
+    return ConcaveFunction(start, value, lengths, slopes), True
+
+
+def _sup_convolution(f, g):
+    """
+    Returns h(u) = max_y f(y) + g(u - y) for the ConcaveFunctions f and g, and, for each segment of h, whether it comes from f.
+    """
+    lengths = np.concatenate([f.lengths, g.lengths])
+    slopes = np.concatenate([f.slopes, g.slopes])
+    from_f = np.concatenate([np.ones(len(f.lengths), dtype=bool), np.zeros(len(g.lengths), dtype=bool)])
+
+    # The segments of the sup-convolution of concave functions are those of both functions sorted by decreasing slope.
+    order = np.argsort(-slopes, kind='stable')
+
+    return ConcaveFunction(f.start + g.start, f.value + g.value, lengths[order], slopes[order]), from_f[order]
+
+
+def solve_arbitrage(price_electricity, power_rating, energy_capacity,
+                    soc_min=0.0, soc_max=1.0, soc_init=0.5, soc_final=None,
+                    self_discharge_efficiency=1.0, round_trip_efficiency=0.85, discount_rate=0.0):
+    """
+    Solves the energy arbitrage model exactly by dynamic programming without an LP solver.
+
+    The value of stored energy at each time step is a concave piecewise linear function of the state of charge, so it is represented exactly by its linear segments: each step back in time merges the segments of the revenue of one time step into it. The optimal schedule is then recovered forward in time from the initial state of charge.
+
+    :param price_electricity: Array-like of the price of electricity at each time step [$/MWh].
+    :param power_rating: The maximum energy charged and discharged in one time step [MWh].
+    :param energy_capacity: Energy capacity [MWh].
+    :param soc_min: Minimum state of charge [fraction of capacity].
+    :param soc_max: Maximum state of charge [fraction of capacity].
+    :param soc_init: Initial state of charge [fraction of capacity].
+    :param soc_final: Final state of charge [fraction of capacity]; defaults to soc_init.
+    :param self_discharge_efficiency: Fraction of stored energy maintained over one time step.
+    :param round_trip_efficiency: Fraction of charged energy that is stored.
+    :param discount_rate: Discount rate [time step^(-1)].
+    :return: A dictionary of decision variable name to ndarray of values, as returned by lp_matrix.solve_lp().
+    """
+    price = np.asarray(price_electricity, dtype=float)
+    n_steps = len(price)
+
+    if soc_final is None:
+        soc_final = soc_init
+
+    eta = self_discharge_efficiency
+    rte = round_trip_efficiency
+    s_min = soc_min*energy_capacity
+    s_max = soc_max*energy_capacity
+    s_init = soc_init*energy_capacity
+    s_final = soc_final*energy_capacity
+
+    discounted_price = price*np.exp(-np.arange(n_steps)*discount_rate)
+
+    # Backward pass: value[t] is the maximum revenue from time step t on as a function of the state of charge s[t].
+    value = ConcaveFunction(s_final, 0.0, np.zeros(0), np.zeros(0)).clip(s_min, s_max)
+    stages = [None]*n_steps
+    simultaneous = np.zeros(n_steps, dtype=bool)
+
+    for t in range(n_steps - 1, -1, -1):
+        if value is None:
+            break
+
+        reward, simultaneous[t] = _reward_function(discounted_price[t], power_rating, rte)
+
+        # Maximum revenue as a function of u = eta*s[t], with s[t+1] = u - y.
+        convolution, from_reward = _sup_convolution(reward, value)
+        stages[t] = (reward, convolution, from_reward)
+
+        if eta > 0:
+            scaled = ConcaveFunction(convolution.start/eta, convolution.value, convolution.lengths/eta, convolution.slopes*eta)
+        elif convolution.start <= 0 <= convolution.stop:
+            # Nothing is stored from one time step to the next.
+            scaled = ConcaveFunction(s_min, convolution.clip(0, 0).value, np.array([s_max - s_min]), np.zeros(1))
+        else:
+            scaled = None
+
+        value = scaled.clip(s_min, s_max) if scaled is not None else None
+
+    if value is None or not value.start <= s_init <= value.stop:
+        logging.error('dp_arbitrage: The state of charge limits cannot be met.')
+        raise(AssertionError('An optimal solution could not be obtained. (the model is infeasible)'))
+
+    # Forward pass: follow the optimal decrease in stored energy y[t] from the initial state of charge.
+    solution = {name: np.zeros(n_steps) for name in DECISION_VARIABLES}
+    soc = np.zeros(n_steps + 1)
+    soc[0] = s_init
+
+    for t in range(n_steps):
+        reward, convolution, from_reward = stages[t]
+        u = eta*soc[t]
+
+        # Take the leftmost segments of the convolution up to u; those from the reward function make up y - reward.start.
+        seg_start = convolution.start + np.cumsum(convolution.lengths) - convolution.lengths
+        taken = np.minimum(np.maximum(u - seg_start, 0), convolution.lengths)
+        y = reward.start + taken[from_reward].sum()
+
+        x = -y  # rte*q_r - q_d
+
+        if simultaneous[t]:
+            q_r = (power_rating + x)/(1 + rte)
+            q_d = rte*q_r - x
+        elif x >= 0:
+            q_r = x/rte if rte > 0 else 0.0
+            q_d = 0.0
+        else:
+            q_r = 0.0
+            q_d = -x
+
+        solution['q_r'][t] = max(q_r, 0.0)
+        solution['q_d'][t] = max(q_d, 0.0)
+        soc[t + 1] = min(max(u + x, s_min), s_max)
+
+    soc[n_steps] = s_final
+    solution['s'] = soc
+
+    return solution
@@ -0,0 +1,225 @@
+from __future__ import division, absolute_import
+
+from collections import namedtuple
+import logging
+
+import numpy as np
+from scipy import sparse
+from scipy.optimize import linprog
+from pyomo.environ import Param, value
+
+
+ONE_PRODUCT_MARKETS = {'pjm_pfp', 'miso_pfp', 'isone_pfp', 'nyiso_pfp'}
+TWO_PRODUCT_MARKETS = {'ercot_arbreg', 'spp_pfp', 'caiso_pfp'}
+
+# Regulation revenue per unit of each decision variable for each market formulation, as functions of the model parameters. The 'const' entry is revenue that does not depend on any decision variable. Energy arbitrage revenue, price_electricity*(q_d - q_r), is common to every formulation.
+REGULATION_REVENUE = {
+    'arbitrage': {},
+    'ercot_arbreg': {
+        'q_ru': lambda p: p.price_reg_up + p.price_electricity*p.fraction_reg_up,
+        'q_rd': lambda p: p.price_reg_down - p.price_electricity*p.fraction_reg_down,
+    },
+    'pjm_pfp': {
+        'q_reg': lambda p: p.perf_score*(p.mi_mult*p.price_reg_service + p.price_regulation),
+    },
+    'miso_pfp': {
+        'q_reg': lambda p: (1 + p.Make_whole)*p.perf_score*p.price_regulation,
+    },
+    'isone_pfp': {
+        'q_reg': lambda p: (p.mi_mult*p.price_reg_service + p.price_regulation)*p.perf_score,
+    },
+    'nyiso_pfp': {
+        'q_reg': lambda p: p.price_regulation*(1 - 1.1*(1 - p.perf_score))
+                           + p.price_electricity*(p.fraction_reg_up - p.fraction_reg_down),
+    },
+    'spp_pfp': {
+        'q_ru': lambda p: p.price_reg_up + p.price_electricity*p.fraction_reg_up,
+        'q_rd': lambda p: p.price_reg_down - p.price_electricity*p.fraction_reg_down,
+    },
+    'caiso_pfp': {
+        'q_ru': lambda p: p.price_reg_up + p.price_electricity*p.fraction_reg_up,
+        'q_rd': lambda p: p.price_reg_down - p.price_electricity*p.fraction_reg_down,
+        'const': lambda p: p.perf_score_ru*p.mi_mult_ru*p.price_reg_serv_up
+                           + p.perf_score_rd*p.mi_mult_rd*p.price_reg_serv_down,
+    },
+}
+
+DECISION_VARIABLES = ('q_r', 'q_d', 'q_ru', 'q_rd', 'q_reg')
+
+LinearProgram = namedtuple('LinearProgram', ['c', 'A_ub', 'b_ub', 'A_eq', 'b_eq', 'bounds', 'columns', 'n_steps'])
+
+
+class ModelParams(object):
+    """
+    Read-only view of the parameters assigned to a ValuationOptimizer model. Array-like parameters are returned as float ndarrays truncated to n_steps; scalar parameters, including mutable Pyomo Params, are returned as floats.
+
+    :param model: The Pyomo ConcreteModel after ValuationOptimizer._set_model_param() has been called.
+    :param n_steps: The number of time steps in the horizon, i.e., the length of price_electricity.
+    """
+    def __init__(self, model, n_steps):
+        self._model = model
+        self._n_steps = n_steps
+
+    def __getattr__(self, name):
+        param = getattr(self._model, name)
+
+        if isinstance(param, Param):
+            return float(value(param))
+
+        param = np.asarray(param, dtype=float)
+
+        if param.ndim == 0:
+            return float(param)
+        elif len(param) < self._n_steps:
+            raise IndexError('{0} is shorter than price_electricity.'.format(name))
+
+        return param[:self._n_steps]
+
+
+def get_products(market_type):
+    """Returns the names of the decision variables, other than state of charge, used by the market formulation."""
+    if market_type == 'arbitrage':
+        return ['q_r', 'q_d']
+    elif market_type in ONE_PRODUCT_MARKETS:
+        return ['q_r', 'q_d', 'q_reg']
+    elif market_type in TWO_PRODUCT_MARKETS:
+        return ['q_r', 'q_d', 'q_ru', 'q_rd']
+    else:
+        raise ValueError('Invalid market type specified!')
+
+
+def revenue_streams(market_type, params, solution):
+    """
+    Computes the energy arbitrage and regulation revenue at each time step.
+
+    :param market_type: The name of the market formulation.
+    :param params: ModelParams for the model.
+    :param solution: A dictionary of decision variable name to ndarray of values over the horizon.
+    :return: rev_arb, rev_reg: NumPy ndarrays of revenue [$] at each time step.
+    """
+    price_electricity = params.price_electricity
+
+    rev_arb = price_electricity*(solution['q_d'] - solution['q_r'])
+    rev_reg = np.zeros(len(price_electricity))
+
+    for name, coefficient in REGULATION_REVENUE[market_type].items():
+        if name == 'const':
+            rev_reg += coefficient(params)
+        else:
+            rev_reg += coefficient(params)*solution[name]
+
+    return rev_arb, rev_reg
+
+
+def build_lp(market_type, model):
+    """
+    Assembles the valuation model for market_type in matrix form, min c'x subject to A_ub x <= b_ub, A_eq x == b_eq, and bounds, equivalent to the Pyomo model built by ExpressionsBlock.
+
+    :param market_type: The name of the market formulation.
+    :param model: The Pyomo ConcreteModel after ValuationOptimizer._set_model_param() has been called.
+    :return: A LinearProgram namedtuple; columns maps each decision variable name to its slice of x.
+    """
+    products = get_products(market_type)
+
+    if model.price_electricity is None:
+        n = 0
+    else:
+        n = len(model.price_electricity)
+
+    p = ModelParams(model, n)
+
+    # Column layout: each product over the horizon, followed by the state of charge over n + 1 points.
+    columns = {name: slice(ix*n, (ix + 1)*n) for ix, name in enumerate(products)}
+    columns['s'] = slice(len(products)*n, len(products)*n + n + 1)
+    n_vars = columns['s'].stop
+
+    steps = np.arange(n)
+    col = {name: steps + columns[name].start for name in products}
+    col_s = steps + columns['s'].start
+
+    soc_init = p.State_of_charge_init*p.Energy_capacity
+    soc_final = p.State_of_charge_final*p.Energy_capacity
+    soc_min = p.State_of_charge_min*p.Energy_capacity
+    soc_max = p.State_of_charge_max*p.Energy_capacity
+
+    # Objective: discounted revenue over the horizon, negated for minimization.
+    discount = np.exp(-steps*p.R)
+    c = np.zeros(n_vars)
+    c[col['q_d']] = -discount*p.price_electricity
+    c[col['q_r']] = discount*p.price_electricity
+
+    for name, coefficient in REGULATION_REVENUE[market_type].items():
+        if name != 'const':
+            c[col[name]] -= discount*coefficient(p)
+
+    # State of charge evolution: s[t+1] = eta*s[t] + rte*q_r[t] - q_d[t] + (regulation terms), then initial and final state of charge.
+    rows, cols, vals = [steps, steps, steps, steps], [col_s, col_s + 1, col['q_r'], col['q_d']], \
+        [np.full(n, p.Self_discharge_efficiency), np.full(n, -1.0), np.full(n, p.Round_trip_efficiency), np.full(n, -1.0)]
+
+    if market_type in ONE_PRODUCT_MARKETS:
+        rows.append(steps)
+        cols.append(col['q_reg'])
+        vals.append(p.Round_trip_efficiency*p.fraction_reg_down - p.fraction_reg_up)
+    elif market_type in TWO_PRODUCT_MARKETS:
+        rows.extend([steps, steps])
+        cols.extend([col['q_rd'], col['q_ru']])
+        vals.extend([p.Round_trip_efficiency*p.fraction_reg_down, -p.fraction_reg_up])
+
+    rows.append(np.array([n, n + 1]))
+    cols.append(np.array([columns['s'].start, columns['s'].stop - 1]))
+    vals.append(np.ones(2))
+
+    A_eq = sparse.csr_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))), shape=(n + 2, n_vars))
+    b_eq = np.concatenate([np.zeros(n), [soc_init, soc_final]])
+
+    # Power rating: the sum of all products at each time step.
+    rows = [steps for _ in products]
+    cols = [col[name] for name in products]
+    vals = [np.ones(n) for _ in products]
+    b_ub = [np.full(n, p.Power_rating)]
+
+    bounds = np.zeros((n_vars, 2))
+    bounds[:, 1] = np.inf
+
+    if market_type == 'arbitrage':
+        bounds[columns['s'], 0] = soc_min
+        bounds[columns['s'], 1] = soc_max
+    else:
+        # State of charge limits tightened by the regulation reserve requirements.
+        reserve_min, reserve_max = ('q_reg', 'q_reg') if market_type in ONE_PRODUCT_MARKETS else ('q_ru', 'q_rd')
+
+        rows.extend([steps + n, steps + n, steps + 2*n, steps + 2*n])
+        cols.extend([col_s + 1, col[reserve_min], col_s + 1, col[reserve_max]])
+        vals.extend([np.full(n, -1.0), np.full(n, p.Reserve_reg_min),
+                     np.ones(n), np.full(n, p.Round_trip_efficiency*p.Reserve_reg_max)])
+        b_ub.extend([np.full(n, -soc_min), np.full(n, soc_max)])
+
+    b_ub = np.concatenate(b_ub)
+    A_ub = sparse.csr_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))), shape=(len(b_ub), n_vars))
+
+    return LinearProgram(c, A_ub, b_ub, A_eq, b_eq, bounds, columns, n)
+
+
+def solve_lp(lp, stats=None):
+    """
+    Solves the LinearProgram with the HiGHS solver via SciPy.
+
+    :param lp: A LinearProgram returned by build_lp().
+    :param stats: A RunStats to record the solver information in, or None.
+    :return: A dictionary of decision variable name to ndarray of values; products not in the formulation are zero.
+    """
+    res = linprog(lp.c, A_ub=lp.A_ub, b_ub=lp.b_ub, A_eq=lp.A_eq, b_eq=lp.b_eq, bounds=lp.bounds, method='highs')
+
+    if stats is not None:
+        stats.set_solver_info('highs', 'optimal' if res.status == 0 else res.message, res.nit)
+
+    if res.status != 0:
+        logging.error('lp_matrix: An optimal solution could not be obtained. ({0})'.format(res.message))
+        raise(AssertionError('An optimal solution could not be obtained. (solver status: {0})'.format(res.message)))
+
+    solution = {name: np.zeros(lp.n_steps) for name in DECISION_VARIABLES}
+
+    for name, cols in lp.columns.items():
+        solution[name] = res.x[cols]
+
+    return solution
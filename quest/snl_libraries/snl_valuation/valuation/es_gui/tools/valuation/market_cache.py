@@ -0,0 +1,146 @@
+from __future__ import absolute_import
+
+import glob
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+
+def source_signature(sources):
+    """
+    Computes a signature of the source files that a month of market data is parsed from.
+
+    :param sources: A list of paths to files or directories; directory paths may include glob wildcards. The files in each directory (not its subdirectories) are included.
+    :return: A sorted list of [path, mtime_ns, size] entries; paths that do not exist have None for mtime_ns and size.
+    """
+    signature = []
+
+    for source in sources:
+        paths = glob.glob(source) if glob.has_magic(source) else [source]
+
+        for path in paths:
+            if os.path.isdir(path):
+                for dir_entry in os.scandir(path):
+                    if dir_entry.is_file():
+                        stat = dir_entry.stat()
+                        signature.append([dir_entry.path, stat.st_mtime_ns, stat.st_size])
+            elif os.path.isfile(path):
+                stat = os.stat(path)
+                signature.append([path, stat.st_mtime_ns, stat.st_size])
+            else:
+                signature.append([path, None, None])
+
+    return sorted(signature, key=lambda entry: entry[0])
+
+
+class MarketDataCache(object):
+    """
+    An on-disk columnar cache of parsed ISO market data. Each ISO/node/year has a directory holding one .npy file per month and product, e.g., '03.LMP.npy', and a manifest recording the products and source file signature of each cached month. Cached arrays are memory-mapped when read. A month is parsed again if the size or modification time of any of its source files has changed.
+
+    :param root: A string indicating the path to the directory where cached data is written.
+    """
+    MANIFEST_NAME = 'manifest.json'
+
+    def __init__(self, root):
+        self._root = root
+        # Serializes updates of the manifests by threads of this process, e.g., when market data is prefetched.
+        self._lock = threading.Lock()
+
+    @property
+    def root(self):
+        """The path to the directory where cached data is written."""
+        return self._root
+
+    def _year_dir(self, iso, node, year):
+        return os.path.join(self.root, iso, str(node), str(year))
+
+    def _read_manifest(self, year_dir):
+        try:
+            with open(os.path.join(year_dir, self.MANIFEST_NAME), 'r') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _write_manifest(self, year_dir, manifest):
+        manifest_path = os.path.join(year_dir, self.MANIFEST_NAME)
+        tmp_path = '{0}.{1}.tmp'.format(manifest_path, os.getpid())
+
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+
+        os.replace(tmp_path, manifest_path)
+
+    def load(self, iso, node, year, month, sources):
+        """Returns a dictionary of product name to memory-mapped ndarray for the cached month, or None if it is not cached or its source files have changed."""
+        year_dir = self._year_dir(iso, node, year)
+        month = str(int(month)).zfill(2)
+
+        entry = self._read_manifest(year_dir).get(month)
+
+        if entry is None or entry['signature'] != source_signature(sources):
+            return None
+
+        try:
+            return {product: np.load(os.path.join(year_dir, '{0}.{1}.npy'.format(month, product)), mmap_mode='c')
+                    for product in entry['products']}
+        except (IOError, OSError, ValueError) as e:
+            logging.warning('MarketDataCache: Could not read cached data, rebuilding. ({0})'.format(e))
+            return None
+
+    def store(self, iso, node, year, month, sources, arrays):
+        """Writes the dictionary of product name to ndarray for the month to the cache."""
+        year_dir = self._year_dir(iso, node, year)
+        month = str(int(month)).zfill(2)
+
+        # Signature is computed before writing in case the source files change while they are being cached.
+        signature = source_signature(sources)
+
+        os.makedirs(year_dir, exist_ok=True)
+
+        for product, array in arrays.items():
+            np.save(os.path.join(year_dir, '{0}.{1}.npy'.format(month, product)), array, allow_pickle=False)
+
+        with self._lock:
+            manifest = self._read_manifest(year_dir)
+            manifest[month] = {'products': list(arrays.keys()), 'signature': signature}
+            self._write_manifest(year_dir, manifest)
+
+    def get(self, iso, node, year, month, sources, products, read_function):
+        """
+        Retrieves a month of market data from the cache, parsing it with read_function and caching the result if necessary.
+
+        :param iso: The name of the market area.
+        :param node: The node or settlement point the data is for.
+        :param year: The year of the data.
+        :param month: The month of the data.
+        :param sources: A list of paths to the source files or directories the data is parsed from; see source_signature().
+        :param products: A list of names for the arrays returned by read_function, in order.
+        :param read_function: A function with no arguments that parses the source files and returns a tuple of array-likes.
+        :return: A tuple of ndarrays in the order of products.
+        """
+        try:
+            arrays = self.load(iso, node, year, month, sources)
+        except (IOError, OSError) as e:
+            logging.warning('MarketDataCache: Could not check cached data. ({0})'.format(e))
+            arrays = None
+
+        if arrays is not None:
+            return tuple(arrays[product] for product in products)
+
+        values = read_function()
+
+        try:
+            arrays = {product: np.asarray(value, dtype=float) for product, value in zip(products, values)}
+        except (TypeError, ValueError):
+            # Not numeric data; return it as parsed without caching.
+            return tuple(values)
+
+        try:
+            self.store(iso, node, year, month, sources, arrays)
+        except (IOError, OSError) as e:
+            logging.warning('MarketDataCache: Could not write cached data. ({0})'.format(e))
+
+        return tuple(arrays[product] for product in products)
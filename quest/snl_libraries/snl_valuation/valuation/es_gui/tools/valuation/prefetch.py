@@ -0,0 +1,67 @@
+from __future__ import absolute_import
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Prefetcher(object):
+    """
+    Loads a sequence of items ahead of when they are needed on a pool of background threads, so reading and parsing files overlaps with the work done on each item in the calling thread.
+
+    Items are requested in order with get(). Requesting an item starts loading the next depth items, so at most depth loaded items are held ahead of the one in use, bounding the memory taken by prefetching. Exceptions raised while loading an item are raised by get() for that item, as if it were loaded when requested.
+
+    :param load: A function loading and returning an item given its arguments.
+    :param args: A list of the tuple of arguments to load for each item, in the order the items are needed.
+    :param depth: The number of items to load ahead of the one in use; if 0, each item is loaded in the calling thread when it is requested.
+    :param max_workers: The number of background threads.
+    """
+    def __init__(self, load, args, depth=2, max_workers=2):
+        self._load = load
+        self._args = list(args)
+        self._depth = depth
+        self._futures = {}
+        self._next = 0
+        self._closed = False
+
+        if depth > 0 and len(self._args) > 1:
+            self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        else:
+            self._executor = None
+
+    def get(self, ix):
+        """Returns item ix, waiting for it to be loaded if it is being prefetched, and starts loading the items that follow it."""
+        future = self._futures.pop(ix, None)
+        self._submit(ix + 1, ix + 1 + self._depth)
+
+        if future is not None and not future.cancelled():
+            return future.result()
+
+        return self._load(*self._args[ix])
+
+    def _submit(self, start, stop):
+        """Starts loading the items from start up to stop that have not been started yet."""
+        if self._executor is None or self._closed:
+            return
+
+        self._next = max(self._next, start)
+
+        while self._next < min(stop, len(self._args)):
+            self._futures[self._next] = self._executor.submit(self._load, *self._args[self._next])
+            self._next += 1
+
+    def close(self):
+        """Cancels the loading of items that has not started and releases the background threads without waiting for loads in progress."""
+        self._closed = True
+
+        for future in self._futures.values():
+            future.cancel()
+
+        self._futures.clear()
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,187 @@
+from __future__ import division, absolute_import
+
+import logging
+import time
+
+import numpy as np
+
+# Time series inputs of a ValuationOptimizer that are sliced into windows: the name of the model attribute mapped to the name of the ValuationOptimizer property it is set from.
+TIME_SERIES_DATA = {
+    'price_electricity': 'price_electricity',
+    'price_regulation': 'price_regulation',
+    'price_reg_up': 'price_reg_up',
+    'price_reg_down': 'price_reg_down',
+    'price_reg_service': 'price_reg_service',
+    'price_reg_serv_up': 'price_reg_serv_up',
+    'price_reg_serv_down': 'price_reg_serv_down',
+    'cost_charge': 'cost_charge',
+    'cost_discharge': 'cost_discharge',
+    'mi_mult': 'mileage_mult',
+    'mi_mult_ru': 'mileage_mult_ru',
+    'mi_mult_rd': 'mileage_mult_rd',
+    'fraction_reg_up': 'fraction_reg_up',
+    'fraction_reg_down': 'fraction_reg_down',
+    'perf_score': 'perf_score',
+    'perf_score_ru': 'perf_score_ru',
+    'perf_score_rd': 'perf_score_rd',
+}
+
+
+def get_windows(n_steps, window, overlap=0):
+    """
+    Divides a horizon into consecutive windows for receding horizon optimization.
+
+    :param n_steps: The number of time steps in the horizon.
+    :param window: The number of time steps committed from each window.
+    :param overlap: The number of additional time steps each window looks ahead; the decisions for them are discarded and remade by the next window.
+    :return: A list of (start, commit_stop, stop) tuples; each window is optimized over [start, stop) and its decisions over [start, commit_stop) are kept.
+    """
+    if window < 1 or overlap < 0:
+        raise ValueError('The window must be at least one time step and the overlap cannot be negative.')
+
+    windows = []
+
+    for start in range(0, n_steps, window):
+        commit_stop = min(start + window, n_steps)
+        windows.append((start, commit_stop, min(commit_stop + overlap, n_steps)))
+
+    return windows
+
+
+def slice_value(value, start, stop):
+    """Returns value[start:stop] if value is array-like, or value if it is a scalar or None."""
+    if value is None or np.ndim(value) == 0:
+        return value
+
+    return np.asarray(value)[start:stop]
+
+
+def consecutive_runs(months):
+    """
+    Divides a list of months into runs of consecutive months, each of which can be joined into one horizon.
+
+    :param months: A list of (month, year) tuples.
+    :return: A list of lists of the positions in months of each run, in order; a run ends where the next month in the list is not the month following it.
+    """
+    runs = []
+    previous = None
+
+    for ix, (month, year) in enumerate(months):
+        index = int(year)*12 + int(month) - 1
+
+        if previous is None or index != previous + 1:
+            runs.append([])
+
+        runs[-1].append(ix)
+        previous = index
+
+    return runs
+
+
+def join_horizon(ops, months=None):
+    """
+    Joins the time series data of consecutive ValuationOptimizers, e.g., one for each month, into a single ValuationOptimizer over the combined horizon. Scalar inputs are repeated for each time step of their ValuationOptimizer.
+
+    :param ops: A list of ValuationOptimizers with their time series data set, in chronological order.
+    :param months: A list of the (month, year) tuple of each of ops to check that they are consecutive months, or None.
+    :return: A new ValuationOptimizer of the same market type and solver.
+    """
+    if months is not None and len(consecutive_runs(months)) > 1:
+        raise(ValueError('The months of a horizon must be consecutive: {0}'.format(', '.join('{0} {1}'.format(*m) for m in months))))
+
+    op = type(ops[0])(market_type=ops[0].market_type, solver=ops[0].solver)
+    lengths = [len(month_op.price_electricity) for month_op in ops]
+
+    for prop in TIME_SERIES_DATA.values():
+        values = [getattr(month_op, prop) for month_op in ops]
+
+        if all(value is None for value in values):
+            continue
+        elif any(value is None for value in values):
+            raise(ValueError('{0} is not set for every part of the horizon.'.format(prop)))
+
+        setattr(op, prop, np.concatenate([np.broadcast_to(np.asarray(value, dtype=float), (n,)) if np.ndim(value) == 0
+                                          else np.asarray(value, dtype=float)[:n] for value, n in zip(values, lengths)]))
+
+    return op
+
+
+def split_horizon(op, lengths):
+    """
+    Splits a solved ValuationOptimizer into consecutive ValuationOptimizers over parts of its horizon, e.g., one for each month. Each has the time series data and results for its part; cumulative revenues restart from zero at the start of each part.
+
+    :param op: A solved ValuationOptimizer.
+    :param lengths: A list of the number of time steps of each part, in chronological order.
+    :return: A list of solved ValuationOptimizers.
+    """
+    results = op.results
+    revenue_columns = ['rev_arb', 'rev_reg', 'revenue']
+    revenue_steps = results[revenue_columns].diff()
+    revenue_steps.iloc[0] = results[revenue_columns].iloc[0]
+
+    ops = []
+    start = 0
+
+    for n in lengths:
+        part_op = type(op)(market_type=op.market_type, solver=op.solver)
+
+        for prop in TIME_SERIES_DATA.values():
+            setattr(part_op, prop, slice_value(getattr(op, prop), start, start + n))
+
+        part_results = results.iloc[start:start + n].reset_index(drop=True)
+        part_results['time'] = np.arange(n)
+        part_results[revenue_columns] = revenue_steps.iloc[start:start + n].cumsum().values
+
+        part_op.results = part_results
+
+        try:
+            part_op.gross_revenue = part_results['revenue'].values[-1]
+        except IndexError:
+            part_op.gross_revenue = 0
+
+        ops.append(part_op)
+        start += n
+
+    return ops
+
+
+def accuracy_report(op):
+    """
+    Compares the results of a ValuationOptimizer solved in rolling horizon mode with the solution of the model over its entire horizon at once.
+
+    :param op: A ValuationOptimizer solved in rolling horizon mode.
+    :return: A dictionary describing the difference in revenue and state of charge between the two solutions, and the time taken by each.
+    """
+    monolithic_op = type(op)(market_type=op.market_type, solver=op.solver)
+
+    for prop in TIME_SERIES_DATA.values():
+        setattr(monolithic_op, prop, getattr(op, prop))
+
+    monolithic_op.set_model_parameters(**op.model_parameters)
+
+    t0 = time.perf_counter()
+    monolithic_op.run()
+    monolithic_time = time.perf_counter() - t0
+
+    rolling_revenue = float(op.gross_revenue)
+    monolithic_revenue = float(monolithic_op.gross_revenue)
+    soc_difference = np.abs(op.results['state of charge'].values - monolithic_op.results['state of charge'].values)
+
+    report = {
+        'window': op.rolling_horizon[0],
+        'overlap': op.rolling_horizon[1],
+        'n_windows': len(op.rolling_horizon_windows),
+        'n_steps': len(op.results),
+        'rolling_horizon_revenue': rolling_revenue,
+        'monolithic_revenue': monolithic_revenue,
+        'revenue_gap': monolithic_revenue - rolling_revenue,
+        'relative_revenue_gap': (monolithic_revenue - rolling_revenue)/abs(monolithic_revenue) if monolithic_revenue else 0.0,
+        'max_soc_difference': float(soc_difference.max()) if len(soc_difference) else 0.0,
+        'rolling_horizon_time': sum(window_time for _, _, _, window_time in op.rolling_horizon_windows),
+        'monolithic_time': monolithic_time,
+    }
+
+    logging.info('Rolling horizon: Revenue of ${0:,.2f} vs. ${1:,.2f} solving the full horizon ({2:.4%} gap).'.format(
+        rolling_revenue, monolithic_revenue, report['relative_revenue_gap']))
+
+    return report
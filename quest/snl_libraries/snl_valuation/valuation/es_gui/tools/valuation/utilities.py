@@ -4,7 +4,10 @@ import pandas as pd
 import numpy as np
 import os
 import calendar
+import datetime
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 from xlrd.biffh import XLRDError
 from valuation.paths import get_path
@@ -102,6 +105,66 @@ def read_ercot_da_ccp(fname, month):
     return regdn, regup
 
 
+def index_ercot_da_spp(fname):
+    """
+    Reads every monthly worksheet of the day-ahead market historical settlement point prices workbook at fname once and indexes the hourly prices by month and settlement point.
+
+    :param fname: string giving location of DAM SPPs file
+    :type fname: str
+    :return: A dictionary of month index [1, 12] to a dictionary of settlement point name to NumPy ndarray of SPPs; months without a worksheet are omitted.
+    :rtype: dict
+    """
+    spp_index = {}
+    month_abbrs = list(calendar.month_abbr)
+
+    wkbk = pd.read_excel(fname, sheet_name=None)
+
+    for sheet_name, df in wkbk.items():
+        try:
+            month_ix = month_abbrs.index(sheet_name[:3])
+        except ValueError:
+            continue
+
+        if month_ix == 0 or month_ix in spp_index:
+            # Use the first worksheet for each month, as read_ercot_da_spp() does.
+            continue
+
+        prices = df['Settlement Point Price'].astype('float')
+        spp_index[month_ix] = {}
+
+        for settlement_point, series in prices.groupby(df['Settlement Point'], sort=False):
+            spp_da = series.values
+            spp_index[month_ix][settlement_point] = spp_da[~np.isnan(spp_da)]
+
+    return spp_index
+
+
+def index_ercot_da_ccp(fname):
+    """
+    Reads the day-ahead market historical capacity clearing prices file at fname once and indexes the hourly regdn and regup prices by month.
+
+    :param fname: string giving location of DAM CCPs file
+    :type fname: str
+    :return: A dictionary of month index [1, 12] to a tuple of NumPy ndarrays with regdn and regup CCPs; months without data are omitted.
+    :rtype: dict
+    """
+    ccp_index = {}
+
+    df = pd.read_csv(fname, low_memory=False)
+    series_month = pd.to_datetime(df['Delivery Date']).dt.month
+
+    # why is there an extra space in the key
+    regup_key = 'REGUP ' if 'REGUP ' in df.columns else 'REGUP'
+
+    for month_ix, df1 in df.groupby(series_month):
+        regdn = df1['REGDN'].astype('float').values
+        regup = df1[regup_key].astype('float').values
+
+        ccp_index[int(month_ix)] = (regdn[~np.isnan(regdn)], regup[~np.isnan(regup)])
+
+    return ccp_index
+
+
 def read_nodeid(fname,iso):
     from xlrd import open_workbook
     wb = open_workbook(filename = fname)
@@ -562,6 +625,99 @@ def read_miso_data(fpath, year, month, nodeid):
 
 
 
+def read_miso_data_bulk(fpath, year, month, nodeids):
+    """Reads the daily MISO data files once for all of the pricing nodes nodeids and returns the LMP for each node and the MCP, as read_miso_data() does for a single node.
+
+    :param fpath: root of the MISO data folder
+    :type fpath: str
+    :param year: year of data
+    :type year: int or str
+    :param month: month of data
+    :type month: int or str
+    :param nodeids: pricing node IDs
+    :type nodeids: list of str
+    :return: a dictionary of pricing node ID to its array of LMP, and the array of MCP
+    :rtype: dict, NumPy ndarray
+    """
+    nodeids = list(nodeids)
+    node_index = pd.Index(nodeids)
+
+    _, n_days_month = calendar.monthrange(int(year), int(month))
+
+    # Hourly LMP of each node, preallocated for the month; NaN where there is no data.
+    LMP = np.full((len(nodeids), n_days_month*24), np.nan)
+    RegMCP = []
+    missing_nodes = set()
+    n_days_read = 0
+
+    for day in range(1, n_days_month+1):
+        # Read daily files.
+        date_str = '{year}{month}{day}'.format(year=year, month=str(month).zfill(2), day=str(day).zfill(2))
+
+        if (int(year) <= 2014) or (int(year) == 2015 and int(month) <= 2):
+            lmp_fname = os.path.join(fpath, 'LMP', str(year), str(month).zfill(2), '{prefix}_da_lmp.csv'.format(prefix=date_str))
+            mcp_fname = os.path.join(fpath, 'MCP', str(year), str(month).zfill(2), '{prefix}_asm_damcp.csv'.format(prefix=date_str))
+        else: 
+            lmp_fname = os.path.join(fpath, 'LMP', str(year), str(month).zfill(2), '{prefix}_da_exante_lmp.csv'.format(prefix=date_str))
+            mcp_fname = os.path.join(fpath, 'MCP', str(year), str(month).zfill(2), '{prefix}_asm_exante_damcp.csv'.format(prefix=date_str))
+
+        hours = slice((day - 1)*24, day*24)
+
+        # LMP file.
+        try:
+            df = pd.read_csv(lmp_fname, skiprows=4, usecols=[0, 2] + list(range(3, 27)), low_memory=False)
+        except FileNotFoundError:
+            logging.warning('read_miso_data: LMP file missing, returning empty array.')
+            break
+
+        n_days_read = day
+
+        # Filter LMP rows of the requested nodes, using the first row for each node.
+        col1 = df.axes[1][0]
+        col3 = df.axes[1][1]
+        df1 = df.loc[(df[col3] == "LMP") & df[col1].isin(node_index)].drop_duplicates(subset=col1)
+
+        node_ix = node_index.get_indexer(df1[col1])
+        LMP[node_ix, hours] = df1[df1.axes[1][2:26]].astype('float').values
+
+        day_missing_nodes = set(nodeids) - set(df1[col1])
+
+        if day_missing_nodes - missing_nodes:
+            logging.warning('read_miso_data: A daily LMP file is missing required data, returning empty array.')
+            missing_nodes.update(day_missing_nodes)
+
+        # MCP file.
+        try:
+            df = pd.read_csv(mcp_fname, skiprows=4, nrows=7, low_memory=False)
+        except FileNotFoundError:
+            RegMCP = []
+            logging.warning('read_miso_data: MCP file missing, returning empty array.')
+            break
+
+        # Find SERREGMCP values.
+        col3 = df.axes[1][2]
+        df1 = df.loc[df[col3] == "SERREGMCP"]
+        df2 = df1[df1.axes[1][3:27]]
+
+        RegMCP.append(np.ravel(df2.astype('float').values))
+
+    # Remove NaNs, including hours of days not read.
+    lmp_data = {}
+
+    for ix, nodeid in enumerate(nodeids):
+        if nodeid in missing_nodes:
+            lmp_data[nodeid] = np.array([])
+        else:
+            LMP_node = LMP[ix, :n_days_read*24]
+            lmp_data[nodeid] = LMP_node[~np.isnan(LMP_node)]
+
+    RegMCP = np.concatenate(RegMCP) if RegMCP else np.array([])
+    RegMCP = RegMCP[~np.isnan(RegMCP)]
+
+    return lmp_data, RegMCP
+
+
+
 
 #######################################################################################################################
 # NYISO
@@ -728,6 +884,182 @@ def read_nyiso_data(fpath, year, month, nodeid, typedat="both", RT_DAM="both"):
     return daLBMP, rtLBMP, daCAP, rtCAP, rtMOV
 
 
+NYISO_NODES_FNAME = os.path.join(dirname, 'es_gui', 'apps', 'data_manager', '_static', 'nodes_nyiso.csv')
+
+# Dates from which the NYISO ASP files use the zonal NYCA and the East regulation price columns, respectively.
+NYISO_NYCA_REGULATION_START = datetime.date(2016, 6, 23)
+NYISO_EAST_REGULATION_START = datetime.date(2001, 10, 1)
+
+NYISO_LBMP_COLUMN = 'LBMP ($/MWHr)'
+
+
+@lru_cache(maxsize=None)
+def read_nyiso_nodes(fname=NYISO_NODES_FNAME):
+    """
+    Reads the NYISO node table at fname once per process.
+
+    :param fname: The path to the NYISO nodes .csv file
+    :type fname: str
+    :return: A dictionary of node ID to a tuple of its zone ID and 'zone' if the node is a zone or 'gen' otherwise.
+    :rtype: dict
+    """
+    df_nodeszones = pd.read_csv(fname, index_col=False, usecols=['Node ID', 'Zone ID'], dtype={'Node ID': 'int64', 'Zone ID': 'float64'})
+
+    nodes = {}
+
+    for node_id, zone_id in zip(df_nodeszones['Node ID'], df_nodeszones['Zone ID']):
+        # Use the first entry for each node, as read_nyiso_data() does.
+        if node_id not in nodes:
+            nodes[int(node_id)] = (zone_id, 'zone' if node_id == zone_id else 'gen')
+
+    return nodes
+
+
+def _read_nyiso_day_file(fname, columns, ptid=None):
+    """Reads the columns of the daily NYISO file at fname, filtered by the PTID column if ptid is given. Returns a list of ndarrays in the order of columns, or None if the file is missing."""
+    usecols = list(columns) if ptid is None else ['PTID'] + list(columns)
+
+    try:
+        df = pd.read_csv(fname, index_col=False, usecols=usecols, dtype={column: 'float64' for column in columns})
+    except FileNotFoundError:
+        return None
+
+    if ptid is not None:
+        df = df.loc[df['PTID'] == ptid]
+
+    return [df[column].values for column in columns]
+
+
+def read_nyiso_data_bulk(fpath, year, months, nodeid, typedat="both", RT_DAM="both", max_workers=None):
+    """
+    Reads the historical LBMP, regulation capacity, and regulation movement prices for each of the months 'months' of the year 'year' for the node 'nodeid', as read_nyiso_data() does, reading the daily files of all the months concurrently.
+
+    :param fpath: The path to the root of the NYISO data directory
+    :type fpath: str
+    :param year: Year of data to read
+    :type year: int or str
+    :param months: Months of data to read; all twelve if None
+    :type months: list of int or str
+    :param nodeid: ID of the node to read
+    :type nodeid: int or str
+    :param max_workers: The number of threads reading files; if None, the ThreadPoolExecutor default
+    :type max_workers: int
+    :return: A dictionary of month (int) to a tuple of daLBMP, rtLBMP, daCAP, rtCAP, rtMOV: Hourly LBMP and regulation capacity/movement clearing price values.
+    :rtype: dict
+    """
+    year = int(year)
+    nodeid = int(nodeid)
+
+    if months is None:
+        months = range(1, 13)
+
+    months = [int(month) for month in months]
+
+    empty = (np.empty([0]),)*5
+
+    try:
+        zoneid, zone_gen = read_nyiso_nodes()[nodeid]
+    except KeyError:
+        logging.warning('read_nyiso_data_bulk: Node {0} does not exist in NYISO, returning empty arrays.'.format(nodeid))
+        return {month: empty for month in months}
+
+    # Files read for each day, in the order read_nyiso_data() reads them: (data type, market, indices of the returned arrays, missing file warning).
+    file_types = []
+
+    if typedat == "asp" or typedat == "both":
+        if RT_DAM == "RT" or RT_DAM == "both":
+            file_types.append(('ASP', 'RT', (3, 4), 'RT ASP'))
+        if RT_DAM == "DAM" or RT_DAM == "both":
+            file_types.append(('ASP', 'DAM', (2,), 'DA ASP'))
+
+    if typedat == "lbmp" or typedat == "both":
+        if RT_DAM == "RT" or RT_DAM == "both":
+            file_types.append(('LBMP', 'RT', (1,), 'RT LMP'))
+        if RT_DAM == "DAM" or RT_DAM == "both":
+            file_types.append(('LBMP', 'DAM', (0,), 'DA LMP'))
+
+    def _file_args(date, data_type, market):
+        date_str = date.strftime('%Y%m%d')
+        month_dir = os.path.join(str(date.year), str(date.month).zfill(2))
+
+        if data_type == 'LBMP':
+            if market == 'DAM':
+                fname = os.path.join(fpath, 'LBMP', 'DAM', zone_gen, month_dir, date_str + "damlbmp_" + zone_gen + ".csv")
+            else:
+                fname = os.path.join(fpath, 'LBMP', 'RT', zone_gen, month_dir, date_str + "realtime_" + zone_gen + ".csv")
+
+            return fname, [NYISO_LBMP_COLUMN], nodeid
+
+        if market == 'DAM':
+            fname = os.path.join(fpath, 'ASP', 'DAM', month_dir, date_str + "damasp.csv")
+        else:
+            fname = os.path.join(fpath, 'ASP', 'RT', month_dir, date_str + "rtasp.csv")
+
+        if date >= NYISO_NYCA_REGULATION_START:
+            columns = ['NYCA Regulation Capacity ($/MWHr)'] + (['NYCA Regulation Movement ($/MW)'] if market == 'RT' else [])
+            return fname, columns, zoneid
+        elif date >= NYISO_EAST_REGULATION_START:
+            columns = ['East Regulation ($/MWHr)'] + ([' NYCA Regulation Movement ($/MW)'] if market == 'RT' else [])
+            return fname, columns, None
+        elif market == 'DAM':
+            return fname, ['Regulation ($/MWHr)'], None
+        else:
+            # RT ancillary services for NYISO start on July 2004
+            return fname, [], None
+
+    dates = {month: [datetime.date(year, month, day) for day in range(1, calendar.monthrange(year, month)[1] + 1)]
+             for month in months}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {(date, data_type, market): executor.submit(_read_nyiso_day_file, *_file_args(date, data_type, market))
+                   for month in months for date in dates[month] for data_type, market, _, _ in file_types}
+
+    results = {}
+
+    for month in months:
+        parts = [[] for _ in range(5)]
+        emptied = set()
+
+        for date in dates[month]:
+            missing = False
+
+            for data_type, market, indices, description in file_types:
+                arrays = futures[(date, data_type, market)].result()
+
+                if arrays is None:
+                    emptied.update(indices)
+                    logging.warning('read_nyiso_data: {0} file missing, returning empty array.'.format(description))
+                    missing = True
+                    break
+
+                if data_type == 'LBMP' and not arrays[0].size:
+                    results[month] = empty
+                    break
+
+                for ix, array in zip(indices, arrays):
+                    parts[ix].append(array)
+
+            if missing or month in results:
+                break
+
+        if month not in results:
+            data = []
+
+            for ix, arrays in enumerate(parts):
+                if ix in emptied or not arrays:
+                    data.append(np.empty([0]))
+                    continue
+
+                # Copy each day into an array preallocated for the month.
+                out = np.empty(sum(len(array) for array in arrays))
+                np.concatenate(arrays, out=out)
+                data.append(out)
+
+            results[month] = tuple(data)
+
+    return results
+
+
 #TODO: delete function below:
 def read_nyiso_data_old(fpath, year, month, nodeid, typedat="both", RT_DAM="both"):
     """"
@@ -5,7 +5,8 @@ import json
 
 import pandas as pd
 
-from valuation.es_gui.tools.dms import DataManagementSystem
+from valuation.es_gui.tools.dms import DataManagementSystem, loader
+from valuation.es_gui.tools.valuation.market_cache import MarketDataCache
 from valuation.es_gui.tools.valuation.utilities import *
 
 
@@ -14,18 +15,28 @@ class ValuationDMS(DataManagementSystem):
     A class for managing data for the energy storage valuation optimization functions. Class methods for each type of file to be loaded are included, extending from the get_data() method of the superclass. Each of these methods uses get_data() to retrieve the relevant data and loads the file and adds it to the DMS if the data is not loaded. An optional class method for calling each of the individual data methods can be included to, e.g., form the necessary arguments and return the desired variables.
 
     :param home_path: A string indicating the relative path to where data is saved.
+    :param cache_path: A string indicating the path to the on-disk cache of parsed market data; defaults to '.cache' in home_path. If False, the on-disk cache is not used.
     """
-    def __init__(self, home_path, **kwargs):
+    def __init__(self, home_path, cache_path=None, **kwargs):
         DataManagementSystem.__init__(self, **kwargs)
 
         self.home_path = home_path
 
+        if cache_path is False:
+            self.market_cache = None
+        else:
+            self.market_cache = MarketDataCache(cache_path or os.path.join(home_path, '.cache'))
+
         # with open(os.path.abspath(os.path.join(self.home_path, '..', 'es_gui', 'apps', 'valuation', 'definitions', 'nodes.json')), 'r') as fp:
         #     self.NODES = json.load(fp)
 
         #self.node_names = pd.read_excel(self.home_path+'nodeid.xlsx', sheetname=None)
         self.delimiter = ' @ '  # delimiter used to split information in id_key
 
+        # Parsed ERCOT files and data directory listings, keyed by path and validated by modification time and size.
+        self._ercot_indices = {}
+        self._dir_files = {}
+
     def get_node_name(self, node_id, ISO):
         """
         Retrieves the node name corresponding to the given node_id using the lookup table loaded during initialization.
@@ -43,6 +54,76 @@ class ValuationDMS(DataManagementSystem):
         # else:
         #     return node_name
 
+    def _read_market_data(self, iso, node, year, month, sources, products, read_function, *args):
+        """Reads the products for the month from the on-disk market data cache, or with read_function(*args) if they are not cached or the source files have changed."""
+        if self.market_cache is None:
+            return read_function(*args)
+
+        return self.market_cache.get(iso, node, year, month, sources, products, lambda: read_function(*args))
+
+    def _find_data_file(self, dir_path, extension):
+        """Returns the path to the last file with the given extension in dir_path, listing the directory again only if it has been modified."""
+        mtime = os.stat(dir_path).st_mtime_ns
+
+        try:
+            cached_mtime, fname = self._dir_files[(dir_path, extension)]
+        except KeyError:
+            cached_mtime = None
+
+        if cached_mtime != mtime:
+            fname = None
+
+            for filename in os.listdir(dir_path):
+                if filename.lower().endswith(extension):
+                    fname = os.path.join(dir_path, filename)
+
+            if fname is None:
+                raise(FileNotFoundError('No {0} file found in {1}.'.format(extension, dir_path)))
+
+            self._dir_files[(dir_path, extension)] = (mtime, fname)
+
+        return fname
+
+    def _get_ercot_index(self, fname, index_function):
+        """Returns the index of the ERCOT file at fname built by index_function, parsing the file only if it has not been parsed or has been modified since."""
+        stat = os.stat(fname)
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        try:
+            cached_signature, index = self._ercot_indices[fname]
+        except KeyError:
+            cached_signature = None
+
+        if cached_signature != signature:
+            logging.info('DMS: Indexing {0}'.format(fname))
+            index = index_function(fname)
+            self._ercot_indices[fname] = (signature, index)
+
+        return index
+
+    def _read_ercot_da_spp(self, fname, month, settlement_point):
+        """Returns the SPPs for the month and settlement point from the index of the ERCOT DAM SPPs file at fname."""
+        spp_index = self._get_ercot_index(fname, index_ercot_da_spp)
+
+        try:
+            month_index = spp_index[int(month)]
+        except KeyError:
+            logging.warning('read_ercot_da_spp: Could not load data (the specified month of data could not be found in the given file), returning empty array. (got {fname}, {month}, {settlement_point})'.format(fname=fname, month=month, settlement_point=settlement_point))
+            return np.array([])
+
+        return month_index.get(settlement_point, np.array([]))
+
+    def _read_ercot_da_ccp(self, fname, month):
+        """Returns the regdn and regup CCPs for the month from the index of the ERCOT DAM CCPs file at fname."""
+        ccp_index = self._get_ercot_index(fname, index_ercot_da_ccp)
+
+        try:
+            return ccp_index[int(month)]
+        except KeyError:
+            logging.warning('read_ercot_da_ccp: No data matching input parameters found, returning empty array. (got {fname}, {month})'.format(fname=fname, month=month))
+            return np.array([]), np.array([])
+
+    @loader
     def get_ercot_spp_data(self, id_key):
         """Retrieves DAM-SPP data for ERCOT."""
         logging.info('DMS: Loading ERCOT DA-SPP')
@@ -53,11 +134,14 @@ class ValuationDMS(DataManagementSystem):
             # load the data and add it to the DMS
 
             # deconstruct id_key to obtain args for read function
-            spp_da = read_ercot_da_spp(*id_key.split(self.delimiter))
+            fname, month, settlement_point = id_key.split(self.delimiter)
+            spp_da, = self._read_market_data('ERCOT', settlement_point, os.path.basename(os.path.dirname(fname)), month, [fname], ['SPP'],
+                                             lambda *args: (self._read_ercot_da_spp(*args),), fname, month, settlement_point)
             self.add_data(spp_da, id_key)
         finally:
             return spp_da
 
+    @loader
     def get_ercot_ccp_data(self, id_key):
         """Retrieves DAM-CCP data for ERCOT."""
         logging.info('DMS: Loading ERCOT DA-CCP')
@@ -69,13 +153,16 @@ class ValuationDMS(DataManagementSystem):
             # load the data and add it to the DMS
 
             # deconstruct id_key to obtain args for read function
-            REGDN, REGUP = read_ercot_da_ccp(*id_key.split(self.delimiter)[:2])
+            fname, month = id_key.split(self.delimiter)[:2]
+            REGDN, REGUP = self._read_market_data('ERCOT', 'CCP', os.path.basename(os.path.dirname(fname)), month, [fname], ['REGDN', 'REGUP'],
+                                                  self._read_ercot_da_ccp, fname, month)
 
             self.add_data(REGUP, id_key + self.delimiter + 'REGUP')
             self.add_data(REGDN, id_key + self.delimiter + 'REGDN')
         finally:
             return REGDN, REGUP
 
+    @loader
     def get_ercot_data(self, year, month, settlement_point):
         # construct file name paths
         path = os.path.join(self.home_path, 'ERCOT')  # path to data_bank root
@@ -83,27 +170,8 @@ class ValuationDMS(DataManagementSystem):
         if isinstance(month, int):
             month = str(month)
 
-        spp_fpath = os.path.join(path, 'SPP', str(year))
-        
-        try:
-            for filename in os.listdir(spp_fpath):
-                if filename.lower().endswith('.xlsx'):
-                    fname = filename
-        except ValueError as e:
-            raise(e)
-
-        spp_fname = os.path.join(spp_fpath, fname)
-
-        ccp_fpath = os.path.join(path, 'CCP', str(year))
-
-        try:
-            for filename in os.listdir(ccp_fpath):
-                if filename.lower().endswith('.csv'):
-                    fname = filename
-        except ValueError as e:
-            raise(e)
-
-        ccp_fname = os.path.join(ccp_fpath, fname)
+        spp_fname = self._find_data_file(os.path.join(path, 'SPP', str(year)), '.xlsx')
+        ccp_fname = self._find_data_file(os.path.join(path, 'CCP', str(year)), '.csv')
 
         # construct identifier keys
         spp_id = self.delimiter.join([spp_fname, month, settlement_point])
@@ -115,6 +183,7 @@ class ValuationDMS(DataManagementSystem):
 
         return spp_da, rd, ru
 
+    @loader
     def get_pjm_lmp_data(self, *args):
         """Deprecated since 1.0"""
         logging.info('DMS: Loading PJM DA-LMP')
@@ -128,6 +197,7 @@ class ValuationDMS(DataManagementSystem):
         finally:
             return lmp_da
 
+    @loader
     def get_pjm_reg_price_data(self, *args):
         """Deprecated since 1.0"""
         logging.info('DMS: Loading PJM regulation prices')
@@ -142,6 +212,7 @@ class ValuationDMS(DataManagementSystem):
         finally:
             return RegCCP, RegPCP
 
+    @loader
     def get_pjm_mileage_data(self, *args):
         """Deprecated since 1.0"""
         logging.info('DMS: Loading PJM mileage data')
@@ -157,6 +228,7 @@ class ValuationDMS(DataManagementSystem):
         finally:
             return MR, RA, RD
 
+    @loader
     def get_pjm_reg_signal_data(self, *args):
         """Deprecated since 1.0"""
         logging.info('DMS: Loading PJM regulation signal')
@@ -171,6 +243,7 @@ class ValuationDMS(DataManagementSystem):
         finally:
             return RUP, RDW
 
+    @loader
     def get_pjm_data(self, year, month, nodeid):
         path = os.path.join(self.home_path, 'PJM')
         
@@ -195,7 +268,10 @@ class ValuationDMS(DataManagementSystem):
             RegPCP = self.get_data(rpcp_key)
         except KeyError:
             # load the data and add it to the DMS
-            lmp_da, MR, RA, RD, RegCCP, RegPCP = read_pjm_data(path, year, month, nodeid)
+            sources = [os.path.join(path, 'LMP', nodeid, year), os.path.join(path, 'REG', year), os.path.join(path, 'MILEAGE', year)]
+            lmp_da, MR, RA, RD, RegCCP, RegPCP = self._read_market_data('PJM', nodeid, year, month, sources,
+                                                                        ['LMP', 'MR', 'RA', 'RD', 'RegCCP', 'RegPCP'],
+                                                                        read_pjm_data, path, year, month, nodeid)
 
             self.add_data(lmp_da, lmp_key)
             self.add_data(MR, mr_key)
@@ -206,6 +282,7 @@ class ValuationDMS(DataManagementSystem):
 
         return lmp_da, MR, RA, RD, RegCCP, RegPCP
     
+    @loader
     def get_miso_lmp_data(self, *args):
         """Deprecated since 1.0"""
         logging.info('DMS: Loading MISO DA-LMP')
@@ -219,6 +296,7 @@ class ValuationDMS(DataManagementSystem):
         finally:
             return lmp_da
 
+    @loader
     def get_miso_reg_data(self, *args):
         """Deprecated since 1.0"""
         logging.info('DMS: Loading MISO RegMCP')
@@ -232,30 +310,56 @@ class ValuationDMS(DataManagementSystem):
         finally:
             return RegMCP
 
+    @loader
     def get_miso_data(self, year, month, nodeid):
+        return self.load_miso_data(year, month, [nodeid])[nodeid]
+
+    @loader
+    def load_miso_data(self, year, month, nodeids):
+        """Retrieves the DA LMP and regulation MCP for MISO for each of the pricing nodes nodeids, parsing each daily file once for all of the nodes that are not loaded or cached. Returns a dictionary of node ID to a tuple of ndarrays."""
         path = os.path.join(self.home_path, 'MISO')
 
         year = str(year)
         month = str(month)
 
-        lmp_key = self.delimiter.join([path, year, month, nodeid, 'LMP'])
         regmcp_key = self.delimiter.join([path, year, month, 'MCP'])
 
-        try:
-            # attempt to access data if it is already loaded
-            lmp_da = self.get_data(lmp_key)
-            RegMCP = self.get_data(regmcp_key)
-        except KeyError:
+        data = {}
+        pending = []
+
+        for nodeid in nodeids:
+            try:
+                # attempt to access data if it is already loaded
+                data[nodeid] = (self.get_data(self.delimiter.join([path, year, month, nodeid, 'LMP'])), self.get_data(regmcp_key))
+            except KeyError:
+                pending.append(nodeid)
+
+        bulk_data = {}
+
+        def _read_miso_data(nodeid):
+            if not bulk_data:
+                # Read all nodes not found in the DMS the first time any of them is not found in the cache.
+                lmp_data, RegMCP = read_miso_data_bulk(path, year, month, pending)
+                bulk_data.update({node: (lmp_da, RegMCP) for node, lmp_da in lmp_data.items()})
+
+            return bulk_data[nodeid]
+
+        for nodeid in pending:
             # load the data and add it to the DMS
-            lmp_da, RegMCP = read_miso_data(path, year, month, nodeid)
+            sources = [os.path.join(path, 'LMP', year, month.zfill(2)), os.path.join(path, 'MCP', year, month.zfill(2))]
+            lmp_da, RegMCP = self._read_market_data('MISO', nodeid, year, month, sources, ['LMP', 'MCP'],
+                                                    _read_miso_data, nodeid)
 
-            self.add_data(lmp_da, lmp_key)
+            self.add_data(lmp_da, self.delimiter.join([path, year, month, nodeid, 'LMP']))
             self.add_data(RegMCP, regmcp_key)
 
-        return lmp_da, RegMCP
+            data[nodeid] = (lmp_da, RegMCP)
+
+        return data
 
     ####################################################################################################################
 
+    @loader
     def get_isone_data(self, year, month, nodeid):
         path = os.path.join(self.home_path, 'ISONE')
 
@@ -275,7 +379,10 @@ class ValuationDMS(DataManagementSystem):
             mi_mult = self.get_data(mimult_key)
         except KeyError:
             # load the data and add it to the DMS
-            lmp_da, rccp, rpcp, mi_mult = read_isone_data(path, year, month, nodeid)
+            sources = [os.path.join(path, 'LMP', str(nodeid), year), os.path.join(path, 'RCP', year), os.path.join(path, 'MileageFile.xlsx')]
+            lmp_da, rccp, rpcp, mi_mult = self._read_market_data('ISONE', nodeid, year, month, sources,
+                                                                 ['LMP', 'RegCCP', 'RegPCP', 'MiMult'],
+                                                                 read_isone_data, path, year, month, nodeid)
 
             self.add_data(lmp_da, lmp_key)
             self.add_data(rccp, rccp_key)
@@ -286,30 +393,56 @@ class ValuationDMS(DataManagementSystem):
 
     ####################################################################################################################
 
+    @loader
     def get_nyiso_data(self, year, month, nodeid):
+        return self.load_nyiso_data(year, [month], nodeid)[str(month)]
+
+    @loader
+    def load_nyiso_data(self, year, months, nodeid):
+        """Retrieves the DAM LBMP and regulation capacity prices for NYISO for each of months, reading the daily files of all months that are not loaded or cached concurrently. Returns a dictionary of month (str) to a tuple of ndarrays."""
         path = os.path.join(self.home_path, 'NYISO')
 
         nodeid = str(nodeid)
         year = str(year)
-        month = str(month)
 
-        lbmp_key = self.delimiter.join([path, year, month, nodeid, 'LBMP'])
-        rcap_key = self.delimiter.join([path, year, month, 'RegCAP'])
+        data = {}
+        pending = []
 
-        try:
-            # attempt to access data if it is already loaded
-            lbmp_da = self.get_data(lbmp_key)
-            rcap_da = self.get_data(rcap_key)
-        except KeyError:
+        for month in months:
+            month = str(month)
+
+            try:
+                # attempt to access data if it is already loaded
+                data[month] = (self.get_data(self.delimiter.join([path, year, month, nodeid, 'LBMP'])),
+                               self.get_data(self.delimiter.join([path, year, month, 'RegCAP'])))
+            except KeyError:
+                pending.append(month)
+
+        bulk_data = {}
+
+        def _read_nyiso_dam_data(month):
+            if not bulk_data:
+                # Read all months not found in the DMS the first time any of them is not found in the cache.
+                bulk_data.update(read_nyiso_data_bulk(path, year, pending, nodeid, typedat="both", RT_DAM="DAM"))
+
+            lbmp_da, lbmp_rt, rcap_da, rcap_rt, rmov_da = bulk_data[int(month)]
+            return lbmp_da, rcap_da
+
+        for month in pending:
             # load the data and add it to the DMS
-            lbmp_da, lbmp_rt, rcap_da, rcap_rt, rmov_da = read_nyiso_data(path, year, month, nodeid, typedat="both", RT_DAM="DAM")
+            sources = [os.path.join(path, 'LBMP', 'DAM', '*', year, month.zfill(2)), os.path.join(path, 'ASP', 'DAM', year, month.zfill(2))]
+
+            lbmp_da, rcap_da = self._read_market_data('NYISO', nodeid, year, month, sources, ['LBMP', 'RegCAP'],
+                                                      _read_nyiso_dam_data, month)
 
-            self.add_data(lbmp_da, lbmp_key)
-            self.add_data(rcap_da, rcap_key)
+            self.add_data(lbmp_da, self.delimiter.join([path, year, month, nodeid, 'LBMP']))
+            self.add_data(rcap_da, self.delimiter.join([path, year, month, 'RegCAP']))
 
-        return lbmp_da, rcap_da
+            data[month] = (lbmp_da, rcap_da)
 
+        return data
 
+    @loader
     def get_spp_data(self, year, month, nodeid):
         path = os.path.join(self.home_path, 'SPP')
 
@@ -328,7 +461,9 @@ class ValuationDMS(DataManagementSystem):
         except KeyError:
             # load the data and add it to the DMS
             # lmp_da, MR, RA, RD, RegCCP, RegPCP = read_pjm_data(path, year, month, nodeid)
-            lmp_da, mcpru_da, mcprd_da = read_spp_data(path, year, month, nodeid, typedat="both")
+            sources = [os.path.join(path, 'LMP', 'DAM', '*', year, month.zfill(2)), os.path.join(path, 'MCP', 'DAM', year, month.zfill(2))]
+            lmp_da, mcpru_da, mcprd_da = self._read_market_data('SPP', nodeid, year, month, sources, ['LMP', 'MCPRU', 'MCPRD'],
+                                                                read_spp_data, path, year, month, nodeid, "both")
 
             self.add_data(lmp_da, lmp_key)
             self.add_data(mcpru_da, mcpru_key)
@@ -337,6 +472,7 @@ class ValuationDMS(DataManagementSystem):
         return lmp_da, mcpru_da, mcprd_da
 
 
+    @loader
     def get_caiso_data(self, year, month, nodeid):
         path = os.path.join(self.home_path, 'CAISO')
 
@@ -367,7 +503,11 @@ class ValuationDMS(DataManagementSystem):
         except KeyError:
             # load the data and add it to the DMS
             # lmp_da, MR, RA, RD, RegCCP, RegPCP = read_pjm_data(path, year, month, nodeid)
-            lmp_da, aspru_da, asprd_da, asprmu_da, asprmd_da, rmu_mm, rmd_mm, rmu_pacc, rmd_pacc = read_caiso_data(path, year, month, nodeid)
+            sources = [os.path.join(path, 'LMP', str(nodeid), year), os.path.join(path, 'ASP', year), os.path.join(path, 'MILEAGE', year)]
+            lmp_da, aspru_da, asprd_da, asprmu_da, asprmd_da, rmu_mm, rmd_mm, rmu_pacc, rmd_pacc = self._read_market_data(
+                'CAISO', nodeid, year, month, sources,
+                ['LMP', 'ASPRU', 'ASPRD', 'ASPRMU', 'ASPRMD', 'RMU_MM', 'RMD_MM', 'RMU_PACC', 'RMD_PACC'],
+                read_caiso_data, path, year, month, nodeid)
 
             self.add_data(lmp_da, lmp_key)
             self.add_data(aspru_da, aspru_key)
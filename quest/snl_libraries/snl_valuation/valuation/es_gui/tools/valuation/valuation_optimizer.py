@@ -2,6 +2,7 @@ from __future__ import division, print_function, absolute_import
 
 import logging
 import os
+import time
 
 from pyomo.environ import *
 import pandas as pd
@@ -9,10 +10,21 @@ import numpy as np
 
 from valuation.es_gui.tools import optimizer
 from valuation.es_gui.tools.valuation.constraints import ExpressionsBlock
+from valuation.es_gui.tools.valuation import lp_matrix
+from valuation.es_gui.tools.valuation import rolling_horizon
+from valuation.es_gui.tools.valuation import dp_arbitrage
+
+# Solvers that are called with the model assembled directly in matrix form instead of through Pyomo.
+MATRIX_SOLVERS = {'highs'}
+DP_SOLVERS = {'dp'}
+
+# Model parameters that can be changed with resolve() without rebuilding the model.
+MUTABLE_PARAMS = ('Power_rating', 'Energy_capacity')
 
 
 class ValuationOptimizer(optimizer.Optimizer):
     """A framework wrapper class for creating Pyomo ConcreteModels for energy storage valuation."""
+    CACHED_ATTRIBUTES = ('gross_revenue',)
 
     def __init__(self, price_electricity=None,
                  price_reg_up=None, price_reg_down=None,
@@ -60,6 +72,10 @@ class ValuationOptimizer(optimizer.Optimizer):
         self._results = None
         self._gross_revenue = None
 
+        self._model_parameters = {}
+        self._rolling_horizon = None
+        self._rolling_horizon_windows = []
+
     @property
     def price_electricity(self):
         """The price for buying electricity via energy arbitrage [$/MWh]."""
@@ -215,7 +231,7 @@ class ValuationOptimizer(optimizer.Optimizer):
 
     @property
     def solver(self):
-        """The name of the solver for Pyomo to use, defaults to 'glpk'."""
+        """The name of the solver for Pyomo to use, defaults to 'glpk'. Solvers in MATRIX_SOLVERS bypass Pyomo model construction; solvers in DP_SOLVERS solve the arbitrage model without an LP solver."""
         return self._solver
 
     @solver.setter
@@ -264,6 +280,28 @@ class ValuationOptimizer(optimizer.Optimizer):
     def gross_revenue(self, value):
         self._gross_revenue = value
 
+    @property
+    def rolling_horizon(self):
+        """A tuple of (window, overlap) in time steps to solve the model in rolling horizon mode, or None to solve it over its entire horizon at once. Each window is solved with the state of charge at the end of the preceding window's committed time steps and looks ahead overlap time steps."""
+        return self._rolling_horizon
+
+    @rolling_horizon.setter
+    def rolling_horizon(self, value):
+        if value is not None:
+            window, overlap = value
+
+            if int(window) < 1 or int(overlap) < 0:
+                raise(BadParameterException('The rolling horizon window must be at least one time step and the overlap cannot be negative.'))
+
+            value = (int(window), int(overlap))
+
+        self._rolling_horizon = value
+
+    @property
+    def rolling_horizon_windows(self):
+        """List of (start, commit_stop, stop, solve time) for each window solved in rolling horizon mode."""
+        return self._rolling_horizon_windows
+
     def _set_model_param(self):
         """Sets the model params for the Pyomo ConcreteModel."""
         m = self.model
@@ -284,6 +322,13 @@ class ValuationOptimizer(optimizer.Optimizer):
             logging.debug('ValuationOptimizer: No Energy_capacity provided, setting default...')
             m.Energy_capacity = 5
 
+        for param_name in MUTABLE_PARAMS:
+            param_value = getattr(m, param_name)
+
+            if not isinstance(param_value, Param):
+                delattr(m, param_name)
+                setattr(m, param_name, Param(initialize=param_value, mutable=True))
+
         if not hasattr(m, 'Self_discharge_efficiency'):
             # Fraction of energy maintained over one time period.
             logging.debug('ValuationOptimizer: No Self_discharge_efficiency provided, setting default...')
@@ -340,6 +385,14 @@ class ValuationOptimizer(optimizer.Optimizer):
             logging.warning('ValuationOptimizer: State_of_charge_init provided is greater than 1.0, interpreting as percentage...')
             m.State_of_charge_init = m.State_of_charge_init/100
 
+        if not hasattr(m, 'State_of_charge_final'):
+            # Final state of charge [fraction of capacity], defaults to the initial state of charge.
+            logging.debug('ValuationOptimizer: No State_of_charge_final provided, setting default...')
+            m.State_of_charge_final = m.State_of_charge_init
+        elif getattr(m, 'State_of_charge_final') > 1.0:
+            logging.warning('ValuationOptimizer: State_of_charge_final provided is greater than 1.0, interpreting as percentage...')
+            m.State_of_charge_final = m.State_of_charge_final/100
+
         # Check if params necessary for certain market types are set if required.
         if self.market_type in {'ercot_arbreg', 'pjm_pfp', 'miso_pfp', 'isone_pfp', 'nyiso_pfp', 'spp_pfp', 'caiso_pfp'}:
             try:
@@ -553,145 +606,201 @@ class ValuationOptimizer(optimizer.Optimizer):
         #     raise(IncompatibleDataException('The objective function was ill-formed, resulting in a constant objective function.'))
 
 
-    def _process_results(self):
-        """Processes optimization results for further evaluation."""
-        m = self.model
+    def _run(self):
+        """Instantiates, creates, and solves the optimizer model. Bypasses Pyomo model construction if the solver accepts the model in matrix form."""
+        if self.rolling_horizon is not None:
+            self._run_rolling_horizon()
+        elif self.solver in MATRIX_SOLVERS or self.solver in DP_SOLVERS:
+            self._run_matrix()
+        else:
+            super(ValuationOptimizer, self)._run()
+
+    def _cache_inputs(self):
+        """Returns a dictionary of the inputs that determine the results besides the model parameters."""
+        inputs = {prop: getattr(self, prop) for prop in rolling_horizon.TIME_SERIES_DATA.values()}
+        inputs.update(market_type=self.market_type, rolling_horizon=self.rolling_horizon)
+
+        return inputs
 
-        t = m.time
-        q_r = [m.q_r[n].value for n in m.time]
-        q_d = [m.q_d[n].value for n in m.time]
-        q_ru = [m.q_ru[n].value for n in m.time]
-        q_rd = [m.q_rd[n].value for n in m.time]
-        q_reg = [m.q_reg[n].value for n in m.time]
-        soc = [m.s[n].value for n in m.time]
-        price_electricity = [m.price_electricity[n] for n in m.time]
-
-        run_results = {'time': t, 'q_r': q_r, 'q_d': q_d, 'q_ru': q_ru, 'q_rd': q_rd, 'q_reg': q_reg,
-                       'state of charge': soc, 'price of electricity': price_electricity}
-
-        if self.market_type == 'pjm_pfp':
-            rev_arb = np.cumsum(np.array([m.price_electricity[t]*(m.q_d[t].value - m.q_r[t].value) for t in m.time]))
-            rev_reg = np.cumsum(np.array([m.q_reg[t].value*m.perf_score[t]*(m.mi_mult[t]*m.price_reg_service[t] + m.price_regulation[t]) for t in m.time]))
-
-            revenue = rev_arb + rev_reg
-
-            run_results['rev_arb'] = rev_arb
-            run_results['rev_reg'] = rev_reg
-            run_results['revenue'] = revenue
-        elif self.market_type == 'miso_pfp':
-            rev_arb = np.cumsum(np.array([m.price_electricity[t]*(m.q_d[t].value - m.q_r[t].value) for t in m.time]))
-            rev_reg = np.cumsum(np.array([(1 + m.Make_whole)*m.perf_score[t]*m.price_regulation[t]*m.q_reg[t].value for t in m.time]))
-
-            revenue = rev_arb + rev_reg
-
-            run_results['rev_arb'] = rev_arb
-            run_results['rev_reg'] = rev_reg
-            run_results['revenue'] = revenue
-        #//////////////////////////////////////////////////#
-        elif self.market_type == 'isone_pfp':
-            rev_arb = np.cumsum(np.array([m.price_electricity[t]*(m.q_d[t].value - m.q_r[t].value) for t in m.time]))
-            rev_reg = np.cumsum(np.array([(m.mi_mult[t] * m.price_reg_service[t] + m.price_regulation[t]) * m.perf_score[t]*m.q_reg[t].value for t in m.time]))
-
-            revenue = rev_arb + rev_reg
-
-            run_results['rev_arb'] = rev_arb
-            run_results['rev_reg'] = rev_reg
-            run_results['revenue'] = revenue
-        #//////////////////////////////////////////////////#
-        #######################################################################################################################
-        elif self.market_type == 'nyiso_pfp':
-            rev_arb = np.cumsum(np.array([m.price_electricity[t]*(m.q_d[t].value - m.q_r[t].value) for t in m.time]))
-            rev_reg = np.cumsum(np.array([m.q_reg[t].value* m.price_regulation[t] * (1 - 1.1*(1 - m.perf_score[t]))
-                                          + m.price_electricity[t]*(m.q_reg[t].value * m.fraction_reg_up[t]
-                                          - m.q_reg[t].value * m.fraction_reg_down[t])
-                                          for t in m.time]))
-
-            revenue = rev_arb + rev_reg
-
-            run_results['rev_arb'] = rev_arb
-            run_results['rev_reg'] = rev_reg
-            run_results['revenue'] = revenue
-        #######################################################################################################################
-        #######################################################################################################################
-        elif self.market_type == 'spp_pfp':
-            # TODO: copied from 'ercot_arbreg' -make sure is correct for this market
-            # rev_arb = np.cumsum(np.array([m.price_electricity[t]*(m.q_d[t].value - m.q_r[t].value
-            #                                                       + m.q_ru[t].value*m.fraction_reg_up[t]
-            #                                                       - m.q_rd[t].value*m.fraction_reg_down[t])
-            #                               for t in m.time]))
-            # rev_reg = np.cumsum(np.array([m.ru[t]*m.q_ru[t].value + m.rd[t]*m.q_rd[t].value for t in m.time]))
-            rev_arb = np.cumsum(np.array([m.price_electricity[t]*(m.q_d[t].value - m.q_r[t].value) for t in m.time]))
-            rev_reg = np.cumsum(np.array([m.price_reg_up[t] * m.q_ru[t].value + m.price_reg_down[t] * m.q_rd[t].value
-                                          + m.price_electricity[t]*(m.q_ru[t].value * m.fraction_reg_up[t]
-                                          - m.q_rd[t].value * m.fraction_reg_down[t])
-                                          for t in m.time]))
-
-            revenue = rev_arb + rev_reg
-
-            run_results['rev_arb'] = rev_arb
-            run_results['rev_reg'] = rev_reg
-            run_results['revenue'] = revenue
-        #######################################################################################################################
-        elif self.market_type == 'caiso_pfp':
-            # rev_arb = np.cumsum(np.array([m.price_electricity[t]*(m.q_d[t].value - m.q_r[t].value
-            #                                                       + m.q_ru[t].value*m.fraction_reg_up[t]
-            #                                                       - m.q_rd[t].value*m.fraction_reg_down[t])
-            #                               for t in m.time]))
-            # rev_reg = np.cumsum(np.array([m.price_reg_up[t] * m.q_ru[t].value + m.price_reg_down[t] * m.q_rd[t].value
-            #                               + m.perf_score_ru[t] * m.mi_mult_ru[t] * m.price_reg_serv_up[t]
-            #                               + m.perf_score_rd[t] * m.mi_mult_rd[t] * m.price_reg_serv_down[t]
-            #                               for t in m.time]))
-            rev_arb = np.cumsum(np.array([m.price_electricity[t]*(m.q_d[t].value - m.q_r[t].value) for t in m.time]))
-            rev_reg = np.cumsum(np.array([m.price_reg_up[t] * m.q_ru[t].value + m.price_reg_down[t] * m.q_rd[t].value
-                                          + m.perf_score_ru[t] * m.mi_mult_ru[t] * m.price_reg_serv_up[t]
-                                          + m.perf_score_rd[t] * m.mi_mult_rd[t] * m.price_reg_serv_down[t]
-                                          + m.price_electricity[t]*(m.q_ru[t].value * m.fraction_reg_up[t]
-                                          - m.q_rd[t].value * m.fraction_reg_down[t])
-                                          for t in m.time]))
-
-            revenue = rev_arb + rev_reg
-
-            run_results['rev_arb'] = rev_arb
-            run_results['rev_reg'] = rev_reg
-            run_results['revenue'] = revenue
-        #######################################################################################################################
-        elif self.market_type == 'ercot_arbreg':
-            # rev_arb = np.cumsum(np.array([m.price_electricity[t]*(m.q_d[t].value - m.q_r[t].value
-            #                                                       + m.q_ru[t].value*m.fraction_reg_up[t]
-            #                                                       - m.q_rd[t].value*m.fraction_reg_down[t])
-            #                               for t in m.time]))
-            # # rev_reg = np.cumsum(np.array([m.ru[t] * m.q_ru[t].value + m.rd[t] * m.q_rd[t].value for t in m.time]))
-            # rev_reg = np.cumsum(np.array([m.price_reg_up[t] * m.q_ru[t].value + m.price_reg_down[t] * m.q_rd[t].value for t in m.time]))
-            rev_arb = np.cumsum(np.array([m.price_electricity[t]*(m.q_d[t].value - m.q_r[t].value) for t in m.time]))
-            rev_reg = np.cumsum(np.array([m.price_reg_up[t] * m.q_ru[t].value + m.price_reg_down[t] * m.q_rd[t].value
-                                          + m.price_electricity[t]*(m.q_ru[t].value * m.fraction_reg_up[t]
-                                          - m.q_rd[t].value * m.fraction_reg_down[t])
-                                          for t in m.time]))
-
-            revenue = rev_arb + rev_reg
-
-            run_results['rev_arb'] = rev_arb
-            run_results['rev_reg'] = rev_reg
-            run_results['revenue'] = revenue
+    def resolve(self, **kwargs):
+        """Updates the mutable model parameters in kwargs and re-solves the model built by a previous call to run() without rebuilding it."""
+        for param_name in kwargs:
+            if param_name not in MUTABLE_PARAMS:
+                raise(BadParameterException('{0} cannot be changed without rebuilding the model; the mutable parameters are {1}.'.format(param_name, ', '.join(MUTABLE_PARAMS))))
+
+        self._run_stats = None
+
+        if not hasattr(self.model, 'time'):
+            # The results of run() were loaded from the result cache, so there is no model to re-solve yet.
+            self.set_model_parameters(**kwargs)
+            self._run()
+
+            return self.get_results()
+
+        self.set_model_parameters(**kwargs)
+
+        if self.solver in MATRIX_SOLVERS or self.solver in DP_SOLVERS:
+            self._solve_matrix()
         else:
-            rev_arb = np.cumsum(np.array([m.price_electricity[t] * (m.q_d[t].value - m.q_r[t].value)
-                                          for t in m.time]))
-            rev_reg = np.cumsum(np.array([0 for t in m.time]))
+            self._solve()
+
+        return self.get_results()
+
+    def _run_rolling_horizon(self):
+        """Solves the model as a sequence of overlapping windows, carrying the state of charge at the end of each window's committed time steps forward as the initial state of charge of the next, and processes the committed decisions as the results."""
+        window, overlap = self.rolling_horizon
+        stats = self.run_stats
+
+        with stats.phase('instantiate'):
+            self.instantiate_model()
+            self._set_model_param()
+
+        m = self.model
+        n_steps = len(m.price_electricity)
+        energy_capacity = value(m.Energy_capacity)
+
+        soc_min = m.State_of_charge_min
+        soc_max = m.State_of_charge_max
+        soc_final = m.State_of_charge_final
+        soc_init = m.State_of_charge_init
+
+        # The state of charge is carried forward in energy units, as a fraction of zero energy capacity is undefined.
+        energy = soc_init*energy_capacity
+
+        solution = {name: np.zeros(n_steps) for name in lp_matrix.DECISION_VARIABLES}
+        solution['s'] = np.zeros(n_steps + 1)
+
+        self._rolling_horizon_windows = []
+
+        for start, commit_stop, stop in rolling_horizon.get_windows(n_steps, window, overlap):
+            window_op = ValuationOptimizer(market_type=self.market_type, solver=self.solver)
+            # The results of the whole horizon are cached instead.
+            window_op.result_cache = None
+
+            for name, prop in rolling_horizon.TIME_SERIES_DATA.items():
+                setattr(window_op, prop, rolling_horizon.slice_value(getattr(m, name, None), start, stop))
+
+            window_params = {name: rolling_horizon.slice_value(param_value, start, stop) for name, param_value in self.model_parameters.items()}
+            window_params.update(State_of_charge_init=energy/energy_capacity if energy_capacity > 0 else soc_init, State_of_charge_final=soc_final)
+            window_op.set_model_parameters(**window_params)
+
+            t0 = time.perf_counter()
+
+            with stats.phase('windows'):
+                window_op.run()
 
-            revenue = rev_arb + rev_reg
+            self._rolling_horizon_windows.append((start, commit_stop, stop, time.perf_counter() - t0))
 
-            run_results['rev_arb'] = rev_arb
-            run_results['rev_reg'] = rev_reg
-            run_results['revenue'] = revenue
+            results = window_op.results
+            n_commit = commit_stop - start
+
+            for name in lp_matrix.DECISION_VARIABLES:
+                solution[name][start:commit_stop] = results[name].values[:n_commit]
+
+            solution['s'][start:commit_stop] = results['state of charge'].values[:n_commit]
+
+            if n_commit < stop - start:
+                energy = results['state of charge'].values[n_commit]
+                # Guard against solver tolerances putting the state of charge outside of its limits.
+                energy = min(max(energy, soc_min*energy_capacity), soc_max*energy_capacity)
+            else:
+                energy = soc_final*energy_capacity
+
+        solution['s'][n_steps] = energy
+
+        with stats.phase('process'):
+            self._process_solution(solution, n_steps)
+
+        return self.get_results()
+
+    def _run_matrix(self):
+        """Assembles the model in sparse matrix form, solves it in a single call, and processes the results."""
+        with self.run_stats.phase('instantiate'):
+            self.instantiate_model()
+            self._set_model_param()
+
+        self._solve_matrix()
+
+        return self.get_results()
+
+    def _solve_matrix(self):
+        """Assembles the model in sparse matrix form from its current parameters, solves it, and processes the results."""
+        if self.solver in DP_SOLVERS:
+            if self.market_type == 'arbitrage':
+                return self._solve_dp()
+
+            logging.info('ValuationOptimizer: The {0} solver only applies to arbitrage, solving the {1} model as a linear program instead.'.format(self.solver, self.market_type))
+
+        stats = self.run_stats
 
         try:
-            self.gross_revenue = revenue[-1]
+            with stats.phase('build'):
+                lp = lp_matrix.build_lp(self.market_type, self.model)
+        except IndexError:
+            # Array-like object(s) do(es) not match the length of the price_electricity array-like.
+            raise(IncompatibleDataException('At least one of the array-like parameter objects is not the expected length. (It should match the length of the price_electricity object.)'))
+
+        stats.set_model_size(len(lp.c), lp.A_ub.shape[0] + lp.A_eq.shape[0], lp.A_ub.nnz + lp.A_eq.nnz)
+
+        with stats.phase('solve'):
+            solution = lp_matrix.solve_lp(lp, stats)
+
+        with stats.phase('process'):
+            self._process_solution(solution, lp.n_steps)
+
+    def _solve_dp(self):
+        """Solves the arbitrage model from its current parameters by dynamic programming and processes the results."""
+        n_steps = len(self.model.price_electricity)
+
+        try:
+            p = lp_matrix.ModelParams(self.model, n_steps)
+            price_electricity = p.price_electricity
+        except IndexError:
+            raise(IncompatibleDataException('At least one of the array-like parameter objects is not the expected length. (It should match the length of the price_electricity object.)'))
+
+        stats = self.run_stats
+
+        with stats.phase('solve'):
+            solution = dp_arbitrage.solve_arbitrage(price_electricity, p.Power_rating, p.Energy_capacity,
+                                                    soc_min=p.State_of_charge_min, soc_max=p.State_of_charge_max,
+                                                    soc_init=p.State_of_charge_init, soc_final=p.State_of_charge_final,
+                                                    self_discharge_efficiency=p.Self_discharge_efficiency,
+                                                    round_trip_efficiency=p.Round_trip_efficiency, discount_rate=p.R)
+
+        stats.set_solver_info('dp', 'optimal')
+
+        with stats.phase('process'):
+            self._process_solution(solution, n_steps)
+
+    def _process_solution(self, solution, n_steps):
+        """Computes the revenue streams from the decision variable values in solution and creates the results DataFrame."""
+        params = lp_matrix.ModelParams(self.model, n_steps)
+        rev_arb, rev_reg = lp_matrix.revenue_streams(self.market_type, params, solution)
+
+        run_results = {'time': np.arange(n_steps), 'q_r': solution['q_r'], 'q_d': solution['q_d'],
+                       'q_ru': solution['q_ru'], 'q_rd': solution['q_rd'], 'q_reg': solution['q_reg'],
+                       'state of charge': solution['s'][:n_steps], 'price of electricity': params.price_electricity,
+                       'rev_arb': np.cumsum(rev_arb), 'rev_reg': np.cumsum(rev_reg),
+                       'revenue': np.cumsum(rev_arb + rev_reg)}
+
+        try:
+            self.gross_revenue = run_results['revenue'][-1]
         except IndexError:
             # Revenue is of length-0, likely due to no price_electricity array-like being given before solving.
             self.gross_revenue = 0
-        
+
         self.results = pd.DataFrame(run_results)
 
+    def _process_results(self):
+        """Processes optimization results for further evaluation."""
+        m = self.model
+        n_steps = len(m.time)
+
+        solution = {name: np.array([v.value for v in getattr(m, name).values()], dtype=float)
+                    for name in lp_matrix.DECISION_VARIABLES + ('s',)}
+
+        self._process_solution(solution, n_steps)
+
     def get_results(self):
         """Returns the decision variables and derived quantities in a DataFrame, plus the net revenue."""
         return self.results, self.gross_revenue